@@ -0,0 +1,86 @@
+"""
+Представление объектов в JSON API.
+
+Поля описываются словарем имя -> функция от объекта; ?fields=id,text
+оставляет в ответе только нужные клиенту поля. Списки пишутся в ответ
+по одному объекту прямо из итератора запроса, без промежуточных списков.
+"""
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class FieldsError(ValueError):
+    """ Запрошено поле, которого нет у объекта """
+
+
+class Serializer:
+    def __init__(self, **fields):
+        self.fields = fields
+
+    def select(self, requested=None):
+        """ Имена полей из параметра fields, по умолчанию - все """
+        if not requested:
+            return list(self.fields)
+        names = [name.strip() for name in requested.split(',')]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise FieldsError(
+                f'Неизвестные поля: {", ".join(unknown)}. '
+                f'Доступны: {", ".join(self.fields)}')
+        return names
+
+    def to_dict(self, obj, names):
+        return {name: self.fields[name](obj) for name in names}
+
+
+post_serializer = Serializer(
+    id=lambda post: post.pk,
+    text=lambda post: post.text,
+    pub_date=lambda post: post.pub_date,
+    author=lambda post: post.author.username,
+    group=lambda post: post.group.slug if post.group_id else None,
+    image=lambda post: post.image.url if post.image else None,
+    comment_count=lambda post: post.comment_count,
+)
+
+comment_serializer = Serializer(
+    id=lambda comment: comment.pk,
+    post=lambda comment: comment.post_id,
+    author=lambda comment: comment.author.username,
+    text=lambda comment: comment.text,
+    created=lambda comment: comment.created,
+)
+
+# Профиль - автор с прикрепленными счетчиками counts и отметкой
+# is_following для вошедшего зрителя
+profile_serializer = Serializer(
+    username=lambda author: author.username,
+    full_name=lambda author: author.get_full_name(),
+    posts=lambda author: author.counts.posts,
+    comments=lambda author: author.counts.comments,
+    followers=lambda author: author.counts.followers,
+    following=lambda author: author.counts.following,
+    is_following=lambda author: author.is_following,
+)
+
+_encoder = DjangoJSONEncoder(ensure_ascii=False)
+
+
+def dumps(data):
+    return _encoder.encode(data)
+
+
+def stream_page(objects, serializer, names, limit, next_url):
+    """ Части JSON страницы {"results": [...], "next": ...}.
+    objects - итератор на limit + 1 объект: лишний значит, что есть
+    следующая страница, и ее адрес next_url(последний объект) """
+    yield '{"results": ['
+    last = None
+    for index, obj in enumerate(objects):
+        if index == limit:
+            yield f'], "next": {dumps(next_url(last))}}}'
+            return
+        if index:
+            yield ', '
+        yield dumps(serializer.to_dict(obj, names))
+        last = obj
+    yield '], "next": null}'
@@ -0,0 +1,137 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Author')
+        cls.reader = User.objects.create(username='Reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group)
+            for i in range(5)
+        ]
+        cls.post = cls.posts[-1]
+        for i in range(3):
+            Comment.objects.create(
+                text=f'Комментарий {i}', post=cls.post, author=cls.reader)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def get_json(self, url, client=None, **params):
+        response = (client or self.client).get(url, params or None)
+        content = b''.join(response.streaming_content) \
+            if response.streaming else response.content
+        return response, json.loads(content.decode())
+
+    def test_cursor_pages_cover_feed_once(self):
+        """ Переход по next проходит ленту целиком, по запросу на страницу """
+        url = reverse('api:posts') + '?limit=2'
+        ids = []
+        while url:
+            with self.assertNumQueries(1):
+                response, data = self.get_json(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertLessEqual(len(data['results']), 2)
+            ids += [post['id'] for post in data['results']]
+            url = data['next']
+
+        expected = [post.pk for post in reversed(self.posts)]
+        self.assertEqual(ids, expected)
+
+    def test_sparse_fieldsets(self):
+        _, data = self.get_json(
+            reverse('api:posts'), fields='id,comment_count', limit=1)
+        self.assertEqual(
+            data['results'], [{'id': self.post.pk, 'comment_count': 3}])
+
+        _, data = self.get_json(reverse('api:post', args=[self.post.pk]))
+        self.assertEqual(data['author'], 'Author')
+        self.assertEqual(data['group'], 'group')
+        self.assertEqual(data['text'], 'Пост 4')
+
+    def test_bad_requests_get_json_errors(self):
+        cases = {
+            reverse('api:posts') + '?fields=secret': 400,
+            reverse('api:posts') + '?cursor=broken': 400,
+            reverse('api:posts') + '?limit=1000': 400,
+            reverse('api:post', args=[0]): 404,
+            reverse('api:group_posts', args=['missing']): 404,
+            reverse('api:profile', args=['Missing']): 404,
+            reverse('api:follow_feed'): 401,
+        }
+        for url, status in cases.items():
+            with self.subTest(url=url):
+                response, data = self.get_json(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('error', data)
+
+    def test_etag_of_post_changes_with_comments(self):
+        url = reverse('api:comments', args=[self.post.pk])
+        response, data = self.get_json(url)
+        self.assertEqual(
+            [comment['text'] for comment in data['results']],
+            ['Комментарий 2', 'Комментарий 1', 'Комментарий 0'])
+
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+
+        Comment.objects.create(
+            text='Новый', post=self.post, author=self.reader)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_group_and_profile(self):
+        _, data = self.get_json(
+            reverse('api:group_posts', args=['group']), fields='id')
+        self.assertEqual(len(data['results']), 5)
+
+        _, data = self.get_json(
+            reverse('api:profile', args=['Author']),
+            client=self.reader_client)
+        self.assertEqual(data['posts'], 5)
+        self.assertEqual(data['followers'], 0)
+        self.assertFalse(data['is_following'])
+
+    def test_follow_and_unfollow(self):
+        url = reverse('api:follow', args=['Author'])
+        self.assertEqual(self.client.post(url).status_code, 401)
+
+        response = self.reader_client.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+            .exists())
+        self.assertEqual(self.reader_client.post(url).status_code, 200)
+
+        _, data = self.get_json(
+            reverse('api:follow_feed'), client=self.reader_client,
+            fields='id')
+        self.assertEqual(len(data['results']), 5)
+
+        response = self.reader_client.delete(url)
+        self.assertEqual(json.loads(response.content), {'following': False})
+        self.assertFalse(Follow.objects.exists())
+
+        response = self.reader_client.post(
+            reverse('api:follow', args=['Reader']))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.reader_client.get(url).status_code, 405)
@@ -0,0 +1,19 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', views.posts, name='posts'),
+    path('posts/<int:post_id>/', views.post_detail, name='post'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='comments'),
+    path('groups/<slug:slug>/posts/', views.group_posts, name='group_posts'),
+    path('follow/posts/', views.follow_feed, name='follow_feed'),
+    path('users/<str:username>/', views.profile, name='profile'),
+    path('users/<str:username>/posts/', views.user_posts, name='user_posts'),
+    path('users/<str:username>/follow/', views.follow, name='follow'),
+]
@@ -0,0 +1,202 @@
+"""
+JSON API v1 для мобильных клиентов.
+
+Ленты, посты, профили и комментарии отдаются теми же запросами, что и
+HTML-страницы, страницы списков - по курсору (?cursor=, ?limit=), а
+?fields= оставляет в ответе только нужные поля. Условные запросы с
+If-None-Match получают 304 так же, как страницы сайта.
+Пишущие методы работают по сессии и, как формы сайта, требуют CSRF-токен.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_http_methods
+
+from posts import timeline
+from posts.conditional import (
+    conditional_page, feed_generations, profile_generations)
+from posts.counters import get_stats
+from posts.models import Comment, Follow, Group, Post
+from posts.pagecache import generation_key
+from posts.paginator import (
+    COMMENT_ORDERING, FEED_ORDERING, NEXT, CursorPaginator)
+from yatube.replicas import use_replica
+
+from .serializers import (
+    FieldsError, comment_serializer, dumps, post_serializer,
+    profile_serializer, stream_page)
+
+
+User = get_user_model()
+
+CONTENT_TYPE = 'application/json'
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def json_response(data, status=200):
+    return HttpResponse(dumps(data), content_type=CONTENT_TYPE, status=status)
+
+
+def api_view(*methods, login=False):
+    """ Ошибки и отказы представления - JSON с кодом статуса,
+    а не HTML-страницы и перенаправления на вход """
+
+    def decorator(view):
+        @require_http_methods(methods)
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if login and not request.user.is_authenticated:
+                return json_response({'error': 'Нужно войти'}, 401)
+            try:
+                return view(request, *args, **kwargs)
+            except Http404:
+                return json_response({'error': 'Не найдено'}, 404)
+            except FieldsError as error:
+                return json_response({'error': str(error)}, 400)
+            except ApiError as error:
+                return json_response({'error': str(error)}, error.status)
+
+        return wrapper
+
+    return decorator
+
+
+def _limit(request, default):
+    try:
+        limit = int(request.GET.get('limit', default))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= settings.API_MAX_LIMIT:
+        raise ApiError(f'limit - число от 1 до {settings.API_MAX_LIMIT}')
+    return limit
+
+
+def page_response(request, object_list, serializer, ordering, per_page):
+    """ Страница списка после ?cursor=, записанная в ответ потоком """
+    names = serializer.select(request.GET.get('fields'))
+    limit = _limit(request, per_page)
+    paginator = CursorPaginator(object_list, limit, ordering)
+
+    values = None
+    cursor = request.GET.get('cursor')
+    if cursor:
+        decoded = paginator.decode_cursor(cursor)
+        if decoded is None or decoded[0] != NEXT:
+            raise ApiError('Неверный курсор')
+        _, values = decoded
+
+    queryset = paginator.queryset(values)
+    # Строки читаются уже при отдаче ответа, после выхода из
+    # представления: базу для чтения роутер выбирает сейчас
+    queryset = queryset.using(queryset.db)[:limit + 1]
+
+    def next_url(last):
+        params = request.GET.copy()
+        params['cursor'] = paginator.cursor_for(last)
+        return f'{request.path}?{params.urlencode()}'
+
+    return StreamingHttpResponse(
+        stream_page(queryset.iterator(), serializer, names, limit, next_url),
+        content_type=CONTENT_TYPE)
+
+
+def post_generations(request, post_id):
+    # В посте API нет карточки автора, хватает ключа самого поста
+    return [generation_key(f'post:{post_id}')]
+
+
+@api_view('GET')
+@conditional_page(feed_generations)
+@use_replica
+def posts(request):
+    return page_response(
+        request, Post.objects.feed(), post_serializer, FEED_ORDERING,
+        settings.POSTS_PER_PAGE)
+
+
+@api_view('GET')
+@conditional_page(post_generations)
+@use_replica
+def post_detail(request, post_id):
+    names = post_serializer.select(request.GET.get('fields'))
+    post = get_object_or_404(Post.objects.feed(), pk=post_id)
+    return json_response(post_serializer.to_dict(post, names))
+
+
+@api_view('GET')
+@conditional_page(post_generations)
+@use_replica
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    comments = Comment.objects.filter(
+        post_id=post_id).select_related('author')
+    return page_response(
+        request, comments, comment_serializer, COMMENT_ORDERING,
+        settings.COMMENTS_PER_PAGE)
+
+
+@api_view('GET')
+@conditional_page(feed_generations)
+@use_replica
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return page_response(
+        request, group.posts.feed(), post_serializer, FEED_ORDERING,
+        settings.POSTS_PER_PAGE)
+
+
+@api_view('GET')
+@conditional_page(profile_generations)
+@use_replica
+def profile(request, username):
+    names = profile_serializer.select(request.GET.get('fields'))
+    author = get_object_or_404(User, username=username)
+    author.counts = get_stats(author.pk)
+    author.is_following = 'is_following' in names \
+        and request.user.is_authenticated \
+        and Follow.objects.filter(user=request.user, author=author).exists()
+    return json_response(profile_serializer.to_dict(author, names))
+
+
+@api_view('GET')
+@conditional_page(profile_generations)
+@use_replica
+def user_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    return page_response(
+        request, author.posts.feed(), post_serializer, FEED_ORDERING,
+        settings.POSTS_PER_PAGE)
+
+
+@api_view('GET', login=True)
+@use_replica
+def follow_feed(request):
+    return page_response(
+        request, timeline.follow_feed(request.user), post_serializer,
+        timeline.FOLLOW_FEED_ORDERING, settings.POSTS_PER_PAGE)
+
+
+@api_view('POST', 'DELETE', login=True)
+@transaction.atomic
+def follow(request, username):
+    """ POST подписывает на автора, DELETE - отписывает """
+    author = get_object_or_404(User, username=username)
+    if request.method == 'DELETE':
+        Follow.objects.filter(user=request.user, author=author).delete()
+        return json_response({'following': False})
+
+    if author == request.user:
+        raise ApiError('Нельзя подписаться на себя')
+    _, created = Follow.objects.get_or_create(
+        user=request.user, author=author)
+    return json_response({'following': True}, 201 if created else 200)
@@ -0,0 +1,11 @@
+"""
+Нагрузочные замеры публичных страниц Yatube.
+
+Запуск из корня проекта:
+
+    python -m benchmarks run --scale small --output before.json
+    python -m benchmarks run --scale small --driver wsgi --concurrency 8
+    python -m benchmarks compare before.json after.json
+
+Данные создаются в отдельной тестовой базе, рабочая база не трогается.
+"""
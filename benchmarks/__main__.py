@@ -0,0 +1,120 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Замеры задержек, запросов к БД и пропускной '
+                    'способности публичных страниц')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Создать данные и выполнить замеры')
+    run.add_argument('--scale', default='small',
+                     help='Размер данных: tiny, small, medium, large')
+    for field in ('users', 'groups', 'posts', 'comments', 'follows'):
+        run.add_argument(f'--{field}', type=int,
+                         help=f'Заменить {field} выбранного размера')
+    run.add_argument('--seed', type=int, default=0,
+                     help='Зерно генератора данных и адресов')
+    run.add_argument('--driver', choices=('client', 'wsgi'),
+                     default='client')
+    run.add_argument('--concurrency', type=int, default=1,
+                     help='Параллельных клиентов для --driver wsgi')
+    run.add_argument('--requests', type=int, default=200,
+                     help='Замеряемых запросов на сценарий')
+    run.add_argument('--warmup', type=int, default=20,
+                     help='Запросов прогрева на сценарий, не замеряются')
+    run.add_argument('--scenario', action='append', dest='scenarios',
+                     help='Сценарий для замера, можно несколько раз')
+    run.add_argument('--cold', action='store_true',
+                     help='Очистить кэш после прогрева')
+    run.add_argument('--keepdb', action='store_true',
+                     help='Не удалять базу с данными и использовать '
+                          'ее в следующих запусках')
+    run.add_argument('--output', help='Сохранить отчет в JSON')
+
+    compare = commands.add_parser('compare', help='Сравнить два отчета')
+    compare.add_argument('old')
+    compare.add_argument('new')
+    return parser.parse_args(argv)
+
+
+def setup_database(keepdb):
+    """ Отдельная база для замеров. SQLite хранится в файле, а не в памяти,
+    чтобы ее видели потоки WSGI-сервера """
+    from django.db import connection
+
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(
+            tempfile.gettempdir(), 'yatube_benchmark.sqlite3')
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, keepdb=keepdb)
+    return old_name
+
+
+def run(args):
+    from django.core.cache import cache
+    from django.db import connection
+
+    from . import dataset, runner
+    from .drivers import DRIVERS
+
+    scale = dataset.SCALES[args.scale]._replace(**{
+        field: getattr(args, field)
+        for field in dataset.Scale._fields
+        if getattr(args, field) is not None
+    })
+    scenarios = args.scenarios or list(runner.SCENARIOS)
+
+    old_name = setup_database(args.keepdb)
+    try:
+        data = dataset.load() if args.keepdb else None
+        if data is None:
+            started = time.perf_counter()
+            data = dataset.generate(scale, args.seed)
+            print(f'Данные созданы за {time.perf_counter() - started:.1f} с: '
+                  f'{scale}', file=sys.stderr)
+        cache.clear()
+
+        driver = DRIVERS[args.driver]()
+        driver.start()
+        try:
+            report = runner.run(
+                driver, data, scenarios,
+                requests=args.requests,
+                warmup=args.warmup,
+                concurrency=args.concurrency,
+                seed=args.seed,
+                cold=args.cold)
+        finally:
+            driver.stop()
+    finally:
+        if not args.keepdb:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    report['meta']['scale'] = scale._asdict()
+    print(runner.format_report(report))
+    if args.output:
+        runner.save_report(report, args.output)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    django.setup()
+
+    if args.command == 'compare':
+        from . import runner
+        print(runner.compare(
+            runner.load_report(args.old), runner.load_report(args.new)))
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Синтетический набор данных для замеров.
+
+Данные создает генератор posts.seed: популярность авторов подчиняется
+степенному закону (распределение Ципфа), несколько авторов пишут большую
+часть постов и собирают большую часть подписчиков, как в настоящих соцсетях.
+"""
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+
+from posts import seed as seeding
+from posts.models import Group, Post
+
+
+User = get_user_model()
+
+Scale = namedtuple('Scale', 'users groups posts comments follows')
+
+SCALES = {
+    'tiny': Scale(users=10, groups=2, posts=30, comments=60, follows=3),
+    'small': Scale(users=100, groups=5, posts=1000, comments=3000, follows=10),
+    'medium': Scale(
+        users=1000, groups=20, posts=20000, comments=60000, follows=30),
+    'large': Scale(
+        users=10000, groups=100, posts=200000, comments=600000, follows=50),
+}
+
+PREFIX = 'bench'
+
+# Что нужно сценариям замеров, чтобы строить адреса страниц
+Dataset = namedtuple('Dataset', 'usernames group_slugs posts')
+
+
+def generate(scale, seed=0):
+    """ Создает пользователей, группы, посты, комментарии и подписки.
+    При одном и том же seed данные получаются одинаковыми """
+    params = seeding.free_prefix(seeding.Params(
+        *scale, seed=seed, until=seeding.midnight(), prefix=PREFIX))
+    starts, stages = seeding.plan(params)
+    for chunks in stages:
+        for chunk in chunks:
+            seeding.insert_chunk(params, starts, chunk)
+    seeding.reset_sequences()
+    seeding.rebuild_derived()
+    return load()
+
+
+def load():
+    """ Набор данных, созданный прошлым запуском с --keepdb, или None """
+    usernames = list(User.objects.filter(
+        username__startswith=PREFIX
+    ).order_by('pk').values_list('username', flat=True))
+    if not usernames:
+        return None
+    return Dataset(
+        usernames=usernames,
+        group_slugs=list(Group.objects.filter(
+            slug__startswith=PREFIX
+        ).order_by('pk').values_list('slug', flat=True)),
+        posts=list(Post.objects.filter(
+            author__username__in=usernames
+        ).order_by('pk').values_list('author__username', 'pk')))
@@ -0,0 +1,172 @@
+"""
+Способы отправить запрос к страницам.
+
+ClientDriver вызывает представления через тестовый клиент Django в том же
+потоке: видны все запросы к БД, но нет сети и конкурентности.
+WSGIDriver поднимает многопоточный WSGI-сервер и ходит к нему по HTTP
+из нескольких потоков, как настоящие клиенты.
+"""
+import abc
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .stats import Sample
+
+
+User = get_user_model()
+
+QUERIES_HEADER = 'X-Benchmark-Queries'
+
+
+class BaseDriver(abc.ABC):
+    def __init__(self):
+        self.sessions = {}
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def client_for(self, username):
+        """ Тестовый клиент, вошедший под пользователем, или анонимный """
+        if username not in self.sessions:
+            client = Client()
+            if username is not None:
+                client.force_login(User.objects.get(username=username))
+            self.sessions[username] = client
+        return self.sessions[username]
+
+    @abc.abstractmethod
+    def get(self, url, username=None):
+        """ Выполняет один запрос, возвращает Sample """
+
+    def run(self, requests, concurrency=1):
+        """ Выполняет запросы (url, username), возвращает замеры
+        и общее время в секундах """
+        started = time.perf_counter()
+        samples = [self.get(url, username) for url, username in requests]
+        return samples, time.perf_counter() - started
+
+
+class ClientDriver(BaseDriver):
+    name = 'client'
+
+    def get(self, url, username=None):
+        client = self.client_for(username)
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - started
+        return Sample(
+            response.status_code, elapsed, len(context.captured_queries))
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def counting_application(application):
+    """ WSGI-приложение, которое сообщает число запросов к БД
+    в заголовке ответа """
+    def wrapper(environ, start_response):
+        counter = QueryCounter()
+
+        def counting_start_response(status, headers, exc_info=None):
+            # Django отвечает, когда представление уже выполнено
+            headers = list(headers) + [(QUERIES_HEADER, str(counter.count))]
+            return start_response(status, headers, exc_info)
+
+        with connection.execute_wrapper(counter):
+            return application(environ, counting_start_response)
+
+    return wrapper
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class WSGIDriver(BaseDriver):
+    name = 'wsgi'
+
+    def __init__(self):
+        super().__init__()
+        self.server = None
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.server = ThreadedWSGIServer(
+            ('127.0.0.1', 0), QuietRequestHandler, allow_reuse_address=False)
+        self.server.set_app(counting_application(get_wsgi_application()))
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def cookie_for(self, username):
+        if username is None:
+            return ''
+        session = self.client_for(username).cookies[
+            settings.SESSION_COOKIE_NAME].value
+        return f'{settings.SESSION_COOKIE_NAME}={session}'
+
+    def get(self, url, username=None):
+        request = Request(self.base_url + url)
+        cookie = self.cookie_for(username)
+        if cookie:
+            request.add_header('Cookie', cookie)
+
+        started = time.perf_counter()
+        try:
+            with urlopen(request) as response:
+                response.read()
+                status, headers = response.status, response.headers
+        except HTTPError as error:
+            error.read()
+            status, headers = error.code, error.headers
+        elapsed = time.perf_counter() - started
+
+        queries = headers.get(QUERIES_HEADER)
+        return Sample(
+            status, elapsed, int(queries) if queries is not None else None)
+
+    def run(self, requests, concurrency=1):
+        # Сессии создаются заранее, чтобы вход не попал в замеры
+        for _, username in requests:
+            self.cookie_for(username)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(executor.map(lambda request: self.get(*request),
+                                        requests))
+        return samples, time.perf_counter() - started
+
+
+DRIVERS = {driver.name: driver for driver in (ClientDriver, WSGIDriver)}
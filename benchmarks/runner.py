@@ -0,0 +1,160 @@
+import json
+import platform
+import random
+import subprocess
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+import django
+from django.core.cache import cache
+from django.db import connection
+from django.urls import reverse
+
+from .stats import summarize
+
+
+def _index(dataset, rng):
+    return reverse('posts:index'), None
+
+
+def _index_page(dataset, rng):
+    return f"{reverse('posts:index')}?page={rng.randint(2, 5)}", None
+
+
+def _group(dataset, rng):
+    slug = rng.choice(dataset.group_slugs)
+    return reverse('posts:group', kwargs={'slug': slug}), None
+
+
+def _profile(dataset, rng):
+    # Автор случайного поста: популярные авторы открываются чаще
+    username, _ = rng.choice(dataset.posts)
+    return reverse('posts:profile', kwargs={'username': username}), None
+
+
+def _post(dataset, rng):
+    username, post_id = rng.choice(dataset.posts)
+    return reverse('posts:post', kwargs={
+        'username': username, 'post_id': post_id}), None
+
+
+def _comments(dataset, rng):
+    username, post_id = rng.choice(dataset.posts)
+    return reverse('posts:comments', kwargs={
+        'username': username, 'post_id': post_id}), None
+
+
+def _follow(dataset, rng):
+    return reverse('posts:follow_index'), rng.choice(dataset.usernames)
+
+
+def _search(dataset, rng):
+    return f"{reverse('posts:search')}?{urlencode({'q': 'пост'})}", None
+
+
+# Сценарий: имя -> функция (набор данных, rng) -> (адрес, пользователь)
+SCENARIOS = {
+    'index': _index,
+    'index_page': _index_page,
+    'group_posts': _group,
+    'profile': _profile,
+    'post_view': _post,
+    'post_comments': _comments,
+    'follow_index': _follow,
+    'post_search': _search,
+}
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(driver, dataset, scenarios, requests=200, warmup=20, concurrency=1,
+        seed=0, cold=False):
+    """ Прогоняет сценарии и возвращает отчет для сохранения в JSON """
+    results = {}
+    for name in scenarios:
+        rng = random.Random(f'{seed}:{name}')
+        make_request = SCENARIOS[name]
+        planned = [
+            make_request(dataset, rng) for _ in range(warmup + requests)]
+
+        driver.run(planned[:warmup], concurrency)
+        if cold:
+            cache.clear()
+        samples, wall_seconds = driver.run(planned[warmup:], concurrency)
+        results[name] = summarize(samples, wall_seconds)
+
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'revision': _git_revision(),
+            'driver': driver.name,
+            'concurrency': concurrency,
+            'requests': requests,
+            'warmup': warmup,
+            'seed': seed,
+            'cold_cache': cold,
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        },
+        'results': results,
+    }
+
+
+def format_report(report):
+    lines = [
+        f"{'сценарий':<16}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}"
+        f"{'запросов БД':>13}{'rps':>10}{'ошибок':>8}"
+    ]
+    for name, result in report['results'].items():
+        latency = result['latency_ms']
+        lines.append(
+            f"{name:<16}{latency['p50']:>10.2f}{latency['p95']:>10.2f}"
+            f"{latency['p99']:>10.2f}{result['queries']['mean'] or 0:>13.1f}"
+            f"{result['throughput_rps']:>10.1f}{result['errors']:>8}")
+    return '\n'.join(lines)
+
+
+def _change(old, new):
+    if not old or new is None:
+        return '     n/a'
+    return f'{(new - old) / old * 100:+7.1f}%'
+
+
+def compare(old_report, new_report):
+    """ Таблица изменений между двумя прогонами: отрицательные проценты
+    у задержек и запросов - ускорение """
+    lines = [
+        f"{'сценарий':<16}{'p50':>9}{'p95':>9}{'p99':>9}"
+        f"{'запросов БД':>13}{'rps':>9}"
+    ]
+    old_results = old_report['results']
+    for name, new in new_report['results'].items():
+        old = old_results.get(name)
+        if old is None:
+            continue
+        lines.append(
+            f"{name:<16}"
+            + ''.join(
+                f"{_change(old['latency_ms'][key], new['latency_ms'][key]):>9}"
+                for key in ('p50', 'p95', 'p99'))
+            + f"{_change(old['queries']['mean'], new['queries']['mean']):>13}"
+            + f"{_change(old['throughput_rps'], new['throughput_rps']):>9}")
+    return '\n'.join(lines)
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as report_file:
+        return json.load(report_file)
+
+
+def save_report(report, path):
+    with open(path, 'w', encoding='utf-8') as report_file:
+        json.dump(report, report_file, ensure_ascii=False, indent=2)
@@ -0,0 +1,50 @@
+import math
+from collections import namedtuple
+
+
+# Один замеренный запрос
+Sample = namedtuple('Sample', 'status seconds queries')
+
+
+def percentile(values, percent):
+    """ Перцентиль по ближайшему рангу: значение, не меньше которого
+    percent процентов отсортированной выборки """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(samples, wall_seconds):
+    """ Сводка по запросам одного сценария: задержки в миллисекундах,
+    запросы к БД на страницу и пропускная способность """
+    latencies = [sample.seconds * 1000 for sample in samples]
+    queries = [
+        sample.queries for sample in samples if sample.queries is not None
+    ]
+    errors = sum(1 for sample in samples if sample.status >= 400)
+
+    def rounded(value):
+        return None if value is None else round(value, 3)
+
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'latency_ms': {
+            'min': rounded(min(latencies, default=None)),
+            'mean': rounded(
+                sum(latencies) / len(latencies) if latencies else None),
+            'p50': rounded(percentile(latencies, 50)),
+            'p95': rounded(percentile(latencies, 95)),
+            'p99': rounded(percentile(latencies, 99)),
+            'max': rounded(max(latencies, default=None)),
+        },
+        'queries': {
+            'mean': rounded(
+                sum(queries) / len(queries) if queries else None),
+            'max': max(queries, default=None),
+        },
+        'throughput_rps': rounded(
+            len(samples) / wall_seconds if wall_seconds else None),
+    }
@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from posts.models import Group
+
+from . import dataset, runner
+from .drivers import ClientDriver
+from .stats import Sample, percentile, summarize
+
+
+User = get_user_model()
+
+
+class StatsTest(SimpleTestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertIsNone(percentile([], 50))
+
+    def test_summarize(self):
+        samples = [Sample(200, 0.01, 3), Sample(500, 0.03, 5)]
+        summary = summarize(samples, wall_seconds=0.5)
+
+        self.assertEqual(summary['requests'], 2)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['latency_ms']['p50'], 10)
+        self.assertEqual(summary['latency_ms']['max'], 30)
+        self.assertEqual(summary['queries']['mean'], 4)
+        self.assertEqual(summary['throughput_rps'], 4)
+
+
+class BenchmarkRunTest(TestCase):
+    def test_dataset_is_deterministic(self):
+        """ Одинаковое зерно дает одинаковых авторов постов """
+        def authors():
+            data = dataset.generate(dataset.SCALES['tiny'], seed=1)
+            self.assertEqual(
+                sorted(dataset.load().usernames), sorted(data.usernames))
+            return [username for username, _ in data.posts]
+
+        first = authors()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.assertEqual(authors(), first)
+        self.assertGreater(len(set(first)), 1)
+
+    def test_run_reports_all_scenarios(self):
+        data = dataset.generate(dataset.SCALES['tiny'])
+        report = runner.run(
+            ClientDriver(), data, list(runner.SCENARIOS),
+            requests=3, warmup=1)
+
+        self.assertEqual(set(report['results']), set(runner.SCENARIOS))
+        for name, result in report['results'].items():
+            with self.subTest(scenario=name):
+                self.assertEqual(result['requests'], 3)
+                self.assertEqual(result['errors'], 0)
+                self.assertGreater(result['latency_ms']['p99'], 0)
+        self.assertIn('p95', runner.format_report(report))
+        self.assertIn('+0.0%', runner.compare(report, report))
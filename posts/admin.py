@@ -1,28 +1,61 @@
 from django.contrib import admin
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 
+from . import export
 from .models import Post, Group, Comment, Follow
 
 
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def export_action(fmt):
+    """ Действие админки: выбранные записи файлом fmt, потоком """
+
+    def action(modeladmin, request, queryset):
+        name = export.table_name(queryset.model)
+        response = StreamingHttpResponse(
+            export.lines(name, queryset, fmt),
+            content_type=CONTENT_TYPES[fmt])
+        filename = f'{name}-{timezone.now():%Y%m%d-%H%M}.{fmt}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    action.__name__ = f'export_{fmt}'
+    action.short_description = f'Выгрузить выбранные в {fmt.upper()}'
+    return action
+
+
+EXPORT_ACTIONS = [export_action(fmt) for fmt in export.FORMATS]
+
+
 class PostAdmin(admin.ModelAdmin):
     list_display = ('pk', 'group', 'text', 'pub_date', 'author')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    actions = EXPORT_ACTIONS
 
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('pk', 'title', 'slug')
     prepopulated_fields = {'slug': ('title',)}
+    actions = EXPORT_ACTIONS
 
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('pk', 'text', 'post', 'author', 'created')
     search_fields = ('text',)
+    actions = EXPORT_ACTIONS
 
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('pk', 'author', 'user')
     search_fields = ('author',)
+    actions = EXPORT_ACTIONS
 
 
 admin.site.register(Post, PostAdmin)
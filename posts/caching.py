@@ -0,0 +1,110 @@
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+FEED_GENERATION_KEY = 'feed:generation'
+FOLLOW_GENERATION_KEY = 'feed:follow:{user_id}:generation'
+COMMENTS_GENERATION_KEY = 'comments:{post_id}:generation'
+NOTIFICATIONS_GENERATION_KEY = 'notifications:{user_id}:generation'
+
+
+# Время последнего сдвига поколения хранится рядом, отдельным ключом
+MODIFIED_KEY = '{key}:modified'
+
+
+def _initial_generation():
+    # Если ключ вытеснен из кэша, новое поколение не совпадет со старыми
+    return int(time.time() * 1000)
+
+
+def get_generation(key):
+    generation = cache.get(key)
+    if generation is None:
+        if cache.add(key, _initial_generation(), None):
+            # Что было до вытеснения, неизвестно: считаем, что изменение
+            # было сейчас
+            cache.set(MODIFIED_KEY.format(key=key), time.time(), None)
+        generation = cache.get(key, _initial_generation())
+    return generation
+
+
+def bump_generation(key):
+    """ Новое поколение делает недействительными все ключи старого.
+    Поколение - счетчик, который сдвигается атомарным incr; время
+    изменения записывается после него отдельным ключом. Читатель между
+    двумя записями увидит новое поколение со старым временем, то есть
+    лишний раз получит страницу целиком, но не 304 со старой страницей """
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_generation(), None)
+    cache.set(MODIFIED_KEY.format(key=key), time.time(), None)
+
+
+def bump_generations(keys):
+    """ Сдвигает поколения многих ключей двумя записями set_many вместо
+    двух обращений на ключ. Новое поколение - случайное число, а не
+    incr: при гонке двух сдвигов ключ все равно получит значение,
+    которого у него еще не было """
+    cache.set_many({key: secrets.randbits(62) for key in keys}, None)
+    now = time.time()
+    cache.set_many(
+        {MODIFIED_KEY.format(key=key): now for key in keys}, None)
+
+
+def last_modified(keys):
+    """ Время последнего сдвига поколений ключей keys, в секундах.
+    Для ключей без сохраненного времени это время первого чтения """
+    names = [MODIFIED_KEY.format(key=key) for key in keys]
+    found = cache.get_many(names)
+    now = time.time()
+    for name in names:
+        if name not in found:
+            cache.add(name, now, None)
+            found[name] = cache.get(name, now)
+    return max(found.values(), default=0)
+
+
+def bump_feeds():
+    bump_generation(FEED_GENERATION_KEY)
+
+
+def bump_follow_feed(user_id):
+    bump_generation(FOLLOW_GENERATION_KEY.format(user_id=user_id))
+
+
+def bump_comments(post_id):
+    bump_generation(COMMENTS_GENERATION_KEY.format(post_id=post_id))
+
+
+def comments_cache_context(request, post_id):
+    """ Ключ фрагмента с первой страницей комментариев поста.
+    Следующие страницы, открытые по курсору, не кэшируются """
+    if request.GET.get('cursor'):
+        return {'comments_cache_key': None}
+    generation = get_generation(
+        COMMENTS_GENERATION_KEY.format(post_id=post_id))
+    return {
+        'comments_cache_key': f'comments:{post_id}:{generation}',
+        'comments_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
+
+
+def feed_cache_context(request, kind):
+    """ Ключ и время жизни фрагмента ленты для тега {% cache %}.
+    В ключе вид ленты, зритель (кнопка редактирования видна только
+    автору), поколение данных и номер страницы или курсор """
+    user_id = request.user.pk or 0
+    parts = [kind, user_id, get_generation(FEED_GENERATION_KEY)]
+    if kind == 'follow':
+        parts.append(get_generation(
+            FOLLOW_GENERATION_KEY.format(user_id=user_id)))
+    parts.append(request.GET.urlencode())
+
+    return {
+        'feed_cache_key': ':'.join(str(part) for part in parts),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
@@ -0,0 +1,133 @@
+"""
+Условные GET-запросы для лент и страниц постов.
+
+Валидаторы страницы считаются до отрисовки из поколений ключей кэша
+(caching): поколение сдвигается при каждом изменении показанных данных,
+а рядом записывается время этого изменения. ETag - хэш поколений,
+зрителя и параметров адреса, Last-Modified - время последнего из
+изменений. Совпавший If-None-Match получает 304 без запросов за постами
+и без шаблонов. If-Modified-Since не учитывается: Last-Modified точен
+до секунды, и изменение в ту же секунду, что и показ страницы, его
+не сдвигает, а ETag есть у каждой страницы.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .caching import (
+    FEED_GENERATION_KEY, NOTIFICATIONS_GENERATION_KEY, get_generation,
+    last_modified)
+from .pagecache import ALL_PAGES, generation_key
+
+
+User = get_user_model()
+
+
+def _generations(keys):
+    found = cache.get_many(keys)
+    return [
+        found[key] if key in found else get_generation(key) for key in keys
+    ]
+
+
+def _viewer(request):
+    """ Чем страница отличается для зрителя: имя в меню, кнопки автора,
+    а у вошедших еще и CSRF-токен в формах """
+    if not request.user.is_authenticated:
+        return 'anonymous'
+    return f'{request.user.pk}:{request.META.get("CSRF_COOKIE", "")}'
+
+
+def validators(request, keys):
+    """ (ETag, Last-Modified) страницы с данными под ключами keys """
+    keys = [*keys, generation_key(ALL_PAGES)]
+    if request.user.is_authenticated:
+        # У вошедших в меню число непрочитанных уведомлений
+        keys.append(
+            NOTIFICATIONS_GENERATION_KEY.format(user_id=request.user.pk))
+    generations = _generations(keys)
+    payload = ':'.join([
+        _viewer(request),
+        request.GET.urlencode(),
+        *(str(generation) for generation in generations),
+    ])
+    etag = '"{}"'.format(hashlib.md5(payload.encode()).hexdigest())
+    # Время записал другой сервер, его часы могут спешить
+    modified = min(int(last_modified(keys)), int(time.time()))
+    return etag, modified
+
+
+def set_cache_control(request, response):
+    """ Анонимные страницы одинаковы для всех и могут храниться в общих
+    кэшах, страницы вошедших - только в браузере. И те и другие
+    перепроверяются при каждом показе: это дешево благодаря 304 """
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=0, must_revalidate=True)
+
+
+def conditional_page(get_keys):
+    """ Отвечает 304 на условные запросы, если данные страницы не менялись.
+    get_keys(request, *args, **kwargs) - ключи поколений показанных данных
+    или None, если страница не существует """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            keys = get_keys(request, *args, **kwargs)
+            if keys is None:
+                return view(request, *args, **kwargs)
+
+            etag, last_modified = validators(request, keys)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            set_cache_control(request, response)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _author_key(username):
+    author_id = User.objects.filter(
+        username=username).values_list('pk', flat=True).first()
+    if author_id is None:
+        return None
+    return generation_key(f'author:{author_id}')
+
+
+def feed_generations(request, *args, **kwargs):
+    """ Любое изменение постов, комментариев и групп сдвигает поколение
+    лент, его и достаточно общей ленте и лентам групп """
+    return [FEED_GENERATION_KEY]
+
+
+def profile_generations(request, username):
+    # Кроме постов на странице автора счетчики подписок
+    author_key = _author_key(username)
+    if author_key is None:
+        return None
+    return [FEED_GENERATION_KEY, author_key]
+
+
+def post_generations(request, username, post_id):
+    # Пост, комментарии к нему и карточка автора со счетчиками
+    author_key = _author_key(username)
+    if author_key is None:
+        return None
+    return [generation_key(f'post:{post_id}'), author_key]
@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Notification, Post, UserStats
+
+
+User = get_user_model()
+
+# Счетчик -> (модель, поле со ссылкой на пользователя, условие)
+COUNTERS = {
+    'followers': (Follow, 'author', Q()),
+    'following': (Follow, 'user', Q()),
+    'posts': (Post, 'author', Q()),
+    'comments': (Comment, 'author', Q()),
+    'unread_notifications': (Notification, 'user', Q(is_read=False)),
+}
+
+
+def _count(model, field, condition, outer='pk'):
+    rows = model.objects.filter(
+        condition, **{field: OuterRef(outer)}
+    ).order_by().values(field).annotate(
+        count=Count('pk')
+    ).values('count')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def annotate_counts(users):
+    """ Добавляет к пользователям реальные значения счетчиков """
+    return users.annotate(**{
+        f'real_{name}': _count(model, field, condition)
+        for name, (model, field, condition) in COUNTERS.items()
+    })
+
+
+def compute(user_id):
+    # Результат записывается в UserStats, поэтому считается по основной
+    # базе, даже если представление читает с реплики (use_replica)
+    users = User.objects.using(DEFAULT_DB_ALIAS).filter(pk=user_id)
+    counts = annotate_counts(users).values(
+        *(f'real_{name}' for name in COUNTERS)
+    ).get()
+    return {name: counts[f'real_{name}'] for name in COUNTERS}
+
+
+def get_stats(user_id):
+    """ Счетчики пользователя; при первом обращении считаются по таблицам """
+    try:
+        return UserStats.objects.get(user_id=user_id)
+    except UserStats.DoesNotExist:
+        stats, _ = UserStats.objects.get_or_create(
+            user_id=user_id, defaults=compute(user_id))
+        return stats
+
+
+def change(user_id, **deltas):
+    """ Сдвигает счетчики в той же транзакции, что и сама запись.
+    Строки еще нет - ее посчитает get_stats при первом чтении """
+    UserStats.objects.filter(user_id=user_id).update(**{
+        name: Greatest(F(name) + delta, 0) for name, delta in deltas.items()
+    })
+
+
+def recount(name, user_ids):
+    """ Пересчитывает один счетчик пользователей по таблице одним
+    UPDATE. В отличие от change его можно безопасно повторять """
+    model, field, condition = COUNTERS[name]
+    UserStats.objects.filter(user_id__in=user_ids).update(**{
+        name: _count(model, field, condition, outer='user_id')
+    })
+
+
+def repair(batch_size=1000, dry_run=False):
+    """ Пересчитывает счетчики пачками, возвращает число исправленных """
+    fixed = 0
+    last_pk = 0
+    while True:
+        users = list(annotate_counts(
+            User.objects.filter(pk__gt=last_pk).order_by('pk')
+        ).select_related('stats')[:batch_size])
+        if not users:
+            return fixed
+        last_pk = users[-1].pk
+
+        created, updated = [], []
+        for user in users:
+            real = {name: getattr(user, f'real_{name}') for name in COUNTERS}
+            try:
+                stats = user.stats
+            except UserStats.DoesNotExist:
+                created.append(UserStats(user=user, **real))
+                continue
+            if any(getattr(stats, name) != value
+                   for name, value in real.items()):
+                for name, value in real.items():
+                    setattr(stats, name, value)
+                updated.append(stats)
+
+        fixed += len(created) + len(updated)
+        if not dry_run:
+            UserStats.objects.bulk_create(created, ignore_conflicts=True)
+            UserStats.objects.bulk_update(updated, list(COUNTERS))
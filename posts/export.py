@@ -0,0 +1,141 @@
+"""
+Потоковая выгрузка постов, комментариев, групп и подписок.
+
+Строки читаются итератором запроса пачками по chunk_size (в PostgreSQL -
+серверным курсором) и сразу превращаются в строки NDJSON или CSV, так
+что память не растет с объемом выгрузки. Модели не создаются: данные
+выбираются через values(), имена авторов - тем же запросом.
+"""
+import csv
+import json
+from collections import namedtuple
+from datetime import date
+
+from django.db.models import F
+
+from .models import Comment, Follow, Group, Post
+
+
+CHUNK_SIZE = 2000
+
+FORMATS = ('ndjson', 'csv')
+
+# Что выгружается из таблицы и по каким полям ее фильтровать
+Table = namedtuple(
+    'Table', 'model fields names date_field author_field group_field')
+
+TABLES = {
+    'posts': Table(
+        model=Post,
+        fields=('id', 'text', 'pub_date', 'author_id', 'group_id', 'image'),
+        names={
+            'author_username': F('author__username'),
+            'group_slug': F('group__slug'),
+        },
+        date_field='pub_date',
+        author_field='author__username',
+        group_field='group__slug'),
+    'comments': Table(
+        model=Comment,
+        fields=('id', 'post_id', 'author_id', 'text', 'created'),
+        names={'author_username': F('author__username')},
+        date_field='created',
+        author_field='author__username',
+        group_field='post__group__slug'),
+    'groups': Table(
+        model=Group,
+        fields=('id', 'title', 'slug', 'description'),
+        names={},
+        date_field=None,
+        author_field=None,
+        group_field='slug'),
+    'follows': Table(
+        model=Follow,
+        fields=('id', 'user_id', 'author_id'),
+        names={
+            'user_username': F('user__username'),
+            'author_username': F('author__username'),
+        },
+        date_field=None,
+        author_field='author__username',
+        group_field=None),
+}
+
+
+def table_name(model):
+    return next(name for name, table in TABLES.items() if table.model is model)
+
+
+def columns(name):
+    table = TABLES[name]
+    return [*table.fields, *table.names]
+
+
+def filter_rows(name, queryset=None, since=None, until=None, author=None,
+                group=None):
+    """ Записи таблицы с фильтрами. Фильтр, которого у таблицы нет
+    (дата у групп, группа у подписок), к ней не применяется """
+    table = TABLES[name]
+    if queryset is None:
+        queryset = table.model.objects.all()
+    if table.date_field is not None:
+        if since is not None:
+            queryset = queryset.filter(**{f'{table.date_field}__gte': since})
+        if until is not None:
+            queryset = queryset.filter(**{f'{table.date_field}__lt': until})
+    if author is not None and table.author_field is not None:
+        queryset = queryset.filter(**{table.author_field: author})
+    if group is not None and table.group_field is not None:
+        queryset = queryset.filter(**{table.group_field: group})
+    return queryset
+
+
+def rows(name, queryset, chunk_size=CHUNK_SIZE):
+    """ Словари строк в порядке id, без моделей и без списка в памяти """
+    table = TABLES[name]
+    return queryset.order_by('pk').values(
+        *table.fields, **table.names).iterator(chunk_size=chunk_size)
+
+
+def _json_value(value):
+    # Даты - полностью, с микросекундами: выгрузку можно загрузить обратно
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'Нельзя выгрузить в JSON: {value!r}')
+
+
+def ndjson_lines(name, rows):
+    """ Строка JSON на запись; model позволяет писать таблицы подряд """
+    model = TABLES[name].model._meta.model_name
+    for row in rows:
+        yield json.dumps(
+            {'model': model, **row}, ensure_ascii=False,
+            default=_json_value) + '\n'
+
+
+class _Echo:
+    # csv.writer пишет в "файл", который просто возвращает строку
+    def write(self, value):
+        return value
+
+
+def csv_lines(name, rows):
+    writer = csv.writer(_Echo())
+    names = columns(name)
+    yield writer.writerow(names)
+    for row in rows:
+        yield writer.writerow([_csv_value(row[column]) for column in names])
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def lines(name, queryset, fmt, chunk_size=CHUNK_SIZE):
+    """ Строки выгрузки таблицы в формате fmt """
+    write = ndjson_lines if fmt == 'ndjson' else csv_lines
+    return write(name, rows(name, queryset, chunk_size))
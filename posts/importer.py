@@ -0,0 +1,327 @@
+"""
+Пакетный импорт групп, постов, комментариев и подписок из NDJSON.
+
+Формат строк - как у выгрузки export_posts: поле model ('group', 'post',
+'comment', 'follow'), авторы и подписчики - по именам (author_username,
+user_username), группы - по слагам (group_slug). id поста из файла
+нужен только для того, чтобы комментарии из того же файла сослались на
+него через post_id; в базе у поста будет новый id.
+
+Строки копятся пачками и вставляются bulk_create с исходными датами
+pub_date и created. Имена и слаги ищутся одним запросом на пачку и
+запоминаются. Ошибочная строка попадает в отчет, остальные
+импортируются. Сигналы bulk_create не вызывает, поэтому в конце
+обновляются производные данные только импортированных записей: счетчики
+затронутых пользователей, ленты и поисковый индекс новых постов и подписок.
+"""
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import caching, counters, pagecache, search, seed, timeline
+from .models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+
+# Порядок вставки пачек: ссылки ведут только на уже вставленное
+KINDS = ('group', 'post', 'comment', 'follow')
+
+# Счетчики, которые меняет импорт; уведомлений он не создает
+RECOUNTED = ('posts', 'comments', 'followers', 'following')
+
+
+class RowError(ValueError):
+    """ Строку нельзя импортировать """
+
+
+def _text(row, name, required=True):
+    value = row.get(name)
+    if value is None or value == '':
+        if required:
+            raise RowError(f'нет поля {name}')
+        return ''
+    if not isinstance(value, str):
+        raise RowError(f'{name} должно быть строкой')
+    return value
+
+
+def _date(row, name):
+    value = parse_datetime(_text(row, name))
+    if value is None:
+        raise RowError(f'{name}: неверная дата {row[name]!r}')
+    if settings.USE_TZ and timezone.is_naive(value):
+        return timezone.make_aware(value)
+    if not settings.USE_TZ and timezone.is_aware(value):
+        return timezone.make_naive(value)
+    return value
+
+
+def _reference(row, name, required=True):
+    value = row.get(name)
+    if value is None and not required:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise RowError(f'{name} должно быть числом или строкой')
+    return value
+
+
+def _errors(error):
+    return '; '.join(
+        f'{field}: {" ".join(messages)}'
+        for field, messages in error.message_dict.items())
+
+
+class Importer:
+    def __init__(self, batch_size=BATCH_SIZE, create_users=False,
+                 on_error=None):
+        self.batch_size = batch_size
+        self.create_users = create_users
+        self.on_error = on_error
+        # Имя -> id, слаг -> id, id поста в файле -> id в базе
+        self.users = {}
+        self.groups = {}
+        self.posts = {}
+        # Что обновить в finish: новые посты и подписки, пользователи
+        # с изменившимися счетчиками
+        self.new_posts = []
+        self.new_follows = []
+        self.recount = {name: set() for name in RECOUNTED}
+        self.pending = {kind: [] for kind in KINDS}
+        self.created = Counter()
+        self.errors = 0
+
+    def error(self, number, message):
+        self.errors += 1
+        if self.on_error is not None:
+            self.on_error(number, message)
+
+    def feed(self, lines):
+        """ Импортирует строки NDJSON; пустые строки пропускаются """
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                self.add(number, json.loads(line))
+            except ValueError as error:
+                self.error(number, str(error))
+            if any(len(rows) >= self.batch_size
+                   for rows in self.pending.values()):
+                self.flush()
+        self.flush()
+
+    def add(self, number, row):
+        if not isinstance(row, dict):
+            raise RowError('строка должна быть объектом JSON')
+        kind = row.get('model')
+        if kind not in KINDS:
+            raise RowError(f'неизвестная модель {kind!r}')
+        parse = getattr(self, f'_parse_{kind}')
+        self.pending[kind].append((number, parse(row)))
+
+    def _parse_group(self, row):
+        return {
+            'slug': _text(row, 'slug'),
+            'title': _text(row, 'title'),
+            'description': _text(row, 'description', required=False),
+        }
+
+    def _parse_post(self, row):
+        return {
+            'source_id': _reference(row, 'id', required=False),
+            'text': _text(row, 'text'),
+            'pub_date': _date(row, 'pub_date'),
+            'author': _text(row, 'author_username'),
+            'group': _text(row, 'group_slug', required=False) or None,
+            'image': _text(row, 'image', required=False),
+        }
+
+    def _parse_comment(self, row):
+        return {
+            'post': _reference(row, 'post_id'),
+            'text': _text(row, 'text'),
+            'created': _date(row, 'created'),
+            'author': _text(row, 'author_username'),
+        }
+
+    def _parse_follow(self, row):
+        user = _text(row, 'user_username')
+        author = _text(row, 'author_username')
+        if user == author:
+            raise RowError('нельзя подписаться на себя')
+        return {'user': user, 'author': author}
+
+    def flush(self):
+        """ Вставляет накопленные пачки по порядку зависимостей """
+        for kind in KINDS:
+            rows, self.pending[kind] = self.pending[kind], []
+            if rows:
+                getattr(self, f'_flush_{kind}')(rows)
+
+    def _resolve_users(self, names):
+        missing = set(names) - set(self.users)
+        if not missing:
+            return
+        self.users.update(User.objects.filter(
+            username__in=missing).values_list('username', 'pk'))
+        missing -= set(self.users)
+        if missing and self.create_users:
+            # Пароль не задан: войти можно после сброса пароля
+            password = make_password(None)
+            User.objects.bulk_create(
+                [User(username=name, password=password) for name in missing],
+                ignore_conflicts=True)
+            self.users.update(User.objects.filter(
+                username__in=missing).values_list('username', 'pk'))
+            self.created['user'] += len(missing)
+
+    def _resolve_groups(self, slugs):
+        missing = set(slugs) - set(self.groups)
+        if missing:
+            self.groups.update(Group.objects.filter(
+                slug__in=missing).values_list('slug', 'pk'))
+
+    def _build(self, rows, make):
+        """ Модели из строк; строки с ошибками - в отчет """
+        built = []
+        for number, data in rows:
+            try:
+                obj = make(data)
+                obj.clean_fields(exclude=['author', 'user', 'post', 'group'])
+            except RowError as error:
+                self.error(number, str(error))
+            except ValidationError as error:
+                self.error(number, _errors(error))
+            else:
+                built.append((number, data, obj))
+        return built
+
+    def _user(self, name):
+        if name not in self.users:
+            raise RowError(f'нет пользователя {name}')
+        return self.users[name]
+
+    def _insert(self, kind, model, built, **options):
+        """ bulk_create пачки; если пачка не вставилась, строки
+        вставляются по одной, чтобы найти ошибочные """
+        if not built:
+            return []
+        try:
+            with transaction.atomic():
+                self._bulk_create(model, [obj for _, _, obj in built],
+                                  **options)
+            inserted = built
+        except DatabaseError:
+            inserted = []
+            for row in built:
+                try:
+                    with transaction.atomic():
+                        self._bulk_create(model, [row[2]], **options)
+                except DatabaseError as error:
+                    self.error(row[0], str(error))
+                else:
+                    inserted.append(row)
+        self.created[kind] += len(inserted)
+        return inserted
+
+    def _bulk_create(self, model, objects, **options):
+        # Без RETURNING у базы id новых записей задаются явно:
+        # по ним комментарии находят свои посты
+        if not connection.features.can_return_ids_from_bulk_insert \
+                and not options.get('ignore_conflicts'):
+            start = (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+            for offset, obj in enumerate(objects):
+                obj.pk = start + offset
+        with seed.explicit_dates((Post, 'pub_date'), (Comment, 'created')):
+            model.objects.bulk_create(objects, **options)
+
+    def _flush_group(self, rows):
+        built = self._build(rows, lambda data: Group(**data))
+        self._insert('group', Group, built, ignore_conflicts=True)
+        self.groups.update(Group.objects.filter(
+            slug__in=[data['slug'] for _, data, _ in built]
+        ).values_list('slug', 'pk'))
+
+    def _flush_post(self, rows):
+        self._resolve_users(data['author'] for _, data in rows)
+        self._resolve_groups(
+            data['group'] for _, data in rows if data['group'])
+
+        def make(data):
+            group = data['group']
+            if group is not None and group not in self.groups:
+                raise RowError(f'нет группы {group}')
+            return Post(
+                text=data['text'],
+                pub_date=data['pub_date'],
+                author_id=self._user(data['author']),
+                group_id=self.groups.get(group),
+                image=data['image'] or None)
+
+        for _, data, post in self._insert(
+                'post', Post, self._build(rows, make)):
+            if data['source_id'] is not None:
+                self.posts[data['source_id']] = post.pk
+            self.new_posts.append(post.pk)
+            self.recount['posts'].add(post.author_id)
+
+    def _flush_comment(self, rows):
+        self._resolve_users(data['author'] for _, data in rows)
+
+        def make(data):
+            if data['post'] not in self.posts:
+                raise RowError(f'нет поста {data["post"]} в файле')
+            return Comment(
+                text=data['text'],
+                created=data['created'],
+                author_id=self._user(data['author']),
+                post_id=self.posts[data['post']])
+
+        for _, _, comment in self._insert(
+                'comment', Comment, self._build(rows, make)):
+            self.recount['comments'].add(comment.author_id)
+
+    def _flush_follow(self, rows):
+        self._resolve_users(
+            name for _, data in rows
+            for name in (data['user'], data['author']))
+
+        def make(data):
+            return Follow(
+                user_id=self._user(data['user']),
+                author_id=self._user(data['author']))
+
+        # Уже существующие подписки пропускаются; для них finish ничего
+        # не добавит: записи лент вставляются без конфликтов
+        for _, _, follow in self._insert(
+                'follow', Follow, self._build(rows, make),
+                ignore_conflicts=True):
+            self.new_follows.append((follow.user_id, follow.author_id))
+            self.recount['followers'].add(follow.author_id)
+            self.recount['following'].add(follow.user_id)
+
+    def finish(self, index=True):
+        """ Обновляет производные данные импортированных записей после
+        всех пачек. Счетчики первыми - по числу подписчиков лента решает,
+        раскладывать ли посты автора """
+        seed.reset_sequences()
+        for name, user_ids in self.recount.items():
+            user_ids = sorted(user_ids)
+            for start in range(0, len(user_ids), self.batch_size):
+                counters.recount(name, user_ids[start:start + self.batch_size])
+        timeline.fan_out_posts(self.new_posts)
+        timeline.backfill_follows(self.new_follows)
+        if index:
+            search.index_posts(self.new_posts)
+        caching.bump_feeds()
+        pagecache.purge_all()
@@ -0,0 +1,104 @@
+import gzip
+import io
+import sys
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import export
+from posts.models import Group
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Выгружает посты, комментарии, группы и подписки в NDJSON '
+            'или CSV потоком, без загрузки таблиц в память')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'tables',
+            nargs='*',
+            metavar='table',
+            help=f'Таблицы выгрузки: {", ".join(export.TABLES)}. '
+                 f'По умолчанию posts, в CSV - одна таблица')
+        parser.add_argument(
+            '--format', choices=export.FORMATS, default='ndjson')
+        parser.add_argument(
+            '--output', '-o',
+            default='-',
+            help='Файл выгрузки, по умолчанию стандартный вывод')
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжать выгрузку gzip')
+        parser.add_argument(
+            '--since', help='Записи с этой даты ГГГГ-ММ-ДД включительно')
+        parser.add_argument(
+            '--until', help='Записи до этой даты ГГГГ-ММ-ДД включительно')
+        parser.add_argument('--author', help='Имя автора')
+        parser.add_argument('--group', help='Слаг группы')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=export.CHUNK_SIZE,
+            help='Строк, читаемых из базы за раз')
+
+    def date(self, value, option):
+        if value is None:
+            return None
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise CommandError(f'Дата {option} должна быть в виде ГГГГ-ММ-ДД')
+        # Начало дня по местному времени
+        return timezone.make_aware(day) if settings.USE_TZ else day
+
+    def handle(self, *args, **options):
+        tables = options['tables'] or ['posts']
+        unknown = set(tables) - set(export.TABLES)
+        if unknown:
+            raise CommandError(f'Нет таблиц: {", ".join(sorted(unknown))}')
+        if options['format'] == 'csv' and len(tables) > 1:
+            raise CommandError('В CSV выгружается одна таблица за раз')
+        if options['chunk_size'] <= 0:
+            raise CommandError('--chunk-size должен быть больше нуля')
+
+        author, group = options['author'], options['group']
+        if author and not User.objects.filter(username=author).exists():
+            raise CommandError(f'Нет автора {author}')
+        if group and not Group.objects.filter(slug=group).exists():
+            raise CommandError(f'Нет группы {group}')
+        until = self.date(options['until'], '--until')
+        filters = {
+            'since': self.date(options['since'], '--since'),
+            # Последний день входит в выгрузку целиком
+            'until': until + timedelta(days=1) if until else None,
+            'author': author,
+            'group': group,
+        }
+
+        with self.open(options['output'], options['gzip']) as output:
+            for name in tables:
+                queryset = export.filter_rows(name, **filters)
+                count = 0
+                for line in export.lines(
+                        name, queryset, options['format'],
+                        options['chunk_size']):
+                    output.write(line)
+                    count += 1
+                if options['format'] == 'csv':
+                    count -= 1
+                self.stderr.write(f'{name}: {count}')
+
+    def open(self, path, compress):
+        """ Текстовый поток выгрузки поверх файла или stdout """
+        if path == '-':
+            raw = open(sys.stdout.fileno(), 'wb', closefd=False)
+        else:
+            raw = open(path, 'wb')
+        if compress:
+            raw = gzip.GzipFile(fileobj=raw, mode='wb', filename='')
+        return io.TextIOWrapper(raw, encoding='utf-8', newline='')
@@ -0,0 +1,68 @@
+import gzip
+import io
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import importer
+
+
+class Command(BaseCommand):
+    help = ('Импортирует группы, посты, комментарии и подписки из NDJSON '
+            'пачками bulk_create с исходными датами')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files',
+            nargs='+',
+            help='Файлы NDJSON (.gz - сжатые gzip), - для стандартного ввода')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=importer.BATCH_SIZE,
+            help='Строк одного вида в пачке')
+        parser.add_argument(
+            '--create-users',
+            action='store_true',
+            help='Создавать недостающих пользователей без пароля')
+        parser.add_argument(
+            '--no-index',
+            action='store_true',
+            help='Не строить поисковый индекс, '
+                 'его можно построить позже командой rebuild_search_index')
+
+    def open(self, path):
+        if path == '-':
+            return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+        try:
+            if path.endswith('.gz'):
+                return gzip.open(path, 'rt', encoding='utf-8')
+            return open(path, encoding='utf-8')
+        except OSError as error:
+            raise CommandError(f'Нельзя открыть {path}: {error}')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size должен быть больше нуля')
+        started = time.perf_counter()
+        # Один импорт на все файлы: комментарии могут ссылаться на посты
+        # из предыдущего файла
+        task = importer.Importer(
+            batch_size=options['batch_size'],
+            create_users=options['create_users'])
+        for path in options['files']:
+            created, errors = task.created.copy(), task.errors
+            task.on_error = lambda number, message, path=path: \
+                self.stderr.write(f'{path}:{number}: {message}')
+            with self.open(path) as lines:
+                task.feed(lines)
+            self.stdout.write(f'{path}: ' + ', '.join(
+                f'{kind} {count}'
+                for kind, count in (task.created - created).items()
+            ) + f'; ошибок {task.errors - errors}')
+
+        self.stdout.write('Обновление счетчиков, лент и индекса...')
+        task.finish(index=not options['no_index'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с'))
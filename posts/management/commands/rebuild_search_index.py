@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import BATCH_SIZE, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает поисковый индекс по постам и комментариям'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Сколько постов индексировать за один проход')
+
+    def handle(self, *args, **options):
+        indexed = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {indexed}'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import repair
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики подписчиков, подписок, постов '
+            'и комментариев')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько пользователей пересчитывать за один запрос')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать расхождения, ничего не сохранять')
+
+    def handle(self, *args, **options):
+        fixed = repair(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счетчиков: {fixed}'))
@@ -0,0 +1,104 @@
+import time
+from datetime import datetime
+from functools import partial
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts import seed
+
+
+class Command(BaseCommand):
+    help = ('Быстро создает синтетических пользователей, группы, посты, '
+            'комментарии и подписки пачками bulk_create')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=30000)
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=20,
+            help='Среднее число подписок на пользователя')
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Зерно: одинаковые параметры и зерно дают одинаковые данные')
+        parser.add_argument(
+            '--until',
+            help='Дата последнего поста ГГГГ-ММ-ДД, по умолчанию сегодня')
+        parser.add_argument(
+            '--prefix',
+            default='user',
+            help='Начало имен пользователей и слагов групп')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=seed.BATCH_SIZE,
+            help='Строк в одной пачке и транзакции')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Параллельных процессов; SQLite все равно пишет по очереди')
+        parser.add_argument(
+            '--no-index',
+            action='store_true',
+            help='Не строить поисковый индекс, '
+                 'его можно построить позже командой rebuild_search_index')
+
+    def until(self, value):
+        if value is None:
+            return seed.midnight()
+        try:
+            return seed.midnight(datetime.strptime(value, '%Y-%m-%d'))
+        except ValueError:
+            raise CommandError('Дата --until должна быть в виде ГГГГ-ММ-ДД')
+
+    def handle(self, *args, **options):
+        params = seed.Params(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            seed=options['seed'],
+            until=self.until(options['until']),
+            prefix=options['prefix'])
+        if params.users <= 0 and (params.posts or params.comments):
+            raise CommandError('Постам и комментариям нужны пользователи')
+        if params.posts <= 0 and params.comments:
+            raise CommandError('Комментариям нужны посты')
+
+        started = time.perf_counter()
+        params = seed.free_prefix(params)
+        starts, stages = seed.plan(params, options['batch_size'])
+        insert = partial(seed.insert_chunk, params, starts)
+
+        for chunks in stages:
+            if options['workers'] > 1:
+                # Дочерние процессы не должны делить соединения с родителем
+                connections.close_all()
+                with Pool(options['workers']) as pool:
+                    self.report(pool.imap_unordered(insert, chunks), chunks)
+            else:
+                self.report(map(insert, chunks), chunks)
+
+        seed.reset_sequences()
+        self.stdout.write('Пересчет счетчиков, лент и индекса...')
+        seed.rebuild_derived(index=not options['no_index'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с'))
+
+    def report(self, results, chunks):
+        created = {}
+        for done, (kind, count) in enumerate(results, start=1):
+            created[kind] = created.get(kind, 0) + count
+            if done % 10 == 0 or done == len(chunks):
+                self.stdout.write(f'Пачек {done}/{len(chunks)}: ' + ', '.join(
+                    f'{kind} {count}' for kind, count in created.items()))
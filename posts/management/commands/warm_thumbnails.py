@@ -0,0 +1,115 @@
+import logging
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.caching import bump_feeds
+from posts.models import Post
+
+
+logger = logging.getLogger(__name__)
+
+
+def _warm(post):
+    """ Задача пула: (id поста, создано миниатюр или None при ошибке) """
+    pk, image = post
+    try:
+        return pk, thumbnails.warm(Post(pk=pk, image=image).image)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры поста %s', pk)
+        return pk, None
+
+
+class Command(BaseCommand):
+    help = ('Заранее создает недостающие миниатюры картинок постов '
+            'и удаляет картинки и миниатюры, на которые никто не ссылается')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.THUMBNAIL_WORKERS,
+            help='Число процессов; 1 - создавать миниатюры в этом процессе')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько постов читать из базы за один запрос')
+        parser.add_argument(
+            '--start-after',
+            type=int,
+            default=0,
+            help='Продолжить с постов, id которых больше указанного')
+        parser.add_argument(
+            '--cleanup',
+            action='store_true',
+            help='Удалить картинки и миниатюры, не нужные ни одному посту')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Вместе с --cleanup: только посчитать, ничего не удалять')
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=settings.THUMBNAIL_CLEANUP_GRACE,
+            help='Вместе с --cleanup: не трогать файлы моложе стольких '
+                 'секунд')
+
+    def posts(self, start_after, batch_size):
+        """ Посты с картинками пачками по возрастанию id """
+        last_pk = start_after
+        while True:
+            batch = list(Post.objects.filter(
+                pk__gt=last_pk
+            ).exclude(image='').order_by('pk').values_list(
+                'pk', 'image')[:batch_size])
+            if not batch:
+                return
+            yield from batch
+            last_pk = batch[-1][0]
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            self.cleanup(options['dry_run'], options['grace'])
+            return
+
+        total = Post.objects.filter(
+            pk__gt=options['start_after']).exclude(image='').count()
+        posts = self.posts(options['start_after'], options['batch_size'])
+
+        if options['workers'] > 1:
+            # Дочерние процессы не должны делить соединения с родителем
+            connections.close_all()
+            with Pool(options['workers']) as pool:
+                self.report(pool.imap(_warm, posts), total)
+        else:
+            self.report(map(_warm, posts), total)
+
+    def report(self, results, total):
+        created = failed = 0
+        for done, (pk, count) in enumerate(results, start=1):
+            if count is None:
+                failed += 1
+            else:
+                created += count
+            if done % 100 == 0 or done == total:
+                # Результаты идут по порядку id, поэтому с последнего
+                # выведенного id можно продолжить после прерывания
+                self.stdout.write(
+                    f'{done}/{total}, создано миниатюр: {created}, '
+                    f'последний пост: {pk} (--start-after {pk})')
+
+        if created:
+            bump_feeds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано миниатюр: {created}, ошибок: {failed}'))
+
+    def cleanup(self, dry_run, grace):
+        images, thumbnails_count = thumbnails.cleanup(
+            dry_run=dry_run, grace=grace)
+        verb = 'Будет удалено' if dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} картинок: {images}, миниатюр: {thumbnails_count}'))
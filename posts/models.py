@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 
 
@@ -27,6 +29,22 @@ class Group(models.Model):
         verbose_name_plural = 'Группы'
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """ Посты для ленты: автор, группа и число комментариев
+        загружаются одним запросом """
+        comments = Comment.objects.filter(
+            post=OuterRef('pk')
+        ).order_by().values('post').annotate(
+            count=Count('pk')
+        ).values('count')
+
+        return self.select_related('author', 'group').annotate(
+            comment_count=Coalesce(
+                Subquery(comments, output_field=IntegerField()), 0)
+        )
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Пост',
@@ -55,6 +73,8 @@ class Post(models.Model):
         blank=True,
         null=True)
 
+    objects = PostQuerySet.as_manager()
+
     def __str__(self):
         return self.text[:15]
 
@@ -62,6 +82,15 @@ class Post(models.Model):
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         ordering = ['-pub_date']
+        # Ленты группы и профиля: фильтр и сортировка по одному индексу
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'),
+        ]
 
 
 class Comment(models.Model):
@@ -91,6 +120,11 @@ class Comment(models.Model):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx'),
+        ]
 
 
 class Follow(models.Model):
@@ -119,4 +153,172 @@ class Follow(models.Model):
                 name='unique_subscriber'
             )
         ]
-        ordering = ['-user']
+        # Уникальный индекс начинается с автора, а подписки
+        # пользователя ищутся по подписчику
+        indexes = [
+            models.Index(
+                fields=['user', 'author'],
+                name='follow_user_author_idx'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """ Запись материализованной ленты подписок: пост автора,
+    разложенный в ленту каждого подписчика при публикации """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор')
+    pub_date = models.DateTimeField(verbose_name='Время публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx'),
+        ]
+
+
+class UserStats(models.Model):
+    """ Денормализованные счетчики профиля пользователя """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь')
+    followers = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков')
+    following = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок')
+    posts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Записей')
+    comments = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Комментариев')
+    unread_notifications = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Непрочитанных уведомлений')
+
+    def __str__(self):
+        return f'Счетчики {self.user_id}'
+
+    class Meta:
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+
+class SearchEntry(models.Model):
+    """ Строка инвертированного индекса: основа слова -> пост """
+    term = models.CharField(
+        max_length=64,
+        verbose_name='Основа слова')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_entries',
+        verbose_name='Пост')
+    weight = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Вес')
+
+    class Meta:
+        verbose_name = 'Запись поискового индекса'
+        verbose_name_plural = 'Записи поискового индекса'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['term', 'post'],
+                name='unique_search_entry'
+            )
+        ]
+
+
+class Notification(models.Model):
+    """ Уведомление во входящих: новый пост автора из подписок
+    или комментарий к посту пользователя """
+    POST = 'post'
+    COMMENT = 'comment'
+    KINDS = (
+        (POST, 'Новый пост'),
+        (COMMENT, 'Комментарий'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+        verbose_name='Получатель')
+    kind = models.CharField(
+        max_length=10,
+        choices=KINDS,
+        verbose_name='Тип')
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Пост')
+    comment = models.ForeignKey(
+        Comment,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Комментарий')
+    created = models.DateTimeField(verbose_name='Время события')
+    is_read = models.BooleanField(
+        default=False,
+        verbose_name='Прочитано')
+
+    class Meta:
+        verbose_name = 'Уведомление'
+        verbose_name_plural = 'Уведомления'
+        # Повторная раскладка не создает дублей
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                condition=Q(comment=None),
+                name='unique_post_notification'
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'comment'],
+                name='unique_comment_notification'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-id'],
+                name='notification_user_created_idx'),
+            models.Index(
+                fields=['user', 'is_read'],
+                name='notification_user_read_idx'),
+        ]
@@ -0,0 +1,126 @@
+"""
+Входящие уведомления: новые посты авторов из подписок и комментарии
+к своим постам.
+
+Строки уведомлений раскладываются фоновыми задачами, запрос, создавший
+пост или комментарий, их не ждет. Число непрочитанных хранится в
+счетчиках пользователя (UserStats.unread_notifications), меню читает
+его одним запросом по первичному ключу, а не COUNT(*) по уведомлениям.
+Счетчик не сдвигается на дельту, а пересчитывается для затронутых
+пользователей: задачи можно безопасно повторять. Изменение счетчика
+сдвигает поколение уведомлений пользователя, от которого зависят ETag
+его страниц (conditional).
+"""
+from tasks.queue import task
+
+from . import counters
+from .caching import NOTIFICATIONS_GENERATION_KEY, bump_generations
+from .models import Comment, Follow, Notification, Post, UserStats
+
+
+BATCH_SIZE = 500
+
+INBOX_ORDERING = ('-created', '-pk')
+
+
+def _changed(user_ids):
+    """ Пересчитывает счетчики и сбрасывает ETag страниц пользователей """
+    counters.recount('unread_notifications', user_ids)
+    bump_generations([
+        NOTIFICATIONS_GENERATION_KEY.format(user_id=user_id)
+        for user_id in user_ids
+    ])
+
+
+def _deliver(notifications):
+    Notification.objects.bulk_create(notifications, ignore_conflicts=True)
+    _changed([notification.user_id for notification in notifications])
+
+
+@task
+def notify_followers(post_id):
+    """ Уведомляет подписчиков автора о новом посте, пачками """
+    post = Post.objects.filter(pk=post_id).values(
+        'author_id', 'pub_date').first()
+    if post is None:
+        return
+    followers = Follow.objects.filter(
+        author_id=post['author_id']
+    ).values_list('user_id', flat=True)
+
+    batch = []
+    for user_id in followers.iterator():
+        batch.append(Notification(
+            user_id=user_id,
+            kind=Notification.POST,
+            actor_id=post['author_id'],
+            post_id=post_id,
+            created=post['pub_date']))
+        if len(batch) >= BATCH_SIZE:
+            _deliver(batch)
+            batch = []
+    if batch:
+        _deliver(batch)
+
+
+@task
+def notify_post_author(comment_id):
+    """ Уведомляет автора поста о комментарии, кроме своих """
+    comment = Comment.objects.filter(pk=comment_id).values(
+        'author_id', 'post_id', 'post__author_id', 'created').first()
+    if comment is None or comment['post_id'] is None:
+        return
+    if comment['author_id'] == comment['post__author_id']:
+        return
+    _deliver([Notification(
+        user_id=comment['post__author_id'],
+        kind=Notification.COMMENT,
+        actor_id=comment['author_id'],
+        post_id=comment['post_id'],
+        comment_id=comment_id,
+        created=comment['created'])])
+
+
+@task
+def recount_unread(user_ids):
+    """ После удаления постов и комментариев вместе с их уведомлениями """
+    _changed(user_ids)
+
+
+def recipients(**lookup):
+    """ Пользователи с непрочитанными уведомлениями по условию lookup """
+    return list(Notification.objects.filter(
+        is_read=False, **lookup
+    ).values_list('user_id', flat=True).distinct())
+
+
+def inbox(user):
+    return Notification.objects.filter(user=user).select_related(
+        'actor', 'post__author', 'comment')
+
+
+def mark_read(user, up_to=None, ids=None):
+    """ Отмечает прочитанными уведомления одним UPDATE: все до up_to
+    включительно (пришедшие после показа страницы остаются новыми)
+    или с указанными id. Возвращает число отмеченных """
+    notifications = Notification.objects.filter(user=user, is_read=False)
+    if up_to is not None:
+        notifications = notifications.filter(pk__lte=up_to)
+    if ids is not None:
+        notifications = notifications.filter(pk__in=ids)
+    marked = notifications.update(is_read=True)
+    if marked:
+        _changed([user.pk])
+    return marked
+
+
+def unread_count(user_id):
+    """ Счетчик из UserStats. Пока строки счетчиков нет (ее создает
+    get_stats при первом чтении), непрочитанные считаются по таблице:
+    меню не должно писать в базу """
+    unread = UserStats.objects.filter(user_id=user_id).values_list(
+        'unread_notifications', flat=True).first()
+    if unread is None:
+        unread = Notification.objects.filter(
+            user_id=user_id, is_read=False).count()
+    return unread
@@ -0,0 +1,149 @@
+"""
+Кэш целых страниц для анонимных посетителей.
+
+Страница хранится по адресу вместе с суррогатными ключами - тем, что на
+ней показано: 'post:<id>', 'author:<id>', 'group:<id>', 'feed:index'.
+У каждого ключа есть поколение, как у лент в caching; purge() сдвигает
+поколения, и сохраненные с прежними поколениями страницы перестают
+считаться свежими. Так изменение поста сбрасывает только страницы, где
+он виден, а не весь кэш.
+
+Валидаторы ETag и Last-Modified ставит внешний слой posts.conditional:
+он отвечает 304, не доходя до кэша страниц.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from yatube.replicas import recently_written
+
+from .caching import bump_generation, get_generation, last_modified
+
+
+PAGE_KEY = 'page:{digest}'
+SURROGATE_GENERATION_KEY = 'surrogate:{key}:generation'
+
+# Ключ всех страниц: сбрасывает кэш целиком после массовых изменений
+ALL_PAGES = 'pages'
+
+
+def generation_key(key):
+    return SURROGATE_GENERATION_KEY.format(key=key)
+
+
+def purge(*keys):
+    """ Делает недействительными страницы с любым из ключей """
+    for key in keys:
+        bump_generation(generation_key(key))
+
+
+def purge_all():
+    purge(ALL_PAGES)
+
+
+def tag(request, *keys):
+    """ Добавляет странице суррогатные ключи. Ключом может быть функция,
+    возвращающая ключи: она вызывается после отрисовки страницы """
+    if hasattr(request, 'surrogate_keys'):
+        request.surrogate_keys.extend(keys)
+
+
+def post_keys(posts):
+    """ Ключи постов страницы ленты. Если посты уже выбраны для шаблона,
+    новых запросов нет, иначе выбираются только их id """
+    object_list = getattr(posts, 'object_list', posts)
+    if getattr(object_list, '_result_cache', None) is None \
+            and hasattr(object_list, 'values_list'):
+        ids = object_list.values_list('pk', flat=True)
+    else:
+        ids = (post.pk for post in object_list)
+    return [f'post:{pk}' for pk in ids]
+
+
+def _resolve(keys):
+    resolved = {ALL_PAGES}
+    for key in keys:
+        if callable(key):
+            resolved.update(key())
+        else:
+            resolved.add(key)
+    return sorted(resolved)
+
+
+def _generations(keys):
+    return {key: get_generation(generation_key(key)) for key in keys}
+
+
+def _is_fresh(entry):
+    names = {generation_key(key): key for key in entry['keys']}
+    current = cache.get_many(list(names))
+    return all(
+        current.get(name) == entry['keys'][key]
+        for name, key in names.items()
+    )
+
+
+def _cacheable_request(request):
+    return request.method in ('GET', 'HEAD') \
+        and not request.user.is_authenticated
+
+
+def _cacheable_response(response):
+    return response.status_code == 200 and not response.cookies \
+        and not response.streaming
+
+
+def _response(entry):
+    response = HttpResponse(
+        entry['content'], content_type=entry['content_type'])
+    _set_headers(response, entry)
+    return response
+
+
+def _set_headers(response, entry):
+    # Ключи для сброса кэша CDN, если он стоит перед сайтом
+    response['Surrogate-Key'] = ' '.join(entry['keys'])
+
+
+def anonymous_page_cache(view):
+    """ Кэширует страницу представления для анонимных посетителей.
+    Представление отмечает показанное на странице через tag() """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _cacheable_request(request):
+            return view(request, *args, **kwargs)
+
+        page_key = PAGE_KEY.format(digest=hashlib.md5(
+            request.get_full_path().encode()).hexdigest())
+        entry = cache.get(page_key)
+        if entry is not None and _is_fresh(entry):
+            status = 'hit'
+            response = _response(entry)
+        else:
+            status = 'miss'
+            request.surrogate_keys = []
+            response = view(request, *args, **kwargs)
+            if not _cacheable_response(response):
+                return response
+            keys = _resolve(request.surrogate_keys)
+            entry = {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'keys': _generations(keys),
+            }
+            # Страница, прочитанная с реплики сразу после изменения,
+            # может быть старой, а в кэше жила бы с новыми поколениями
+            last_change = last_modified(
+                [generation_key(key) for key in keys])
+            if not recently_written(last_change):
+                cache.set(page_key, entry, settings.PAGE_CACHE_TIMEOUT)
+            _set_headers(response, entry)
+
+        response['X-Page-Cache'] = status
+        return response
+
+    return wrapper
@@ -0,0 +1,229 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+from datetime import date
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.db import models
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+
+
+# Порядок постов в лентах: по дате публикации, при равенстве - по id
+FEED_ORDERING = ('-pub_date', '-pk')
+# Комментарии к посту: сначала новые
+COMMENT_ORDERING = ('-created', '-pk')
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def _encode_value(value):
+    # DjangoJSONEncoder обрезает микросекунды, а курсору нужна точность
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'Нельзя сохранить в курсор: {value!r}')
+
+
+class CursorPaginator:
+    """ Паджинатор по ключу (keyset): вместо OFFSET и COUNT(*) страница
+    выбирается условием на поля сортировки относительно курсора """
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    def get_page(self, cursor=None):
+        """ Страница по курсору; битый курсор ведет на первую страницу """
+        decoded = self.decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            return CursorPage(self, None, NEXT)
+        direction, values = decoded
+        return CursorPage(self, values, direction)
+
+    def cursor_for(self, obj, direction=NEXT):
+        values = [
+            getattr(obj, self._field_name(name)) for name in self.ordering
+        ]
+        payload = json.dumps([direction, values], default=_encode_value)
+        token = base64.urlsafe_b64encode(payload.encode())
+        return token.decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        padding = '=' * (-len(cursor) % 4)
+        try:
+            payload = base64.urlsafe_b64decode(cursor + padding)
+            direction, values = json.loads(payload.decode())
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+            return None
+
+        if direction not in (NEXT, PREVIOUS):
+            return None
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            return None
+
+        try:
+            values = [
+                self._to_python(name, value)
+                for name, value in zip(self.ordering, values)
+            ]
+        except (ValueError, TypeError):
+            return None
+        return direction, values
+
+    def _field_name(self, name):
+        return name.lstrip('-')
+
+    def _to_python(self, name, value):
+        model = self.object_list.model
+        name = self._field_name(name)
+        annotation = self.object_list.query.annotations.get(name)
+        try:
+            if annotation is not None:
+                field = annotation.output_field
+            elif name == 'pk':
+                field = model._meta.pk
+            else:
+                field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return value
+
+        if isinstance(field, models.DateTimeField):
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError(value)
+            return parsed
+        return field.to_python(value)
+
+    def _keyset_filter(self, values, direction):
+        """ Лексикографическое условие (a, b) < (x, y) для полей сортировки """
+        condition = Q()
+        for i, name in enumerate(self.ordering):
+            descending = name.startswith('-')
+            after = descending == (direction == NEXT)
+            lookup = 'lt' if after else 'gt'
+
+            step = Q(**{
+                f'{self._field_name(name)}__{lookup}': values[i]
+            })
+            for prev_name, prev_value in zip(self.ordering[:i], values[:i]):
+                step &= Q(**{self._field_name(prev_name): prev_value})
+            condition |= step
+        return condition
+
+    def _reversed_ordering(self):
+        return tuple(
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        )
+
+    def queryset(self, values, direction=NEXT):
+        """ Записи после курсора в порядке обхода, без ограничения """
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, direction))
+
+        if direction == NEXT:
+            return queryset.order_by(*self.ordering)
+        return queryset.order_by(*self._reversed_ordering())
+
+    def fetch(self, values, direction):
+        """ Возвращает объекты страницы и признак того,
+        что за ними в том же направлении есть еще записи """
+        queryset = self.queryset(values, direction)
+        objects = list(queryset[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+
+        if direction == PREVIOUS:
+            objects.reverse()
+        return objects, has_more
+
+
+class CursorPage(Sequence):
+    def __init__(self, paginator, values, direction):
+        self.paginator = paginator
+        self.values = values
+        self.direction = direction
+        self._objects = None
+        self._has_more = False
+
+    def __repr__(self):
+        return f'<CursorPage {self.direction} {self.values}>'
+
+    def _fetch(self):
+        if self._objects is None:
+            self._objects, self._has_more = self.paginator.fetch(
+                self.values, self.direction)
+        return self._objects
+
+    @property
+    def object_list(self):
+        return self._fetch()
+
+    def __len__(self):
+        return len(self._fetch())
+
+    def __getitem__(self, index):
+        return self._fetch()[index]
+
+    def has_next(self):
+        self._fetch()
+        if self.direction == NEXT:
+            return self._has_more
+        return self.values is not None
+
+    def has_previous(self):
+        self._fetch()
+        if self.direction == PREVIOUS:
+            return self._has_more
+        return self.values is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next() or not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[-1], NEXT)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous() or not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[0], PREVIOUS)
+
+
+def paginate(request, object_list, ordering=FEED_ORDERING):
+    """ Первые страницы отдаются обычным Paginator по номеру,
+    дальше ссылки ведут на курсоры ?cursor=. Номера глубже
+    PAGINATOR_PAGE_LIMIT не открываются: им нужен был бы OFFSET """
+    per_page = settings.POSTS_PER_PAGE
+    cursor = request.GET.get('cursor')
+    if cursor:
+        paginator = CursorPaginator(object_list, per_page, ordering)
+        return paginator, paginator.get_page(cursor)
+
+    page_limit = settings.PAGINATOR_PAGE_LIMIT
+    paginator = Paginator(object_list.order_by(*ordering), per_page)
+    # Для COUNT(*) аннотации ленты не нужны, а их подзапросы
+    # выполнялись бы для каждой строки. Считаются строки только первых
+    # страниц и одна сверх них - чтобы знать, есть ли продолжение
+    paginator.count = object_list.values('pk').order_by()[
+        :page_limit * per_page + 1].count()
+    page = paginator.get_page(request.GET.get('page'))
+    if page.number > page_limit:
+        raise Http404('Дальние страницы открываются по курсору')
+
+    page.page_links = range(1, min(paginator.num_pages, page_limit) + 1)
+    page.next_cursor = None
+    if page.number >= page_limit and page.has_next():
+        cursor_paginator = CursorPaginator(object_list, per_page, ordering)
+        page.next_cursor = cursor_paginator.cursor_for(page[len(page) - 1])
+    return paginator, page
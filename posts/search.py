@@ -0,0 +1,158 @@
+import re
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum
+
+from tasks.queue import task
+
+from .models import Comment, Post, SearchEntry
+from .stemmer import stem
+
+
+# Текст поста весит больше, чем текст комментариев к нему
+POST_WEIGHT = 2
+COMMENT_WEIGHT = 1
+
+SEARCH_ORDERING = ('-rank', '-pub_date', '-pk')
+
+BATCH_SIZE = 500
+MAX_TERM_LENGTH = 64
+
+WORD_RE = re.compile(r'\w+')
+STOP_WORDS = frozenset((
+    'а', 'без', 'бы', 'в', 'во', 'вот', 'все', 'да', 'для', 'до', 'же',
+    'за', 'и', 'из', 'или', 'к', 'как', 'ко', 'ли', 'на', 'над', 'не',
+    'ни', 'но', 'о', 'об', 'от', 'по', 'под', 'при', 'про', 'с', 'со',
+    'так', 'то', 'у', 'что', 'это',
+))
+
+
+def tokenize(text):
+    """ Основы слов текста без стоп-слов """
+    for word in WORD_RE.findall(text.lower().replace('ё', 'е')):
+        if word in STOP_WORDS or word == '_':
+            continue
+        yield stem(word)[:MAX_TERM_LENGTH]
+
+
+def _weights(post_text, comment_texts=()):
+    weights = Counter()
+    for term in tokenize(post_text):
+        weights[term] += POST_WEIGHT
+    for text in comment_texts:
+        for term in tokenize(text):
+            weights[term] += COMMENT_WEIGHT
+    return weights
+
+
+def _entries(post_id, weights):
+    return [
+        SearchEntry(term=term, post_id=post_id, weight=weight)
+        for term, weight in weights.items()
+    ]
+
+
+@task
+def index_post(post_id):
+    """ Переиндексирует пост вместе с его комментариями. Задача:
+    ставится после изменения поста или его комментариев """
+    post = Post.objects.filter(pk=post_id).values_list('text', flat=True)
+    if not post:
+        return
+    comments = Comment.objects.filter(post_id=post_id).values_list(
+        'text', flat=True)
+
+    SearchEntry.objects.filter(post_id=post_id).delete()
+    SearchEntry.objects.bulk_create(
+        _entries(post_id, _weights(post[0], comments.iterator())),
+        batch_size=BATCH_SIZE)
+
+
+def unindex_comment(comment):
+    """ Вычитает слова удаленного комментария из весов его поста.
+    Новых строк не создает: пост может удаляться вместе с комментариями """
+    weights = _weights('', [comment.text])
+    entries = SearchEntry.objects.filter(
+        post_id=comment.post_id, term__in=weights
+    ).values_list('term', 'weight')
+
+    emptied = []
+    for term, weight in entries:
+        if weight <= weights[term]:
+            emptied.append(term)
+        else:
+            SearchEntry.objects.filter(
+                post_id=comment.post_id, term=term
+            ).update(weight=F('weight') - weights[term])
+    SearchEntry.objects.filter(
+        post_id=comment.post_id, term__in=emptied).delete()
+
+
+def _index_batch(posts):
+    """ Записи индекса для пачки пар (id, текст) поста """
+    comments = {}
+    rows = Comment.objects.filter(
+        post_id__in=[pk for pk, _ in posts]
+    ).values_list('post_id', 'text')
+    for post_id, text in rows.iterator():
+        comments.setdefault(post_id, []).append(text)
+
+    entries = []
+    for post_id, text in posts:
+        weights = _weights(text, comments.get(post_id, ()))
+        entries.extend(_entries(post_id, weights))
+    SearchEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+
+
+def index_posts(post_ids, batch_size=BATCH_SIZE):
+    """ index_post для списка постов пачками (импорт без сигналов) """
+    for start in range(0, len(post_ids), batch_size):
+        batch = post_ids[start:start + batch_size]
+        with transaction.atomic():
+            SearchEntry.objects.filter(post_id__in=batch).delete()
+            _index_batch(list(Post.objects.filter(
+                pk__in=batch).values_list('pk', 'text')))
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """ Полностью пересобирает индекс пачками постов, возвращает их число.
+    Одна транзакция: до ее конца поиск видит прежний индекс """
+    indexed = 0
+    last_pk = 0
+    with transaction.atomic():
+        SearchEntry.objects.all().delete()
+        while True:
+            posts = list(Post.objects.filter(
+                pk__gt=last_pk
+            ).order_by('pk').values_list('pk', 'text')[:batch_size])
+            if not posts:
+                return indexed
+            last_pk = posts[-1][0]
+            _index_batch(posts)
+            indexed += len(posts)
+
+
+def search(query, group_slug=None, author_username=None):
+    """ Посты, в тексте или комментариях которых есть слова запроса,
+    с релевантностью rank - суммой весов найденных слов """
+    terms = set(tokenize(query))
+    if not terms:
+        return Post.objects.none()
+
+    matches = SearchEntry.objects.filter(term__in=terms)
+    rank = matches.filter(
+        post=OuterRef('pk')
+    ).order_by().values('post').annotate(
+        rank=Sum('weight')
+    ).values('rank')
+
+    posts = Post.objects.feed().filter(
+        pk__in=matches.values('post')
+    ).annotate(rank=Subquery(rank, output_field=IntegerField()))
+
+    if group_slug:
+        posts = posts.filter(group__slug=group_slug)
+    if author_username:
+        posts = posts.filter(author__username=author_username)
+    return posts
@@ -0,0 +1,290 @@
+"""
+Генератор больших синтетических наборов данных.
+
+Строки вставляются пачками через bulk_create с заранее известными id,
+поэтому пачки не зависят друг от друга и могут создаваться в разных
+процессах, а результат зависит только от параметров и зерна.
+Популярность пользователей подчиняется закону Ципфа: немногие авторы
+пишут большую часть постов и собирают большую часть подписчиков.
+"""
+import random
+from bisect import bisect
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import caching, counters, pagecache, search, timeline
+from .models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+ZIPF_EXPONENT = 1.1
+BATCH_SIZE = 5000
+
+# Пост публикуется не раньше чем за PERIOD до until,
+# комментарий появляется в течение COMMENT_DELAY после поста
+PERIOD = timedelta(days=365)
+COMMENT_DELAY = timedelta(days=7)
+
+WORDS = (
+    'книга', 'кот', 'город', 'музыка', 'кино', 'погода', 'работа', 'море',
+    'путешествие', 'друзья', 'спорт', 'утро', 'вечер', 'рецепт', 'сад',
+    'фотография', 'прогулка', 'новости', 'учеба', 'праздник', 'дорога',
+    'горы', 'лес', 'концерт', 'выставка', 'поезд', 'самолет', 'кофе',
+)
+
+Params = namedtuple(
+    'Params', 'users groups posts comments follows seed until prefix')
+
+# Пачка работы: вид строк, номер пачки, первый id и число строк
+Chunk = namedtuple('Chunk', 'kind index start count')
+
+
+class ZipfDistribution:
+    """ Случайный выбор из списка с весами 1 / rank ** exponent """
+
+    def __init__(self, items, exponent=ZIPF_EXPONENT):
+        self.items = items
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(items) + 1)))
+
+    def choice(self, rng):
+        point = rng.random() * self.cum_weights[-1]
+        return self.items[bisect(self.cum_weights, point)]
+
+    def sample(self, rng, count):
+        """ count разных элементов """
+        count = min(count, len(self.items))
+        chosen = set()
+        while len(chosen) < count:
+            chosen.add(self.choice(rng))
+        return chosen
+
+
+def midnight(moment=None):
+    """ Начало дня moment (по умолчанию сегодня) с учетом USE_TZ:
+    запуски в течение одного дня дают одинаковые даты """
+    if moment is None:
+        moment = timezone.localtime(timezone.now()).replace(tzinfo=None) \
+            if settings.USE_TZ else datetime.now()
+    moment = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return timezone.make_aware(moment) if settings.USE_TZ else moment
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """ Отключает auto_now_add у полей (модель, имя), чтобы bulk_create
+    сохранил заданные даты, а не текущее время """
+    fields = [model._meta.get_field(name) for model, name in fields]
+    saved = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, saved):
+            field.auto_now_add = value
+
+
+def _next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def _prefix_taken(model, field, prefix):
+    """ Есть ли в базе имена, начинающиеся с prefix: один запрос,
+    который останавливается на первой найденной строке """
+    return model.objects.filter(**{f'{field}__startswith': prefix}).exists()
+
+
+def free_prefix(params):
+    """ Params с префиксом, которого нет ни у одного имени пользователя
+    и слага группы. Имя - префикс и id, а id продолжают уже
+    существующие, поэтому имя может совпасть с чужим; если префикс
+    занят, к нему добавляется номер """
+    prefix = params.prefix
+    attempt = 1
+    while (_prefix_taken(User, 'username', prefix)
+           or _prefix_taken(Group, 'slug', f'{prefix}-group-')):
+        attempt += 1
+        prefix = f'{params.prefix}_{attempt}_'
+    return params._replace(prefix=prefix)
+
+
+def plan(params, batch_size=BATCH_SIZE):
+    """ Разбивает генерацию на пачки. Пачки одного вида независимы,
+    но подписки, посты и комментарии ссылаются на пользователей,
+    группы и посты, поэтому виды выполняются по порядку """
+    starts = {
+        'users': _next_id(User),
+        'groups': _next_id(Group),
+        'posts': _next_id(Post),
+        'comments': _next_id(Comment),
+        'follows': _next_id(User),
+    }
+    totals = {
+        'users': params.users,
+        'groups': params.groups,
+        'posts': params.posts,
+        'comments': params.comments,
+        'follows': params.users,
+    }
+    stages = (('users', 'groups'), ('follows', 'posts'), ('comments',))
+    return starts, [
+        [
+            Chunk(kind, index, starts[kind] + offset,
+                  min(batch_size, totals[kind] - offset))
+            for kind in kinds
+            for index, offset in enumerate(
+                range(0, totals[kind], batch_size))
+        ]
+        for kinds in stages
+    ]
+
+
+@lru_cache(maxsize=None)
+def _popularity(first_user, users, seed):
+    """ Пользователи по убыванию популярности, одинаково для зерна """
+    ids = list(range(first_user, first_user + users))
+    random.Random(f'{seed}:popularity').shuffle(ids)
+    return ZipfDistribution(ids)
+
+
+@lru_cache(maxsize=None)
+def _commented(first_post, posts, seed):
+    ids = list(range(first_post, first_post + posts))
+    random.Random(f'{seed}:commented').shuffle(ids)
+    return ZipfDistribution(ids)
+
+
+def _pub_date(params, starts, post_id):
+    """ Посты идут по возрастанию id равномерно за PERIOD до until """
+    position = (post_id - starts['posts'] + 1) / params.posts
+    return params.until - PERIOD * (1 - position)
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _users(params, starts, chunk, rng):
+    return [
+        User(pk=pk, username=f'{params.prefix}{pk}', password='!')
+        for pk in range(chunk.start, chunk.start + chunk.count)
+    ]
+
+
+def _groups(params, starts, chunk, rng):
+    return [
+        Group(
+            pk=pk,
+            title=f'Группа {pk}',
+            slug=f'{params.prefix}-group-{pk}',
+            description=_text(rng, 12))
+        for pk in range(chunk.start, chunk.start + chunk.count)
+    ]
+
+
+def _follows(params, starts, chunk, rng):
+    authors = _popularity(starts['users'], params.users, params.seed)
+    follows = []
+    for user_id in range(chunk.start, chunk.start + chunk.count):
+        # Число подписок тоже неравномерное: в среднем params.follows
+        count = int(rng.expovariate(1 / params.follows)) if params.follows \
+            else 0
+        follows.extend(
+            Follow(user_id=user_id, author_id=author_id)
+            for author_id in authors.sample(rng, count)
+            if author_id != user_id
+        )
+    return follows
+
+
+def _posts(params, starts, chunk, rng):
+    authors = _popularity(starts['users'], params.users, params.seed)
+    first_group = starts['groups']
+    posts = []
+    for pk in range(chunk.start, chunk.start + chunk.count):
+        group_id = None
+        if params.groups and rng.random() < 0.5:
+            group_id = first_group + rng.randrange(params.groups)
+        posts.append(Post(
+            pk=pk,
+            text=_text(rng, rng.randint(5, 40)),
+            author_id=authors.choice(rng),
+            group_id=group_id,
+            pub_date=_pub_date(params, starts, pk)))
+    return posts
+
+
+def _comments(params, starts, chunk, rng):
+    posts = _commented(starts['posts'], params.posts, params.seed)
+    first_user = starts['users']
+    comments = []
+    for pk in range(chunk.start, chunk.start + chunk.count):
+        post_id = posts.choice(rng)
+        created = _pub_date(params, starts, post_id) + COMMENT_DELAY * (
+            rng.random() ** 4)
+        comments.append(Comment(
+            pk=pk,
+            text=_text(rng, rng.randint(2, 15)),
+            post_id=post_id,
+            author_id=first_user + rng.randrange(params.users),
+            created=min(created, params.until)))
+    return comments
+
+
+BUILDERS = {
+    'users': (User, _users),
+    'groups': (Group, _groups),
+    'follows': (Follow, _follows),
+    'posts': (Post, _posts),
+    'comments': (Comment, _comments),
+}
+
+
+def insert_chunk(params, starts, chunk):
+    """ Создает и вставляет одну пачку в своей транзакции,
+    возвращает (вид, число строк) """
+    # Зерно пачки не зависит от того, какой процесс ее выполняет
+    rng = random.Random(f'{params.seed}:{chunk.kind}:{chunk.index}')
+    model, build = BUILDERS[chunk.kind]
+    objects = build(params, starts, chunk, rng)
+
+    with transaction.atomic(), \
+            explicit_dates((Post, 'pub_date'), (Comment, 'created')):
+        # Размер INSERT выбирает Django: у SQLite есть предел
+        # на число строк в одном запросе, а пачку уже ограничивает план
+        model.objects.bulk_create(
+            objects, ignore_conflicts=chunk.kind == 'follows')
+    return chunk.kind, len(objects)
+
+
+def reset_sequences():
+    """ После вставки с явными id счетчики id в PostgreSQL отстают """
+    statements = connection.ops.sequence_reset_sql(
+        no_style(), [User, Group, Post, Comment])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def rebuild_derived(index=True):
+    """ bulk_create не вызывает сигналы: пересчитываются счетчики,
+    ленты подписок и поисковый индекс. Счетчики первыми - по числу
+    подписчиков лента решает, раскладывать ли посты автора """
+    counters.repair()
+    timeline.rebuild()
+    if index:
+        search.rebuild()
+    caching.bump_feeds()
+    pagecache.purge_all()
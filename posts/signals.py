@@ -0,0 +1,158 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import (
+    caching, counters, notifications, pagecache, search, timeline)
+from .models import Comment, Follow, Group, Post
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def feed_changed(sender, raw=False, **kwargs):
+    if not raw:
+        caching.bump_feeds()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comments_changed(sender, instance, raw=False, **kwargs):
+    if not raw and instance.post_id:
+        caching.bump_comments(instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        caching.bump_follow_feed(instance.user_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_pages_changed(sender, instance, raw=False, **kwargs):
+    """ Пост виден на своей странице, в общей ленте, у автора и в группе """
+    if raw:
+        return
+    keys = [
+        f'post:{instance.pk}', 'feed:index', f'author:{instance.author_id}']
+    if instance.group_id:
+        keys.append(f'group:{instance.group_id}')
+    pagecache.purge(*keys)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_pages_changed(sender, instance, raw=False, **kwargs):
+    # Число комментариев видно на всех страницах с карточкой поста
+    if not raw and instance.post_id:
+        pagecache.purge(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_pages_changed(sender, instance, raw=False, **kwargs):
+    # Счетчики подписок видны у обоих пользователей
+    if not raw:
+        pagecache.purge(
+            f'author:{instance.author_id}', f'author:{instance.user_id}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_pages_changed(sender, raw=False, **kwargs):
+    # Название группы есть в карточках постов на любых страницах
+    if not raw:
+        pagecache.purge_all()
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change(instance.author_id, posts=1)
+        timeline.fan_out_post.enqueue(
+            instance.pk, key=f'timeline:post:{instance.pk}')
+        notifications.notify_followers.enqueue(
+            instance.pk, key=f'notifications:post:{instance.pk}')
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change(instance.author_id, posts=-1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change(instance.author_id, comments=1)
+        notifications.notify_post_author.enqueue(
+            instance.pk, key=f'notifications:comment:{instance.pk}')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change(instance.author_id, comments=-1)
+
+
+def reindex(post_id):
+    # Пост переиндексируется целиком: задача идемпотентна, а ключ
+    # склеивает несколько изменений до прихода воркера
+    search.index_post.enqueue(post_id, key=f'search:post:{post_id}')
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reindex(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, raw=False, **kwargs):
+    if not raw and instance.post_id is not None:
+        reindex(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_removed(sender, instance, **kwargs):
+    # Сразу: пост может удаляться вместе с комментариями, и задача
+    # не должна создавать для него новые строки индекса
+    if instance.post_id is not None:
+        search.unindex_comment(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change(instance.author_id, followers=1)
+        counters.change(instance.user_id, following=1)
+        timeline.backfill.enqueue(
+            instance.user_id, instance.author_id,
+            key=f'timeline:follow:{instance.user_id}:{instance.author_id}')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change(instance.author_id, followers=-1)
+    counters.change(instance.user_id, following=-1)
+    timeline.trim(instance.user_id, instance.author_id)
+    timeline.follower_removed(instance.author_id)
+
+
+@receiver(pre_delete, sender=Post)
+@receiver(pre_delete, sender=Comment)
+def notifications_deleting(sender, instance, **kwargs):
+    # Уведомления удалятся каскадом, без сигналов: кому пересчитать
+    # счетчик непрочитанных, нужно узнать заранее
+    lookup = 'post' if sender is Post else 'comment'
+    instance._notified = notifications.recipients(**{lookup: instance.pk})
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def notifications_deleted(sender, instance, **kwargs):
+    notified = getattr(instance, '_notified', None)
+    if notified:
+        notifications.recount_unread.enqueue(notified)
@@ -0,0 +1,15 @@
+from django import template
+
+from posts import notifications
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def unread_notifications(user):
+    """ Число непрочитанных уведомлений для значка в меню: счетчик
+    читается только на страницах вошедших, где меню отрисовывается """
+    if not user.is_authenticated:
+        return 0
+    return notifications.unread_count(user.pk)
@@ -0,0 +1,36 @@
+from django import template
+from django.conf import settings
+
+from posts import thumbnails
+
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/picture.html')
+def responsive_image(image, size='card'):
+    """ Картинка поста с вариантами разных ширин и форматов в srcset.
+    Пока основная миниатюра не готова, показывается заглушка """
+    ready = thumbnails.get_ready_image(image).get(size)
+    if ready is None:
+        return {'thumbnail': None}
+
+    thumbnail, variants = ready
+    fallback_format = settings.THUMBNAIL_VARIANTS['formats'][-1]
+    sources = []
+    srcset = ''
+    for format_, found in variants.items():
+        candidates = ', '.join(f'{url} {width}w' for url, width in found)
+        if format_ == fallback_format:
+            srcset = candidates
+        else:
+            sources.append({
+                'type': f'image/{format_.lower()}',
+                'srcset': candidates,
+            })
+    return {
+        'thumbnail': thumbnail,
+        'sources': sources,
+        'srcset': srcset,
+        'sizes': settings.THUMBNAIL_VARIANTS['sizes'],
+    }
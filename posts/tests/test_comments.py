@@ -0,0 +1,110 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post, Comment
+
+
+User = get_user_model()
+
+
+@override_settings(COMMENTS_PER_PAGE=3)
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='Author')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.author)
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+        cls.post_url = reverse('posts:post', kwargs={
+            'username': cls.author.username,
+            'post_id': cls.post.id
+        })
+        cls.comments_url = reverse('posts:comments', kwargs={
+            'username': cls.author.username,
+            'post_id': cls.post.id
+        })
+
+    def setUp(self):
+        cache.clear()
+
+    def create_comments(self, count):
+        start = self.post.comments.count()
+        for i in range(start, start + count):
+            commenter = User.objects.create(username=f'commenter{i}')
+            Comment.objects.create(
+                text=f'Комментарий {i}', post=self.post, author=commenter)
+
+    def test_first_page_is_limited(self):
+        """ На странице поста только первая страница комментариев,
+        сначала новые """
+        self.create_comments(5)
+        response = self.authorized_client.get(self.post_url)
+
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            ['Комментарий 4', 'Комментарий 3', 'Комментарий 2'])
+        self.assertTrue(response.context['next_cursor']())
+        self.assertContains(response, 'Показать еще')
+
+    def test_queries_do_not_depend_on_comment_count(self):
+        """ Авторы комментариев загружаются вместе с ними """
+        def count_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                self.authorized_client.get(self.post_url)
+            return len(context.captured_queries)
+
+        self.create_comments(1)
+        one_comment = count_queries()
+        self.create_comments(3)
+        self.assertEqual(count_queries(), one_comment)
+
+    def test_fragment_endpoint(self):
+        """ Следующая страница отдается HTML-фрагментом и JSON """
+        self.create_comments(5)
+        next_cursor = self.authorized_client.get(
+            self.post_url).context['next_cursor']()
+
+        response = self.authorized_client.get(
+            self.comments_url, {'cursor': next_cursor})
+        self.assertContains(response, 'Комментарий 1')
+        self.assertNotContains(response, 'Комментарий 2')
+        self.assertNotContains(response, 'Показать еще')
+        self.assertTemplateNotUsed(response, 'base.html')
+
+        response = self.authorized_client.get(
+            self.comments_url,
+            {'cursor': next_cursor, 'format': 'json'})
+        data = response.json()
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            ['Комментарий 1', 'Комментарий 0'])
+        self.assertEqual(data['comments'][0]['author'], 'commenter1')
+        self.assertIsNone(data['next_cursor'])
+
+    def test_first_page_cache_is_invalidated(self):
+        """ Первая страница берется из кэша, пока не добавлен комментарий """
+        self.create_comments(1)
+        self.authorized_client.get(self.post_url)
+
+        with CaptureQueriesContext(connection) as context:
+            self.authorized_client.get(self.post_url)
+        # Счетчик комментариев в посте не в счет, только сама страница
+        self.assertFalse(any(
+            '"posts_comment"."created"' in query['sql']
+            for query in context.captured_queries))
+
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={
+                'username': self.author.username,
+                'post_id': self.post.id
+            }),
+            {'text': 'Новый комментарий'})
+        response = self.authorized_client.get(self.post_url)
+        self.assertContains(response, 'Новый комментарий')
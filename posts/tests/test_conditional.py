@@ -0,0 +1,146 @@
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from posts import caching
+from posts.models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Author')
+        cls.reader = User.objects.create(username='Reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.post_url = reverse('posts:post', kwargs={
+            'username': 'Author', 'post_id': self.post.pk})
+        self.profile_url = reverse('posts:profile', kwargs={
+            'username': 'Author'})
+        self.group_url = reverse('posts:group', kwargs={'slug': 'group'})
+
+    def test_matching_etag_gets_not_modified_without_rendering(self):
+        """ 304 отдается без запросов за постами и без шаблонов """
+        response = self.client.get(self.group_url)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0), \
+                self.assertTemplateNotUsed('group.html'):
+            cached = self.client.get(self.group_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], etag)
+
+        # Страница поста узнает id автора одним запросом
+        etag = self.client.get(self.post_url)['ETag']
+        with self.assertNumQueries(1):
+            cached = self.client.get(self.post_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+
+    def test_if_modified_since_is_ignored(self):
+        """ Комментарий в ту же секунду не меняет Last-Modified,
+        поэтому 304 решает только ETag """
+        with mock.patch('time.time', return_value=1700000000.2):
+            response = self.client.get(self.post_url)
+            Comment.objects.create(
+                text='Ответ', author=self.reader, post=self.post)
+            changed = self.client.get(
+                self.post_url,
+                HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            cached = self.client.get(
+                self.post_url,
+                HTTP_IF_NONE_MATCH=changed['ETag'],
+                HTTP_IF_MODIFIED_SINCE=changed['Last-Modified'])
+        self.assertEqual(changed['Last-Modified'], response['Last-Modified'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertContains(changed, 'Ответ')
+        self.assertEqual(cached.status_code, 304)
+
+    def test_changes_of_shown_data_change_etag(self):
+        """ Новый комментарий меняет ETag поста, подписка - профиля """
+        post_etag = self.client.get(self.post_url)['ETag']
+        profile_etag = self.client.get(self.profile_url)['ETag']
+
+        Comment.objects.create(
+            text='Комментарий', post=self.post, author=self.reader)
+        response = self.client.get(self.post_url, HTTP_IF_NONE_MATCH=post_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Комментарий')
+
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(
+            self.profile_url, HTTP_IF_NONE_MATCH=profile_etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cache_control_depends_on_viewer(self):
+        """ Страницы анонимов можно хранить в общих кэшах,
+        страницы вошедших - только в браузере """
+        anonymous = self.client.get(self.post_url)
+        self.assertIn('public', anonymous['Cache-Control'])
+        self.assertIn('must-revalidate', anonymous['Cache-Control'])
+
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(self.post_url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotEqual(response['ETag'], anonymous['ETag'])
+
+        cached = client.get(
+            self.post_url, HTTP_IF_NONE_MATCH=anonymous['ETag'])
+        self.assertEqual(cached.status_code, 200)
+
+    def test_missing_pages_have_no_validators(self):
+        response = self.client.get(reverse('posts:post', kwargs={
+            'username': 'Nobody', 'post_id': self.post.pk}))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'generations',
+}})
+class GenerationTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_bumps(self):
+        """ Одновременные сдвиги не теряются и не уводят время изменения
+        в будущее, иначе If-Modified-Since никогда не получил бы 304 """
+        key = 'test:generation'
+        start = caching.get_generation(key)
+
+        def bump():
+            for _ in range(50):
+                caching.bump_generation(key)
+
+        threads = [threading.Thread(target=bump) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(caching.get_generation(key), start + 400)
+        self.assertLessEqual(caching.last_modified([key]), time.time())
+
+    def test_last_modified_of_unknown_key(self):
+        """ Время изменения, которого нет в кэше, не раньше первого
+        чтения: старый If-Modified-Since не получит 304 """
+        before = time.time()
+        self.assertGreaterEqual(caching.last_modified(['unknown']), before)
+        self.assertEqual(
+            caching.last_modified(['unknown']),
+            caching.last_modified(['unknown']))
@@ -0,0 +1,83 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from posts.models import Post, Comment, Follow, UserStats
+from posts.counters import get_stats
+
+
+User = get_user_model()
+
+
+class UserStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='Author')
+        cls.reader = User.objects.create(username='Reader')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.reader)
+
+    def assertStats(self, user, **expected):
+        stats = UserStats.objects.get(user=user)
+        for name, value in expected.items():
+            with self.subTest(name=name):
+                self.assertEqual(getattr(stats, name), value)
+
+    def test_stats_are_computed_on_first_read(self):
+        """ Счетчики создаются по реальным данным при первом чтении """
+        Post.objects.create(text='Пост', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+
+        stats = get_stats(self.author.pk)
+        self.assertEqual((stats.posts, stats.followers), (1, 1))
+
+    def test_writes_keep_counters_in_sync(self):
+        """ Подписки, посты и комментарии сдвигают счетчики """
+        get_stats(self.author.pk)
+        get_stats(self.reader.pk)
+
+        self.authorized_client.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.author.username}))
+        self.assertStats(self.author, followers=1)
+        self.assertStats(self.reader, following=1)
+
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(text='Ответ', post=post, author=self.reader)
+        self.assertStats(self.author, posts=1)
+        self.assertStats(self.reader, comments=1)
+
+        post.delete()
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.author.username}))
+        self.assertStats(self.author, followers=0, posts=0)
+        self.assertStats(self.reader, following=0, comments=0)
+
+    def test_profile_uses_counters(self):
+        """ Профиль берет числа из счетчиков, а не считает записи """
+        get_stats(self.author.pk)
+        UserStats.objects.filter(user=self.author).update(
+            followers=7, posts=3)
+
+        response = self.authorized_client.get(reverse(
+            'posts:profile', kwargs={'username': self.author.username}))
+        self.assertEqual(response.context['followers'], 7)
+        self.assertContains(response, 'Записей: 3')
+
+    def test_repair_stats_command_fixes_drift(self):
+        """ Команда repair_stats исправляет разошедшиеся счетчики """
+        Post.objects.create(text='Пост', author=self.author)
+        get_stats(self.author.pk)
+        UserStats.objects.filter(user=self.author).update(posts=42)
+
+        out = StringIO()
+        call_command('repair_stats', stdout=out)
+
+        self.assertStats(self.author, posts=1)
+        self.assertTrue(UserStats.objects.filter(user=self.reader).exists())
+        self.assertIn('Исправлено счетчиков: 2', out.getvalue())
@@ -0,0 +1,101 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Author')
+        cls.reader = User.objects.create(username='Reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.old_post = Post.objects.create(text='Старый', author=cls.author)
+        cls.new_post = Post.objects.create(
+            text='Новый', author=cls.reader, group=cls.group)
+        Post.objects.filter(pk=cls.old_post.pk).update(
+            pub_date=datetime(2020, 1, 1, 12, 30, 15, 123456))
+        Post.objects.filter(pk=cls.new_post.pk).update(
+            pub_date=datetime(2021, 6, 1))
+        Comment.objects.create(
+            text='Комментарий', post=cls.new_post, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def export(self, *args, **options):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        descriptor, name = tempfile.mkstemp()
+        os.close(descriptor)
+        self.addCleanup(os.remove, name)
+        call_command(
+            'export_posts', *args, output=name, stdout=stdout,
+            stderr=stderr, **options)
+        opener = gzip.open if options.get('gzip') else open
+        with opener(name, 'rt', encoding='utf-8', newline='') as file:
+            return file.read()
+
+    def test_ndjson_of_all_tables(self):
+        content = self.export(
+            'posts', 'comments', 'groups', 'follows', gzip=True)
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [row['model'] for row in rows],
+            ['post', 'post', 'comment', 'group', 'follow'])
+        self.assertEqual(rows[0]['text'], 'Старый')
+        self.assertEqual(rows[0]['pub_date'], '2020-01-01T12:30:15.123456')
+        self.assertEqual(rows[1]['author_username'], 'Reader')
+        self.assertEqual(rows[1]['group_slug'], 'group')
+        self.assertEqual(rows[4]['user_username'], 'Reader')
+
+    def test_filters(self):
+        content = self.export(since='2021-01-01', until='2021-06-01')
+        self.assertEqual(
+            [json.loads(line)['text'] for line in content.splitlines()],
+            ['Новый'])
+
+        content = self.export('posts', 'comments', author='Author')
+        self.assertEqual(
+            [json.loads(line)['text'] for line in content.splitlines()],
+            ['Старый', 'Комментарий'])
+
+        content = self.export('comments', group='group', format='csv')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['post_id'], str(self.new_post.pk))
+
+    def test_invalid_options(self):
+        for args, options in (
+                (('posts', 'comments'), {'format': 'csv'}),
+                (('users',), {}),
+                ((), {'author': 'Nobody'}),
+                ((), {'since': '01.01.2020'})):
+            with self.subTest(args=args, options=options):
+                with self.assertRaises(CommandError):
+                    self.export(*args, **options)
+
+    def test_admin_action_streams_selected_rows(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.post(
+            reverse('admin:posts_post_changelist'),
+            {'action': 'export_csv', '_selected_action': [self.new_post.pk]})
+
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([row['text'] for row in rows], ['Новый'])
@@ -21,7 +21,7 @@ class PostFormTest(TestCase):
         cls.user = User.objects.create(username='TestUser')
         cls.authorized_client = Client()
         cls.authorized_client.force_login(cls.user)
-        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        settings.MEDIA_ROOT = tempfile.mkdtemp()
 
         cls.group = Group.objects.create(
             slug='test-slug',
@@ -0,0 +1,175 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import datetime
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase
+
+from posts import importer, search
+from posts.counters import get_stats
+from posts.models import (
+    Comment, Follow, Group, Post, TimelineEntry, UserStats)
+
+
+User = get_user_model()
+
+
+def ndjson(*rows):
+    return [json.dumps(row, ensure_ascii=False) + '\n' for row in rows]
+
+
+class ImportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Author')
+        cls.reader = User.objects.create(username='Reader')
+
+    def run_import(self, lines, **options):
+        errors = []
+        task = importer.Importer(
+            on_error=lambda number, message: errors.append(number),
+            **options)
+        task.feed(lines)
+        return task, errors
+
+    def test_rows_keep_dates_and_links(self):
+        task, errors = self.run_import(ndjson(
+            {'model': 'group', 'slug': 'cats', 'title': 'Коты',
+             'description': 'Про котов'},
+            {'model': 'post', 'id': 'p1', 'text': 'Старый пост',
+             'pub_date': '2015-03-01T10:20:30.123456',
+             'author_username': 'Author', 'group_slug': 'cats'},
+            {'model': 'comment', 'post_id': 'p1', 'text': 'Ответ',
+             'created': '2015-03-02T08:00:00', 'author_username': 'Reader'},
+            {'model': 'follow', 'user_username': 'Reader',
+             'author_username': 'Author'},
+        ), batch_size=2)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            dict(task.created),
+            {'group': 1, 'post': 1, 'comment': 1, 'follow': 1})
+        post = Post.objects.get()
+        self.assertEqual(
+            post.pub_date, datetime(2015, 3, 1, 10, 20, 30, 123456))
+        self.assertEqual(post.group, Group.objects.get(slug='cats'))
+        comment = Comment.objects.get()
+        self.assertEqual(comment.post, post)
+        self.assertEqual(comment.created, datetime(2015, 3, 2, 8))
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+            .exists())
+
+        task.finish()
+        self.assertEqual(get_stats(self.author.pk).posts, 1)
+        self.assertEqual(get_stats(self.author.pk).followers, 1)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post)
+            .exists())
+
+    def test_finish_updates_only_imported_rows(self):
+        """ finish обновляет счетчики, ленты и индекс импортированного,
+        не пересобирая остальное """
+        old_post = Post.objects.create(text='Прежний пост', author=self.author)
+        other = User.objects.create(username='Other')
+        UserStats.objects.create(user=other, posts=42)
+        task, errors = self.run_import(ndjson(
+            {'model': 'post', 'text': 'Импортированный пост',
+             'pub_date': '2020-01-01T00:00:00',
+             'author_username': 'Author'},
+            {'model': 'follow', 'user_username': 'Reader',
+             'author_username': 'Author'},
+        ))
+        self.assertEqual(errors, [])
+        task.finish()
+
+        new_post = Post.objects.get(text='Импортированный пост')
+        self.assertEqual(get_stats(self.author.pk).posts, 2)
+        self.assertEqual(get_stats(self.reader.pk).following, 1)
+        self.assertEqual(get_stats(other.pk).posts, 42)
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(user=self.reader).values_list(
+                'post_id', flat=True)),
+            {old_post.pk, new_post.pk})
+        self.assertEqual(list(search.search('импортированный')), [new_post])
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        good = {'model': 'post', 'text': 'Пост',
+                'pub_date': '2020-01-01T00:00:00',
+                'author_username': 'Author'}
+        lines = ['{"model": ', '\n'] + ndjson(
+            good,
+            {'model': 'user', 'username': 'x'},
+            {**good, 'pub_date': 'вчера'},
+            {**good, 'author_username': 'Nobody'},
+            {**good, 'group_slug': 'missing'},
+            {**good, 'text': ''},
+            {'model': 'comment', 'post_id': 7, 'text': 'Ответ',
+             'created': '2020-01-01T00:00:00', 'author_username': 'Reader'},
+            {'model': 'follow', 'user_username': 'Reader',
+             'author_username': 'Reader'},
+            {'model': 'group', 'slug': 'не слаг', 'title': 'Группа'},
+        )
+        task, errors = self.run_import(lines)
+
+        self.assertEqual(sorted(errors), [1, 4, 5, 6, 7, 8, 9, 10, 11])
+        self.assertEqual(task.errors, 9)
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_missing_users_can_be_created(self):
+        task, errors = self.run_import(ndjson(
+            {'model': 'post', 'text': 'Пост',
+             'pub_date': '2020-01-01T00:00:00',
+             'author_username': 'Newcomer'},
+        ), create_users=True)
+        self.assertEqual(errors, [])
+        newcomer = User.objects.get(username='Newcomer')
+        self.assertFalse(newcomer.has_usable_password())
+        self.assertEqual(newcomer.posts.count(), 1)
+
+    def test_failed_batch_is_retried_row_by_row(self):
+        """ Ошибка базы в пачке теряет только виноватую строку """
+        bulk_create = importer.Importer._bulk_create
+
+        def failing(task, model, objects, **options):
+            if any(obj.text == 'Сломанный' for obj in objects):
+                raise DatabaseError('сбой вставки')
+            return bulk_create(task, model, objects, **options)
+
+        rows = [
+            {'model': 'post', 'text': text,
+             'pub_date': '2020-01-01T00:00:00', 'author_username': 'Author'}
+            for text in ('Первый', 'Сломанный', 'Третий')
+        ]
+        with mock.patch.object(importer.Importer, '_bulk_create', failing):
+            task, errors = self.run_import(ndjson(*rows))
+
+        self.assertEqual(errors, [2])
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            ['Первый', 'Третий'])
+
+    def test_command_reads_gzip_and_rebuilds(self):
+        descriptor, name = tempfile.mkstemp(suffix='.ndjson.gz')
+        os.close(descriptor)
+        self.addCleanup(os.remove, name)
+        with gzip.open(name, 'wt', encoding='utf-8') as file:
+            file.writelines(ndjson(
+                {'model': 'post', 'text': 'Пост',
+                 'pub_date': '2020-01-01T00:00:00',
+                 'author_username': 'Author'},
+                {'model': 'post', 'text': 'Пост'},
+            ))
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command(
+            'import_posts', name, stdout=stdout, stderr=stderr)
+        self.assertIn('post 1; ошибок 1', stdout.getvalue())
+        self.assertIn(f'{name}:2: нет поля pub_date', stderr.getvalue())
+        self.assertEqual(get_stats(self.author.pk).posts, 1)
@@ -0,0 +1,114 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post, Group, Comment, Follow
+
+
+User = get_user_model()
+
+# Проход по таблице: "SCAN posts_post", в SQLite до 3.36 -
+# "SCAN TABLE posts_post". Проход "... USING INDEX ..." идет по индексу
+FULL_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Разбирается план запроса SQLite')
+class QueryPlanTest(TestCase):
+    """ Каждый запрос страниц ленты берет строки по индексу,
+    без полного прохода по таблице и сортировки во временном B-дереве.
+    Поиск не проверяется: релевантность вычисляется, и найденные посты
+    сортируются по ней после выборки по индексу слов """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='Author')
+        cls.reader = User.objects.create(username='Reader')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.reader)
+
+        cls.group = Group.objects.create(
+            title='test',
+            slug='test-slug',
+            description='test-desc'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(3):
+            cls.post = Post.objects.create(
+                text=f'{i} запись', author=cls.author, group=cls.group)
+            Comment.objects.create(
+                text='Комментарий', post=cls.post, author=cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def query_plans(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                yield sql, [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndexes(self, url):
+        steps = 0
+        for sql, plan in self.query_plans(url):
+            for step in plan:
+                steps += 1
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertNotIn('USE TEMP B-TREE', step)
+                    scan = FULL_SCAN_RE.match(step)
+                    # Подзапрос счетчика страниц ограничен LIMIT
+                    if (scan and 'INDEX' not in step
+                            and scan.group(1) != 'subquery'):
+                        self.fail(f'Полный проход по {scan.group(1)}')
+        # Пустой разбор плана не должен сойти за проверку
+        self.assertGreater(steps, 0, f'Нет строк плана запросов {url}')
+
+    def test_feeds(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={
+                'username': self.author.username}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            self.assertUsesIndexes(url)
+
+    @override_settings(POSTS_PER_PAGE=1, PAGINATOR_PAGE_LIMIT=1)
+    def test_cursor_pages(self):
+        """ Страницы по курсору идут по тому же индексу """
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={
+                'username': self.author.username}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            cursor = self.authorized_client.get(
+                url).context['page'].next_cursor
+            self.assertUsesIndexes(f'{url}?cursor={cursor}')
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_follow_feed_with_popular_authors(self):
+        """ Посты популярных авторов подмешиваются тоже по индексу """
+        self.assertUsesIndexes(reverse('posts:follow_index'))
+
+    @override_settings(COMMENTS_PER_PAGE=1)
+    def test_post_and_comments(self):
+        kwargs = {'username': self.author.username, 'post_id': self.post.pk}
+        self.assertUsesIndexes(reverse('posts:post', kwargs=kwargs))
+        self.assertUsesIndexes(reverse('posts:comments', kwargs=kwargs))
@@ -0,0 +1,124 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import notifications
+from posts.caching import NOTIFICATIONS_GENERATION_KEY, get_generation
+from posts.counters import get_stats
+from posts.models import Comment, Follow, Notification, Post
+
+
+User = get_user_model()
+
+
+class NotificationsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Author')
+        cls.reader = User.objects.create(username='Reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_followers_are_notified_about_new_posts(self):
+        post = Post.objects.create(text='Новый пост', author=self.author)
+
+        notification = Notification.objects.get(user=self.reader)
+        self.assertEqual(notification.kind, Notification.POST)
+        self.assertEqual(notification.post, post)
+        self.assertFalse(Notification.objects.filter(user=self.author))
+        self.assertEqual(notifications.unread_count(self.reader.pk), 1)
+
+        response = self.reader_client.get(reverse('posts:notifications'))
+        self.assertContains(response, 'Новый пост от')
+        self.assertContains(response, 'badge-danger">1<')
+
+    def test_post_author_is_notified_about_comments(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(text='Свой', post=post, author=self.author)
+        comment = Comment.objects.create(
+            text='Ответ', post=post, author=self.reader)
+
+        notification = Notification.objects.get(user=self.author)
+        self.assertEqual(notification.kind, Notification.COMMENT)
+        self.assertEqual(notification.comment, comment)
+        self.assertEqual(notification.actor, self.reader)
+
+    def test_repeated_fan_out_keeps_counter(self):
+        """ Повтор задачи не создает дублей и не сбивает счетчик """
+        get_stats(self.reader.pk)
+        post = Post.objects.create(text='Пост', author=self.author)
+        notifications.notify_followers(post.pk)
+
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(get_stats(self.reader.pk).unread_notifications, 1)
+
+    def test_generations_are_bumped_in_bulk(self):
+        """ Поколения всех получателей сдвигаются одной записью """
+        readers = [self.reader] + [
+            User.objects.create(username=f'Reader{i}') for i in range(3)]
+        for reader in readers[1:]:
+            Follow.objects.create(user=reader, author=self.author)
+        keys = [
+            NOTIFICATIONS_GENERATION_KEY.format(user_id=reader.pk)
+            for reader in readers
+        ]
+        before = [get_generation(key) for key in keys]
+
+        with mock.patch.object(
+                cache, 'set_many', wraps=cache.set_many) as set_many:
+            Post.objects.create(text='Пост', author=self.author)
+
+        self.assertIn(set(keys), [
+            set(call.args[0]) for call in set_many.call_args_list])
+        for key, generation in zip(keys, before):
+            self.assertNotEqual(get_generation(key), generation)
+
+    def test_mark_read(self):
+        get_stats(self.reader.pk)
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(3)
+        ]
+        first, second, third = Notification.objects.order_by('pk')
+
+        self.reader_client.post(
+            reverse('posts:notifications_read'), {'id': [first.pk]})
+        self.assertEqual(get_stats(self.reader.pk).unread_notifications, 2)
+
+        # Пришедшее после показа страницы остается новым
+        self.reader_client.post(
+            reverse('posts:notifications_read'), {'up_to': second.pk})
+        third.refresh_from_db()
+        self.assertFalse(third.is_read)
+        self.assertEqual(get_stats(self.reader.pk).unread_notifications, 1)
+
+        response = self.author_client.post(
+            reverse('posts:notifications_read'))
+        self.assertEqual(response.status_code, 302)
+        third.refresh_from_db()
+        self.assertFalse(third.is_read)
+
+        posts[2].delete()
+        self.assertEqual(get_stats(self.reader.pk).unread_notifications, 0)
+
+    def test_badge_changes_etag(self):
+        """ 304 не оставляет в меню старое число непрочитанных """
+        Post.objects.create(text='Пост', author=self.author)
+        url = reverse('posts:index')
+        response = self.reader_client.get(url)
+        self.assertContains(response, 'badge-danger">1<')
+
+        notifications.mark_read(self.reader)
+        response = self.reader_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'badge-danger')
@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Author')
+        cls.other = User.objects.create(username='Other')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            text='Пост в группе', author=cls.author, group=cls.group)
+        cls.other_post = Post.objects.create(
+            text='Другой пост', author=cls.other)
+
+    def setUp(self):
+        cache.clear()
+        self.urls = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group', kwargs={'slug': 'group'}),
+            'author': reverse('posts:profile', kwargs={
+                'username': 'Author'}),
+            'other': reverse('posts:profile', kwargs={'username': 'Other'}),
+            'post': reverse('posts:post', kwargs={
+                'username': 'Author', 'post_id': self.post.pk}),
+            'other_post': reverse('posts:post', kwargs={
+                'username': 'Other', 'post_id': self.other_post.pk}),
+        }
+
+    def statuses(self):
+        return {
+            name: self.client.get(url)['X-Page-Cache']
+            for name, url in self.urls.items()
+        }
+
+    def test_second_request_is_served_without_queries(self):
+        first = self.client.get(self.urls['index'])
+        self.assertEqual(first['X-Page-Cache'], 'miss')
+        self.assertIn(f'post:{self.post.pk}', first['Surrogate-Key'])
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.urls['index'])
+        self.assertEqual(second['X-Page-Cache'], 'hit')
+        self.assertEqual(second.content, first.content)
+
+    def test_authenticated_users_bypass_cache(self):
+        client = Client()
+        client.force_login(self.other)
+        client.get(self.urls['index'])
+        response = client.get(self.urls['index'])
+        self.assertFalse(response.has_header('X-Page-Cache'))
+
+    def test_comment_purges_only_pages_with_the_post(self):
+        """ Комментарий сбрасывает страницы, где виден пост, и только их """
+        self.statuses()
+        Comment.objects.create(
+            text='Комментарий', post=self.post, author=self.other)
+
+        self.assertEqual(self.statuses(), {
+            'index': 'miss',
+            'group': 'miss',
+            'author': 'miss',
+            'other': 'hit',
+            'post': 'miss',
+            'other_post': 'hit',
+        })
+
+    def test_new_post_purges_feeds_it_appears_in(self):
+        self.statuses()
+        Post.objects.create(text='Новый', author=self.other)
+
+        statuses = self.statuses()
+        self.assertEqual(statuses['index'], 'miss')
+        self.assertEqual(statuses['other'], 'miss')
+        self.assertEqual(statuses['group'], 'hit')
+        self.assertEqual(statuses['post'], 'hit')
+        self.assertContains(self.client.get(self.urls['index']), 'Новый')
+
+    def test_follow_purges_both_profiles(self):
+        self.statuses()
+        Follow.objects.create(user=self.other, author=self.author)
+
+        statuses = self.statuses()
+        self.assertEqual(statuses['author'], 'miss')
+        self.assertEqual(statuses['other'], 'miss')
+        self.assertEqual(statuses['post'], 'miss')
+        self.assertEqual(statuses['group'], 'hit')
@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
-from django.test import TestCase, Client
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from posts.models import Post, Group
@@ -46,3 +48,47 @@ class TestPaginator(TestCase):
         response = self.authorized_client.get(reverse(
             'posts:group', kwargs={'slug': self.group.slug}) + '?page=2')
         self.assertEqual(len(response.context['page'].object_list), 5)
+
+    @override_settings(PAGINATOR_PAGE_LIMIT=1)
+    def test_cursor_pages_continue_page_numbers(self):
+        """ Курсорные страницы продолжают ленту без пропусков и повторов """
+        url = reverse('posts:group', kwargs={'slug': self.group.slug})
+        first_page = self.authorized_client.get(url).context['page']
+        self.assertIsNotNone(first_page.next_cursor)
+
+        response = self.authorized_client.get(
+            url, {'cursor': first_page.next_cursor})
+        second_page = response.context['page']
+        self.assertEqual(len(second_page), 5)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+
+        all_posts = list(first_page) + list(second_page)
+        self.assertEqual(
+            all_posts, list(Post.objects.order_by('-pub_date', '-pk')))
+
+        response = self.authorized_client.get(
+            url, {'cursor': second_page.previous_cursor})
+        self.assertEqual(list(response.context['page']), list(first_page))
+
+    def test_broken_cursor_returns_first_page(self):
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page']), 10)
+        self.assertFalse(response.context['page'].has_previous())
+
+    @override_settings(PAGINATOR_PAGE_LIMIT=1)
+    def test_deep_page_numbers_are_not_found(self):
+        """ Номер глубже предела - 404 без OFFSET и полного COUNT(*) """
+        url = reverse('posts:index')
+        for page in ('2', '999'):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.authorized_client.get(url, {'page': page})
+            self.assertEqual(response.status_code, 404)
+            for query in queries.captured_queries:
+                self.assertNotIn('OFFSET', query['sql'].upper())
+
+        response = self.authorized_client.get(url, {'page': '1'})
+        self.assertTrue(response.context['page'].has_next())
+        self.assertIsNotNone(response.context['page'].next_cursor)
@@ -0,0 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.conf import settings
+from django.urls import reverse
+
+from posts.models import Post, Group, Comment, Follow
+from yatube.querycheck import format_problems, inspect_queries
+
+
+User = get_user_model()
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='Author')
+        cls.reader = User.objects.create(username='Reader')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.reader)
+
+        cls.group = Group.objects.create(
+            title='test',
+            slug='test-slug',
+            description='test-desc'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(
+                text=f'{i} запись',
+                author=self.author,
+                group=self.group
+            )
+            Comment.objects.create(
+                text='Комментарий',
+                post=post,
+                author=self.reader
+            )
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """ Число запросов к БД на странице ленты не зависит
+        от количества постов на ней """
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={
+                'username': self.author.username}),
+            reverse('posts:follow_index'),
+        )
+
+        self.create_posts(1)
+        queries_before = {url: self.count_queries(url) for url in urls}
+
+        self.create_posts(settings.POSTS_PER_PAGE)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.count_queries(url), queries_before[url], (
+                        ' Количество запросов растет вместе с числом постов '
+                    ))
+
+    def test_post_page_has_no_repeated_queries(self):
+        """ Комментарии поста не порождают запрос на каждый комментарий """
+        post = Post.objects.create(text='Пост', author=self.author)
+        for i in range(settings.COMMENTS_PER_PAGE):
+            author = User.objects.create(username=f'Commenter{i}')
+            Comment.objects.create(text=f'{i}', post=post, author=author)
+        kwargs = {'username': self.author.username, 'post_id': post.pk}
+
+        for url in (reverse('posts:post', kwargs=kwargs),
+                    reverse('posts:comments', kwargs=kwargs)):
+            cache.clear()
+            with self.subTest(url=url), inspect_queries() as inspector:
+                self.authorized_client.get(url)
+                problems = inspector.problems()
+                self.assertEqual(problems, [], format_problems(problems))
+
+    def test_feed_shows_comment_count(self):
+        """ Число комментариев подставляется в карточку поста """
+        self.create_posts(1)
+        response = self.authorized_client.get(reverse('posts:index'))
+
+        post = response.context['page'].object_list[0]
+        self.assertEqual(post.comment_count, 1)
+        self.assertContains(response, 'Комментариев: 1')
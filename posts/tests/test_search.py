@@ -0,0 +1,124 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from posts.models import Post, Group, Comment, SearchEntry
+from posts.stemmer import stem
+
+
+User = get_user_model()
+
+
+class StemmerTest(TestCase):
+    def test_word_forms_share_stem(self):
+        """ Разные формы слова сводятся к одной основе """
+        forms = (
+            ('книга', 'книги', 'книгами'),
+            ('красивая', 'красивые', 'красивого'),
+            ('подписчик', 'подписчики', 'подписчиков'),
+            ('ёлка', 'елки'),
+        )
+        for words in forms:
+            with self.subTest(words=words):
+                self.assertEqual(len({stem(word) for word in words}), 1)
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.guest_client = Client()
+        cls.user = User.objects.create(username='Author')
+        cls.group = Group.objects.create(
+            title='Книги',
+            slug='books',
+            description='test-desc'
+        )
+        cls.book_post = Post.objects.create(
+            text='Прочитал новую книгу про котов',
+            author=cls.user,
+            group=cls.group
+        )
+        cls.other_post = Post.objects.create(
+            text='Сегодня гуляли в парке',
+            author=cls.user
+        )
+
+    def search(self, **params):
+        response = self.guest_client.get(reverse('posts:search'), params)
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['page'])
+
+    def test_search_finds_other_word_forms(self):
+        self.assertEqual(self.search(q='книгами'), [self.book_post])
+        self.assertEqual(self.search(q='котами'), [self.book_post])
+        self.assertEqual(self.search(q='самолеты'), [])
+
+    def test_comments_are_indexed(self):
+        """ Пост находится по тексту комментария и пропадает после
+        удаления комментария """
+        comment = Comment.objects.create(
+            text='Отличные прогулки с котом',
+            post=self.book_post,
+            author=self.user
+        )
+        self.assertEqual(
+            self.search(q='прогулкам'), [self.book_post])
+
+        comment.delete()
+        self.assertEqual(self.search(q='прогулкам'), [])
+
+    def test_results_are_ranked(self):
+        """ Совпадение в тексте поста весит больше, чем в комментарии """
+        Comment.objects.create(
+            text='Книга так себе', post=self.other_post, author=self.user)
+        self.assertEqual(
+            self.search(q='книга'), [self.book_post, self.other_post])
+
+    def test_filters(self):
+        Comment.objects.create(
+            text='Книга так себе', post=self.other_post, author=self.user)
+        self.assertEqual(
+            self.search(q='книга', group='books'), [self.book_post])
+        self.assertEqual(self.search(q='книга', author='Nobody'), [])
+
+    def test_edited_post_is_reindexed(self):
+        self.other_post.text = 'Сегодня читали книгу'
+        self.other_post.save()
+        self.assertIn(self.other_post, self.search(q='книга'))
+        self.assertEqual(self.search(q='парк'), [])
+
+    def test_cursor_pagination(self):
+        for i in range(12):
+            Post.objects.create(text=f'Книга номер {i}', author=self.user)
+
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'книга'})
+        first_page = response.context['page']
+        response = self.guest_client.get(
+            reverse('posts:search'),
+            {'q': 'книга', 'cursor': first_page.next_cursor})
+
+        found = list(first_page) + list(response.context['page'])
+        self.assertEqual(len(found), 13)
+        self.assertEqual(len(set(found)), 13)
+
+    def test_rebuild_command(self):
+        SearchEntry.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+
+        self.assertIn('Проиндексировано постов: 2', out.getvalue())
+        self.assertEqual(self.search(q='книга'), [self.book_post])
+
+    def test_post_with_comments_can_be_deleted(self):
+        Comment.objects.create(
+            text='Книга так себе', post=self.other_post, author=self.user)
+        Post.objects.filter(pk=self.other_post.pk).delete()
+
+        self.assertFalse(
+            SearchEntry.objects.filter(post_id=self.other_post.pk).exists())
+        self.assertEqual(self.search(q='книга'), [self.book_post])
@@ -0,0 +1,132 @@
+from datetime import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db.models import F
+from django.test import TestCase
+
+from posts import seed
+from posts.models import (
+    Comment, Follow, Group, Post, SearchEntry, TimelineEntry, UserStats)
+
+
+User = get_user_model()
+
+SEED_OPTIONS = {
+    'users': 20,
+    'groups': 3,
+    'posts': 120,
+    'comments': 200,
+    'follows': 4,
+    'until': '2026-01-01',
+    'batch_size': 50,
+}
+
+
+class SeedCommandTest(TestCase):
+    def seed(self, **options):
+        call_command('seed', stdout=StringIO(), **{**SEED_OPTIONS, **options})
+
+    def snapshot(self):
+        return (
+            list(Post.objects.order_by('pk').values_list(
+                'author__username', 'group__slug', 'text', 'pub_date')),
+            list(Comment.objects.order_by('pk').values_list(
+                'post_id', 'author__username', 'created')),
+            sorted(Follow.objects.values_list(
+                'user__username', 'author__username')),
+        )
+
+    def test_creates_requested_volume(self):
+        self.seed()
+
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 120)
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(Follow.objects.filter(
+            user_id=F('author_id')).exists())
+
+    def test_same_seed_gives_same_data(self):
+        """ Одинаковые параметры и зерно дают одинаковые данные
+        при любом порядке пачек, как при вставке в несколько процессов """
+        self.seed()
+        first = self.snapshot()
+
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        params = seed.Params(
+            users=20, groups=3, posts=120, comments=200, follows=4, seed=0,
+            until=datetime(2026, 1, 1), prefix='user')
+        starts, stages = seed.plan(params, batch_size=50)
+        for chunks in stages:
+            for chunk in reversed(chunks):
+                seed.insert_chunk(params, starts, chunk)
+        self.assertEqual(self.snapshot(), first)
+
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed(seed=1)
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_dates_are_spread_before_until(self):
+        """ Даты задаются генератором, а не auto_now_add """
+        self.seed()
+        until = datetime(2026, 1, 1)
+        dates = list(Post.objects.order_by('pk').values_list(
+            'pub_date', flat=True))
+
+        self.assertEqual(dates, sorted(dates))
+        self.assertEqual(dates[-1], until)
+        self.assertGreater((until - dates[0]).days, 300)
+        for post_date, created in Comment.objects.values_list(
+                'post__pub_date', 'created'):
+            self.assertLessEqual(post_date, created)
+            self.assertLessEqual(created, until)
+
+    def test_derived_data_is_rebuilt(self):
+        """ Счетчики, ленты подписок и поисковый индекс пересчитаны,
+        хотя bulk_create не вызывает сигналы """
+        self.seed()
+
+        self.assertEqual(UserStats.objects.count(), 20)
+        stats = UserStats.objects.order_by('-posts').first()
+        self.assertEqual(
+            stats.posts, Post.objects.filter(author_id=stats.user_id).count())
+        follow = Follow.objects.first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user_id=follow.user_id, author_id=follow.author_id).count(),
+            Post.objects.filter(author_id=follow.author_id).count())
+        self.assertEqual(
+            SearchEntry.objects.values('post').distinct().count(), 120)
+
+    def test_appends_after_existing_rows(self):
+        """ Повторный запуск с другим префиксом дописывает данные """
+        self.seed()
+        self.seed(prefix='more')
+        self.assertEqual(Post.objects.count(), 240)
+        self.assertEqual(
+            User.objects.filter(username__startswith='more').count(), 20)
+
+        post = Post.objects.create(text='Пост', author=User.objects.first())
+        self.assertEqual(post.pk, 241)
+
+    def test_names_do_not_collide_with_existing(self):
+        """ Имена, совпавшие бы с уже занятыми, получают другой префикс """
+        User.objects.create(username='user2')
+        Group.objects.create(title='Чужая', slug='user-group-2')
+        self.seed()
+
+        self.assertEqual(User.objects.count(), 21)
+        self.assertEqual(
+            User.objects.filter(username__startswith='user_2_').count(), 20)
+        self.assertTrue(Group.objects.filter(slug='user_2_-group-3').exists())
+
+    def test_rejects_invalid_options(self):
+        with self.assertRaises(CommandError):
+            self.seed(until='01.01.2026')
+        with self.assertRaises(CommandError):
+            self.seed(users=0)
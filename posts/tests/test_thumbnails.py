@@ -0,0 +1,168 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client, override_settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.conf import settings
+from django.urls import reverse
+
+import os
+from io import StringIO
+import shutil
+import tempfile
+from unittest import mock
+
+from posts.models import Post
+from posts import thumbnails
+
+
+User = get_user_model()
+
+
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # override_settings сбрасывает закэшированный путь default_storage
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+        cls.guest_client = Client()
+        cls.user = User.objects.create(username='TestUser')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(self.thumbnail_dir(), ignore_errors=True)
+        self.small_gif = small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile(
+                name='small.gif',
+                content=small_gif,
+                content_type='image/gif'
+            )
+        )
+
+    def thumbnail_dir(self):
+        return os.path.join(settings.MEDIA_ROOT, 'cache')
+
+    def test_render_does_not_generate_thumbnails(self):
+        """ Страница показывает заглушку и не создает миниатюру сама """
+        response = self.guest_client.get(reverse('posts:index'))
+
+        self.assertContains(response, 'img/placeholder')
+        self.assertFalse(os.path.exists(self.thumbnail_dir()))
+        self.assertIsNone(thumbnails.get_ready(self.post.image, 'card'))
+
+    def test_generated_thumbnail_is_shown(self):
+        """ После фоновой генерации лента показывает миниатюру """
+        thumbnails.generate(self.post.pk)
+
+        thumbnail = thumbnails.get_ready(self.post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        self.assertEqual(tuple(thumbnail.size), (960, 339))
+
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, 'img/placeholder')
+
+    def test_srcset_variants(self):
+        """ Лента отдает варианты разных ширин и WebP через srcset """
+        thumbnails.generate(self.post.pk)
+
+        srcset = thumbnails.get_ready_srcset(self.post.image, 'card')
+        self.assertEqual(set(srcset), {'WEBP', 'JPEG'})
+        webp = dict((width, thumb) for thumb, width in srcset['WEBP'])
+        self.assertEqual(tuple(webp[480].size), (480, 170))
+        self.assertTrue(webp[480].name.endswith('.webp'))
+
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, f'{webp[480].url} 480w')
+        self.assertContains(response, 'sizes=')
+
+    def test_card_reads_ready_thumbnails_once(self):
+        """ Карточка берет миниатюру и все варианты из одной записи кэша,
+        не обращаясь к хранилищу sorl """
+        thumbnails.generate(self.post.pk)
+        thumbnail = thumbnails.get_ready(self.post.image, 'card')
+
+        with mock.patch.object(
+                thumbnails.backend, 'get_ready_thumbnail') as lookup:
+            response = self.guest_client.get(reverse('posts:index'))
+        lookup.assert_not_called()
+        self.assertContains(response, thumbnail.url)
+        self.assertContains(response, 'type="image/webp"')
+
+    def test_warm_command_generates_missing(self):
+        """ Команда создает недостающие миниатюры, повторный запуск
+        ничего не делает """
+        out = StringIO()
+        call_command('warm_thumbnails', workers=1, stdout=out)
+
+        self.assertIsNotNone(thumbnails.get_ready(self.post.image, 'card'))
+        self.assertIn('ошибок: 0', out.getvalue())
+
+        out = StringIO()
+        call_command('warm_thumbnails', workers=1, stdout=out)
+        self.assertIn('Создано миниатюр: 0', out.getvalue())
+
+    def test_warm_command_resumes(self):
+        call_command(
+            'warm_thumbnails', workers=1, start_after=self.post.pk,
+            stdout=StringIO())
+        self.assertIsNone(thumbnails.get_ready(self.post.image, 'card'))
+
+    def test_cleanup_removes_orphans(self):
+        """ Картинки и миниатюры удаленных постов удаляются,
+        нужные посту остаются """
+        thumbnails.generate(self.post.pk)
+        orphan = default_storage.save(
+            'posts/orphan.gif', ContentFile(self.small_gif))
+        orphan_post = Post.objects.create(
+            text='Удаленный пост', author=self.user, image=orphan)
+        thumbnails.generate(orphan_post.pk)
+        orphan_thumbnail = thumbnails.get_ready(orphan_post.image, 'card')
+        Post.objects.filter(pk=orphan_post.pk).delete()
+
+        out = StringIO()
+        call_command(
+            'warm_thumbnails', cleanup=True, dry_run=True, grace=0,
+            stdout=out)
+        self.assertIn('Будет удалено картинок: 1, миниатюр: 6', out.getvalue())
+        self.assertTrue(default_storage.exists(orphan))
+
+        call_command(
+            'warm_thumbnails', cleanup=True, grace=0, stdout=StringIO())
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertFalse(default_storage.exists(orphan_thumbnail.name))
+        kept = thumbnails.get_ready(self.post.image, 'card')
+        self.assertTrue(default_storage.exists(kept.name))
+        self.assertTrue(default_storage.exists(self.post.image.name))
+
+    def test_cleanup_keeps_fresh_uploads(self):
+        """ Картинка поста, который еще не сохранен, не удаляется """
+        upload = default_storage.save(
+            'posts/upload.gif', ContentFile(self.small_gif))
+
+        self.assertEqual(thumbnails.cleanup(), (0, 0))
+        self.assertTrue(default_storage.exists(upload))
+        thumbnails.cleanup(grace=0)
+        self.assertFalse(default_storage.exists(upload))
+        self.post.image.delete(save=False)
@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from posts.models import Post, Follow, TimelineEntry
+from posts import timeline
+
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='Author')
+        cls.reader = User.objects.create(username='Reader')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.reader)
+
+    def follow_index_posts(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return list(response.context['page'])
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        """ Новый пост попадает в ленты подписчиков при публикации """
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+
+        entry = TimelineEntry.objects.get(user=self.reader)
+        self.assertEqual(entry.post, post)
+        self.assertEqual(entry.pub_date, post.pub_date)
+        self.assertEqual(self.follow_index_posts(), [post])
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        """ Подписка добавляет старые посты, отписка их убирает """
+        posts = [
+            Post.objects.create(text=f'{i} пост', author=self.author)
+            for i in range(3)
+        ]
+
+        self.authorized_client.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.author.username}))
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3)
+        self.assertEqual(self.follow_index_posts(), posts[::-1])
+
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.author.username}))
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.follow_index_posts(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_authors_are_read_on_demand(self):
+        """ Посты популярных авторов читаются напрямую, без раскладки """
+        other_reader = User.objects.create(username='OtherReader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other_reader, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.follow_index_posts(), [post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_author_crossing_fanout_limit(self):
+        """ Автор становится популярным и перестает им быть:
+        из лент не пропадают посты, вышедшие в каждом из состояний """
+        other_reader = User.objects.create(username='OtherReader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        first = Post.objects.create(text='Первый', author=self.author)
+
+        Follow.objects.create(user=other_reader, author=self.author)
+        second = Post.objects.create(text='Второй', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=second).exists())
+        self.assertEqual(self.follow_index_posts(), [second, first])
+
+        Follow.objects.filter(user=other_reader).delete()
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list('user', 'post')),
+            {(self.reader.pk, first.pk), (self.reader.pk, second.pk)})
+        self.assertEqual(timeline.pulled_authors(self.reader), [])
+        self.assertEqual(self.follow_index_posts(), [second, first])
+
+    def test_rebuild_restores_entries(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(text='Пост', author=self.author)
+        TimelineEntry.objects.all().delete()
+
+        timeline.rebuild()
+        self.assertEqual(TimelineEntry.objects.count(), 1)
@@ -19,7 +19,7 @@ class CommonViewsTests(TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
-        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        settings.MEDIA_ROOT = tempfile.mkdtemp()
 
         small_gif = (
             b'\x47\x49\x46\x38\x39\x61\x02\x00'
@@ -264,27 +264,32 @@ class CommonViewsTests(TestCase):
 
     def test_cache(self):
         """ Тестирование работы кэша"""
-        # Делаем запрос до создания поста
+        cache.clear()
         response_before = self.authorized_client.get(reverse('posts:index'))
 
-        # Создаем пост
-        post = Post.objects.create(text='test', author=self.user)
+        # Изменение в обход сигналов не сбрасывает кэш ленты
+        Post.objects.filter(id=self.post.id).update(text='изменено')
+        response_cached = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response_before.content, response_cached.content)
+
+        # Новый пост сразу появляется на главной странице
+        post = Post.objects.create(text='новый пост', author=self.user)
         response_after = self.authorized_client.get(reverse('posts:index'))
-        Post.objects.filter(id=post.id).delete()
+        self.assertContains(response_after, 'новый пост')
 
-        # Удалили пост из бд, но на странице должен еще быть
+        # Удаленный пост сразу пропадает с главной страницы
+        post.delete()
         response_after_delete = self.authorized_client.get(
             reverse('posts:index'))
-        self.assertEqual(response_after.content, response_after_delete.content)
+        self.assertNotContains(response_after_delete, 'новый пост')
 
-        # Пост должен быть удален с главной страницы
+    def test_cache_keys_are_separate_for_feeds(self):
+        """ Лента подписок не берет кэш главной страницы """
         cache.clear()
-        response_after_clear = self.authorized_client.get(
-            reverse('posts:index'))
-        # До создания был 1 пост из setUp
-        self.assertEqual(
-            response_after_clear.context['paginator'].count,
-            response_before.context['paginator'].count)
+        self.authorized_client.get(reverse('posts:index'))
+
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertNotContains(response, self.post.text)
 
     def test_authorized_user_follow(self):
         """ Тестирование подписки авторизованным пользователем """
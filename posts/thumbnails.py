@@ -0,0 +1,256 @@
+import hashlib
+import posixpath
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from tasks.queue import task
+
+from . import pagecache
+from .caching import bump_feeds
+from .models import Post
+
+# Готовые миниатюры картинки всех размеров одной записью кэша
+READY_KEY = 'thumbnails:ready:{digest}'
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """ Готовая миниатюра из key-value хранилища sorl или None.
+        В отличие от get_thumbnail никогда не генерирует ее сама """
+        if not file_:
+            return None
+        source = ImageFile(file_)
+
+        # Опции собираются так же, как в ThumbnailBackend.get_thumbnail,
+        # иначе имя файла миниатюры не совпадет
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = ReadyThumbnailBackend()
+
+
+def get_ready(image, size):
+    geometry, options = settings.THUMBNAIL_SIZES[size]
+    return backend.get_ready_thumbnail(image, geometry, **options)
+
+
+def variants(size):
+    """ Варианты миниатюры для srcset: (формат, ширина, геометрия, опции).
+    Высота масштабируется, чтобы сохранить пропорции основной миниатюры """
+    geometry, options = settings.THUMBNAIL_SIZES[size]
+    width, height = (int(value) for value in geometry.split('x'))
+    for format_ in settings.THUMBNAIL_VARIANTS['formats']:
+        for variant_width in settings.THUMBNAIL_VARIANTS['widths']:
+            variant_height = round(height * variant_width / width)
+            yield (
+                format_,
+                variant_width,
+                f'{variant_width}x{variant_height}',
+                dict(options, format=format_),
+            )
+
+
+def get_ready_srcset(image, size):
+    """ Готовые варианты миниатюры: формат -> [(миниатюра, ширина)].
+    Варианты, которые фон еще не создал, пропускаются """
+    srcset = {}
+    for format_, width, geometry, options in variants(size):
+        thumbnail = backend.get_ready_thumbnail(image, geometry, **options)
+        if thumbnail is not None:
+            srcset.setdefault(format_, []).append((thumbnail, width))
+    return srcset
+
+
+def _ready_key(name):
+    digest = hashlib.sha1(name.encode()).hexdigest()
+    return READY_KEY.format(digest=digest)
+
+
+def _collect_ready(image):
+    """ Готовые миниатюры по хранилищу sorl: размер -> (миниатюра, формат ->
+    [(адрес варианта, ширина)]) и признак того, что готовы все варианты.
+    Размер, основная миниатюра которого еще не создана, пропускается """
+    ready = {}
+    complete = True
+    for size in settings.THUMBNAIL_SIZES:
+        thumbnail = get_ready(image, size)
+        if thumbnail is None:
+            complete = False
+            continue
+        srcset = get_ready_srcset(image, size)
+        found = sum(len(candidates) for candidates in srcset.values())
+        complete = complete and found == len(list(variants(size)))
+        ready[size] = (
+            {
+                'url': thumbnail.url,
+                'width': thumbnail.width,
+                'height': thumbnail.height,
+            },
+            {
+                format_: [(variant.url, width) for variant, width in found]
+                for format_, found in srcset.items()
+            },
+        )
+    return ready, complete
+
+
+def store_ready(image):
+    """ Запоминает готовые миниатюры картинки после генерации """
+    ready, _ = _collect_ready(image)
+    cache.set(_ready_key(image.name), ready, None)
+
+
+def get_ready_image(image):
+    """ Готовые миниатюры картинки одним чтением кэша вместо поиска
+    каждого варианта в хранилище sorl. Если записи нет (вытеснена или
+    миниатюры еще создаются), они ищутся по хранилищу; полный набор
+    запоминается """
+    if not image:
+        return {}
+    key = _ready_key(image.name)
+    ready = cache.get(key)
+    if ready is None:
+        ready, complete = _collect_ready(image)
+        if complete:
+            cache.set(key, ready, None)
+    return ready
+
+
+def _all_thumbnails():
+    """ Все миниатюры для картинки поста: основные размеры и варианты """
+    for size, (geometry, options) in settings.THUMBNAIL_SIZES.items():
+        yield geometry, options
+        for _, _, variant_geometry, variant_options in variants(size):
+            yield variant_geometry, variant_options
+
+
+def warm(image):
+    """ Создает только недостающие миниатюры картинки, возвращает их число """
+    created = 0
+    for geometry, options in _all_thumbnails():
+        if backend.get_ready_thumbnail(image, geometry, **options) is None:
+            get_thumbnail(image, geometry, **options)
+            created += 1
+    if created:
+        store_ready(image)
+    return created
+
+
+def _listdir_recursive(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from _listdir_recursive(storage, posixpath.join(path, directory))
+
+
+def _files(storage, path, before):
+    """ Файлы каталога хранилища, измененные не позже before """
+    if not storage.exists(path):
+        return
+    for name in _listdir_recursive(storage, path):
+        if storage.get_modified_time(name) <= before:
+            yield name
+
+
+def _referenced_images():
+    return set(
+        Post.objects.exclude(image='').values_list('image', flat=True))
+
+
+def _thumbnail_names(kvstore, referenced, dry_run):
+    """ Имена миниатюр из key-value хранилища sorl: нужных постам картинок
+    и картинок, которых у постов больше нет. Записи вторых удаляются
+    вместе с их файлами """
+    known = set()
+    stale = set()
+    for key in kvstore._find_keys(identity='thumbnails'):
+        source = kvstore._get(key)
+        is_stale = source is None or source.name not in referenced
+        for thumbnail_key in kvstore._get(key, identity='thumbnails') or []:
+            thumbnail = kvstore._get(thumbnail_key)
+            if thumbnail is not None:
+                (stale if is_stale else known).add(thumbnail.name)
+        if is_stale and not dry_run:
+            if source is not None:
+                kvstore.delete(source)
+            else:
+                kvstore._delete(key, identity='thumbnails')
+    return known, stale
+
+
+def _delete(storage, names, dry_run):
+    if not dry_run:
+        for name in names:
+            storage.delete(name)
+    return len(names)
+
+
+def cleanup(dry_run=False, grace=None):
+    """ Удаляет картинки, на которые не ссылается ни один пост, их миниатюры
+    и записи key-value хранилища sorl. Файлы моложе grace секунд
+    (THUMBNAIL_CLEANUP_GRACE) остаются. Возвращает число удаленных
+    картинок и миниатюр """
+    storage = default.storage
+    if grace is None:
+        grace = settings.THUMBNAIL_CLEANUP_GRACE
+    before = timezone.now() - timedelta(seconds=grace)
+    referenced = _referenced_images()
+
+    upload_to = Post._meta.get_field('image').upload_to.rstrip('/')
+    images = [
+        name for name in _files(storage, upload_to, before)
+        if name not in referenced
+    ]
+    removed_images = _delete(storage, images, dry_run)
+    if not dry_run:
+        cache.delete_many([_ready_key(name) for name in images])
+
+    known, stale = _thumbnail_names(default.kvstore, referenced, dry_run)
+    # Файлы миниатюр, о которых хранилище ничего не знает
+    prefix = thumbnail_settings.THUMBNAIL_PREFIX.rstrip('/')
+    orphans = set(_files(storage, prefix, before)) - known - stale
+    removed_thumbnails = len(stale) + _delete(storage, orphans, dry_run)
+    if not dry_run:
+        default.kvstore.cleanup()
+    return removed_images, removed_thumbnails
+
+
+@task
+def generate(post_id):
+    """ Создает миниатюры всех известных размеров и их варианты
+    для srcset для картинки поста """
+    post = Post.objects.filter(pk=post_id).only('image').first()
+    if post is None or not post.image:
+        return
+    for geometry, options in _all_thumbnails():
+        get_thumbnail(post.image, geometry, **options)
+    store_ready(post.image)
+    # Ленты и страницы в кэше все еще показывают заглушку
+    bump_feeds()
+    pagecache.purge(f'post:{post_id}')
+
+
+def schedule(post):
+    """ Ставит генерацию миниатюр в очередь фоновых задач, чтобы
+    запрос не ждал декодирования и ресайза картинки """
+    if post.image:
+        generate.enqueue(post.pk, key=f'thumbnails:{post.pk}')
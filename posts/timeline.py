@@ -0,0 +1,225 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, FilteredRelation, Q
+
+from tasks.queue import task
+
+from .caching import bump_feeds, bump_follow_feed
+from .counters import get_stats
+from .models import Follow, Post, TimelineEntry, UserStats
+
+
+# Лента подписок сортируется по дате и посту из материализованной таблицы,
+# в том же порядке, что и ее индекс
+FOLLOW_FEED_ORDERING = ('-feed_date', '-feed_post')
+
+BATCH_SIZE = 500
+
+
+def is_fanout_author(author_id):
+    """ Посты авторов с огромным числом подписчиков не раскладываются
+    по лентам, а подмешиваются при чтении """
+    followers = get_stats(author_id).followers
+    return followers <= settings.TIMELINE_FANOUT_LIMIT
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+@task
+def fan_out_post(post_id):
+    """ Раскладывает новый пост в ленты подписчиков автора. Задача:
+    у автора могут быть сотни подписчиков """
+    post = Post.objects.filter(pk=post_id).values(
+        'author_id', 'pub_date').first()
+    if post is None or not is_fanout_author(post['author_id']):
+        return
+    followers = Follow.objects.filter(
+        author_id=post['author_id']
+    ).values_list('user_id', flat=True)
+
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=post['author_id'],
+            pub_date=post['pub_date'])
+        for user_id in followers.iterator()
+    )
+    # Ленты подписок в кэше собраны еще без этого поста
+    bump_feeds()
+
+
+@task
+def backfill(user_id, author_id):
+    """ Добавляет в ленту нового подписчика уже вышедшие посты автора.
+    Задача: пока она ждала, подписку могли отменить """
+    if not is_fanout_author(author_id) or not Follow.objects.filter(
+            user_id=user_id, author_id=author_id).exists():
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date')
+
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+    bump_follow_feed(user_id)
+
+
+def fan_out_posts(post_ids):
+    """ fan_out_post для пачки постов без сигналов (импорт): подписчики
+    каждого автора выбираются один раз на все его посты из пачки """
+    for start in range(0, len(post_ids), BATCH_SIZE):
+        posts = {}
+        for pk, author_id, pub_date in Post.objects.filter(
+                pk__in=post_ids[start:start + BATCH_SIZE]
+        ).values_list('pk', 'author_id', 'pub_date'):
+            posts.setdefault(author_id, []).append((pk, pub_date))
+        authors = [
+            author_id for author_id in posts if is_fanout_author(author_id)]
+        followers = Follow.objects.filter(
+            author_id__in=authors).values_list('user_id', 'author_id')
+
+        _bulk_insert(
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date)
+            for user_id, author_id in followers.iterator()
+            for post_id, pub_date in posts[author_id]
+        )
+
+
+def backfill_follows(follows):
+    """ backfill для пар (подписчик, автор) без сигналов (импорт):
+    посты автора выбираются один раз на всех его новых подписчиков """
+    users = {}
+    for user_id, author_id in follows:
+        users.setdefault(author_id, []).append(user_id)
+    for author_id, user_ids in users.items():
+        if not is_fanout_author(author_id):
+            continue
+        posts = Post.objects.filter(
+            author_id=author_id
+        ).values_list('pk', 'pub_date')
+
+        _bulk_insert(
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date)
+            for post_id, pub_date in posts.iterator()
+            for user_id in user_ids
+        )
+
+
+@task
+def refill_author(author_id):
+    """ Заново раскладывает посты автора, вернувшегося под
+    TIMELINE_FANOUT_LIMIT: вышедшие, пока он был популярным, читались
+    напрямую и в ленты подписчиков не попадали """
+    if not is_fanout_author(author_id):
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        TimelineEntry.objects.filter(author_id=author_id).delete()
+        cursor.execute(_copy_posts_sql([author_id]), [author_id])
+    bump_feeds()
+
+
+def follower_removed(author_id):
+    """ Отписка, опустившая число подписчиков ровно до предела, снова
+    включает раскладку постов автора. Сравнивается значение, только что
+    записанное в этой транзакции, поэтому переход ловится один раз """
+    followers = UserStats.objects.filter(user_id=author_id).values_list(
+        'followers', flat=True).first()
+    if followers == settings.TIMELINE_FANOUT_LIMIT:
+        refill_author.enqueue(author_id, key=f'timeline:author:{author_id}')
+
+
+def trim(user_id, author_id):
+    """ Убирает посты автора из ленты отписавшегося пользователя """
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def _table(model, *fields):
+    quote = connection.ops.quote_name
+    return quote(model._meta.db_table), [
+        quote(model._meta.get_field(name).column) for name in fields]
+
+
+def _copy_posts_sql(authors):
+    """ INSERT ... SELECT: записи лент строятся в самой базе соединением
+    подписок с постами, без выборки строк в Python """
+    entry, entry_columns = _table(
+        TimelineEntry, 'user', 'post', 'author', 'pub_date')
+    follow, (follow_user, follow_author) = _table(Follow, 'user', 'author')
+    post, (post_id, post_author, post_date) = _table(
+        Post, 'id', 'author', 'pub_date')
+    placeholders = ', '.join(['%s'] * len(authors))
+    return (
+        f'INSERT INTO {entry} ({", ".join(entry_columns)}) '
+        f'SELECT f.{follow_user}, p.{post_id}, p.{post_author}, '
+        f'p.{post_date} '
+        f'FROM {follow} f INNER JOIN {post} p '
+        f'ON p.{post_author} = f.{follow_author} '
+        f'WHERE f.{follow_author} IN ({placeholders}) '
+        # В порядке индексов лент вставка дописывает их по порядку
+        f'ORDER BY f.{follow_user}, p.{post_date}, p.{post_id}'
+    )
+
+
+def rebuild():
+    """ Полностью пересобирает ленты по текущим подпискам одной
+    транзакцией. Число записей - сумма по подпискам числа постов автора,
+    на больших наборах это миллионы строк, поэтому они копируются
+    запросом INSERT ... SELECT пачками авторов """
+    authors = [
+        author_id
+        for author_id in Follow.objects.order_by('author_id').values_list(
+            'author_id', flat=True).distinct()
+        if is_fanout_author(author_id)
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        TimelineEntry.objects.all().delete()
+        for start in range(0, len(authors), BATCH_SIZE):
+            batch = authors[start:start + BATCH_SIZE]
+            cursor.execute(_copy_posts_sql(batch), batch)
+
+
+def pulled_authors(user):
+    """ Авторы из подписок пользователя, чьи посты читаются напрямую """
+    return list(
+        Follow.objects.filter(
+            user=user,
+            author__stats__followers__gt=settings.TIMELINE_FANOUT_LIMIT
+        ).values_list('author_id', flat=True)
+    )
+
+
+def follow_feed(user):
+    """ Лента подписок: диапазон по индексу материализованной таблицы,
+    посты популярных авторов подмешиваются при чтении """
+    posts = Post.objects.feed()
+    authors = pulled_authors(user)
+    if not authors:
+        return posts.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_post=F('timeline_entries__post'))
+
+    return posts.annotate(
+        entry=FilteredRelation(
+            'timeline_entries',
+            condition=Q(timeline_entries__user=user))
+    ).filter(
+        Q(entry__user=user) | Q(author_id__in=authors)
+    ).annotate(feed_date=F('pub_date'), feed_post=F('pk'))
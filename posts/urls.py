@@ -8,8 +8,21 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('new/', views.new_post, name='new_post'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.post_search, name='search'),
+    path(
+        'notifications/',
+        views.notification_list,
+        name='notifications'),
+    path(
+        'notifications/read/',
+        views.notifications_read,
+        name='notifications_read'),
     path('<str:username>/', views.profile, name='profile'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
+    path(
+        '<str:username>/<int:post_id>/comments/',
+        views.post_comments,
+        name='comments'),
     path(
         '<str:username>/<int:post_id>/comment/',
         views.add_comment,
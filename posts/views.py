@@ -1,100 +1,218 @@
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
-from django.core.paginator import Paginator
-from django.conf import settings
+from django.db import transaction
 from django.urls import reverse
+from django.views.decorators.http import require_POST
+
+from yatube.replicas import use_replica
 
 from .models import Post, Group, Follow
+from .caching import comments_cache_context, feed_cache_context
+from .counters import get_stats
 from .forms import PostForm, CommentForm
+from .paginator import COMMENT_ORDERING, CursorPaginator, paginate
+from . import notifications, search, thumbnails, timeline
+from .conditional import (
+    conditional_page, feed_generations, post_generations,
+    profile_generations)
+from .pagecache import anonymous_page_cache, post_keys, tag
 
 
 User = get_user_model()
 
 
+@conditional_page(feed_generations)
+@anonymous_page_cache
+@use_replica
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.feed()
+    paginator, page = paginate(request, post_list)
+    tag(request, 'feed:index', lambda: post_keys(page))
 
     data = {
         'page': page,
         'paginator': paginator,
-        'is_index': True
+        'is_index': True,
+        **feed_cache_context(request, 'index')
     }
     return render(request, 'index.html', data)
 
 
+@conditional_page(feed_generations)
+@anonymous_page_cache
+@use_replica
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = group.posts.feed()
+    paginator, page = paginate(request, posts)
+    tag(request, f'group:{group.pk}', lambda: post_keys(page))
 
     data = {
         'group': group,
         'page': page,
         'paginator': paginator,
+        **feed_cache_context(request, f'group:{group.pk}')
     }
 
     return render(request, 'group.html', data)
 
 
+@use_replica
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    group_slug = request.GET.get('group', '')
+    author_username = request.GET.get('author', '')
+
+    page = None
+    if query:
+        results = search.search(query, group_slug, author_username)
+        paginator = CursorPaginator(
+            results, settings.POSTS_PER_PAGE, search.SEARCH_ORDERING)
+        page = paginator.get_page(request.GET.get('cursor'))
+
+    params = request.GET.copy()
+    params.pop('cursor', None)
+
+    data = {
+        'query': query,
+        'group_slug': group_slug,
+        'author_username': author_username,
+        'groups': Group.objects.order_by('title'),
+        'page': page,
+        'query_string': params.urlencode(),
+    }
+    return render(request, 'search.html', data)
+
+
 @login_required
+@transaction.atomic
 def new_post(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule(post)
         return redirect(reverse('posts:index'))
     return render(request, 'new.html', {'form': form, 'is_create': True})
 
 
+@conditional_page(profile_generations)
+@anonymous_page_cache
+@use_replica
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    user_posts = author.posts.all()
+    user_posts = author.posts.feed()
 
-    paginator = Paginator(user_posts, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    paginator, page = paginate(request, user_posts)
+    tag(request, f'author:{author.pk}', lambda: post_keys(page))
 
-    followers_count = Follow.objects.filter(author=author).count()
-    following_count = Follow.objects.filter(user=author).count()
+    stats = get_stats(author.pk)
 
     data = {
         'author': author,
         'page': page,
         'paginator': paginator,
-        'following': following_count,
-        'followers': followers_count
+        **feed_cache_context(request, f'profile:{author.pk}'),
+        'stats': stats,
+        'following': stats.following,
+        'followers': stats.followers
     }
     return render(request, 'profile.html', data)
 
 
+def comments_page(request, post):
+    """ Комментарии поста вместе с авторами: (страница, курсор следующей).
+    Обе части ленивые, под кэшем фрагмента запрос не выполняется """
+    comments = post.comments.select_related('author')
+    paginator = CursorPaginator(
+        comments, settings.COMMENTS_PER_PAGE, COMMENT_ORDERING)
+    cursor = request.GET.get('cursor')
+    if cursor or not hasattr(post, 'comment_count'):
+        page = paginator.get_page(cursor)
+        return page, lambda: page.next_cursor
+
+    # Первая страница - обычный QuerySet, а есть ли следующая,
+    # известно из счетчика комментариев поста
+    first_page = comments.order_by(
+        *COMMENT_ORDERING)[:settings.COMMENTS_PER_PAGE]
+
+    def next_cursor():
+        if post.comment_count <= settings.COMMENTS_PER_PAGE:
+            return None
+        return paginator.cursor_for(first_page[len(first_page) - 1])
+
+    return first_page, next_cursor
+
+
+@conditional_page(post_generations)
+@anonymous_page_cache
+@use_replica
 def post_view(request, username, post_id):
-    user_post = get_object_or_404(Post, pk=post_id, author__username=username)
+    user_post = get_object_or_404(
+        Post.objects.feed(),
+        pk=post_id,
+        author__username=username)
     author = user_post.author
-    post_comments = user_post.comments.all()
+    tag(request, f'post:{user_post.pk}', f'author:{author.pk}')
     form = CommentForm()
 
-    followers_count = Follow.objects.filter(author=author).count()
-    following_count = Follow.objects.filter(user=author).count()
+    stats = get_stats(author.pk)
+
+    comments, next_cursor = comments_page(request, user_post)
 
     data = {
         'author': author,
         'post': user_post,
-        'comments': post_comments,
+        'comments': comments,
+        'next_cursor': next_cursor,
+        **comments_cache_context(request, user_post.pk),
         'form': form,
-        'following': following_count,
-        'followers': followers_count
+        'stats': stats,
+        'following': stats.following,
+        'followers': stats.followers
     }
     return render(request, 'post.html', data)
 
 
+@use_replica
+def post_comments(request, username, post_id):
+    """ Следующая страница комментариев для подгрузки при прокрутке:
+    HTML-фрагмент или JSON при ?format=json """
+    post = get_object_or_404(
+        Post.objects.select_related('author'),
+        pk=post_id,
+        author__username=username)
+    page, next_cursor = comments_page(request, post)
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created,
+                }
+                for comment in page
+            ],
+            'next_cursor': next_cursor(),
+        })
+
+    data = {
+        'author': post.author,
+        'post': post,
+        'comments': page,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'includes/comment_list.html', data)
+
+
 @login_required
+@transaction.atomic
 def post_edit(request, username, post_id):
     post = get_object_or_404(Post, pk=post_id, author__username=username)
     author = post.author
@@ -114,7 +232,8 @@ def post_edit(request, username, post_id):
         instance=post)
 
     if request.method == 'POST' and form.is_valid():
-        form.save()
+        post = form.save()
+        thumbnails.schedule(post)
         return redirect(reverse(
             'posts:post',
             kwargs={
@@ -134,6 +253,7 @@ def post_edit(request, username, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, username, post_id):
     post = get_object_or_404(Post, author__username=username, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -153,21 +273,55 @@ def add_comment(request, username, post_id):
 
 
 @login_required
+@use_replica
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = timeline.follow_feed(request.user)
+    paginator, page = paginate(
+        request, posts, timeline.FOLLOW_FEED_ORDERING)
 
     data = {
         'paginator': paginator,
         'page': page,
-        'is_index': False
+        'is_index': False,
+        **feed_cache_context(request, 'follow')
     }
     return render(request, 'follow.html', data)
 
 
 @login_required
+@use_replica
+def notification_list(request):
+    paginator = CursorPaginator(
+        notifications.inbox(request.user), settings.POSTS_PER_PAGE,
+        notifications.INBOX_ORDERING)
+    page = paginator.get_page(request.GET.get('cursor'))
+
+    data = {
+        'page': page,
+        # "Прочитать все" не трогает пришедшие после показа страницы
+        'up_to': max(
+            (item.pk for item in page.object_list), default=None),
+    }
+    return render(request, 'notifications.html', data)
+
+
+@login_required
+@require_POST
+@transaction.atomic
+def notifications_read(request):
+    """ Отмечает прочитанными выбранные уведомления, а если ничего
+    не выбрано - все до показанных включительно """
+    ids = [pk for pk in request.POST.getlist('id') if pk.isdigit()]
+    up_to = request.POST.get('up_to', '')
+    notifications.mark_read(
+        request.user,
+        up_to=int(up_to) if up_to.isdigit() else None,
+        ids=[int(pk) for pk in ids] or None)
+    return redirect(reverse('posts:notifications'))
+
+
+@login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     cur_user = request.user
@@ -181,6 +335,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
@@ -0,0 +1,23 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Task
+
+
+def retry(modeladmin, request, queryset):
+    queryset.update(
+        status=Task.PENDING, attempts=0, run_at=timezone.now())
+
+
+retry.short_description = 'Выполнить выбранные заново'
+
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'status', 'attempts', 'run_at', 'created')
+    search_fields = ('name', 'key')
+    list_filter = ('status', 'name')
+    readonly_fields = ('last_error',)
+    actions = [retry]
+
+
+admin.site.register(Task, TaskAdmin)
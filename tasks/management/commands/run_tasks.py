@@ -0,0 +1,34 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from tasks import queue
+
+
+class Command(BaseCommand):
+    help = ('Воркер очереди фоновых задач: выполняет задачи из базы, '
+            'упавшие повторяет с нарастающей паузой')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить задачи, срок которых подошел, и завершиться')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+
+        def stop(signum, frame):
+            # Текущая задача доделывается, новые не берутся
+            self.stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        started = time.monotonic()
+        done, failed = queue.work(
+            stop=lambda: self.stopping, once=options['once'])
+        self.stdout.write(
+            f'Выполнено задач: {done}, упало: {failed} '
+            f'за {time.monotonic() - started:.1f} с')
@@ -0,0 +1,63 @@
+import json
+
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """ Задача очереди: вызов функции name с аргументами args.
+    Выполненные задачи удаляются, в таблице остаются ожидающие и
+    окончательно упавшие """
+    PENDING = 'pending'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Ожидает'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(
+        max_length=200,
+        verbose_name='Функция')
+    args = models.TextField(
+        default='[]',
+        verbose_name='Аргументы (JSON)')
+    key = models.CharField(
+        max_length=200,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name='Ключ идемпотентности',
+        help_text='Задачи с одинаковым ключом, ожидающие выполнения, '
+                  'склеиваются в одну')
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Состояние')
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Выполнить после')
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Попыток')
+    max_attempts = models.PositiveIntegerField(
+        verbose_name='Наибольшее число попыток')
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка')
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Поставлена')
+
+    def __str__(self):
+        return f'{self.name}{tuple(self.get_args())}'
+
+    def get_args(self):
+        return json.loads(self.args)
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        # Воркер выбирает ожидающие задачи по времени запуска
+        indexes = [models.Index(
+            fields=['status', 'run_at'], name='tasks_due_idx')]
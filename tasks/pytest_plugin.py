@@ -0,0 +1,13 @@
+"""
+Плагин pytest: фоновые задачи выполняются сразу, как в manage.py test
+(tasks.testing). Подключается в tests/conftest.py.
+"""
+import pytest
+
+from tasks.testing import eager_tasks
+
+
+@pytest.fixture(autouse=True, scope='session')
+def _eager_tasks(django_test_environment):
+    with eager_tasks():
+        yield
@@ -0,0 +1,196 @@
+"""
+Очередь фоновых задач в базе данных, без внешнего брокера.
+
+Функция становится задачей через декоратор task и ставится в очередь
+методом enqueue; прямой вызов по-прежнему выполняет ее сразу:
+
+    @task(max_attempts=5, backoff=10)
+    def index_post(post_id):
+        ...
+
+    index_post.enqueue(post.pk, key=f'search:{post.pk}')
+
+Строка задачи пишется в той же транзакции, что и запись, которая ее
+вызвала: если транзакция откатится, задачи не будет, а воркер увидит ее
+только после коммита. Аргументы хранятся в JSON, поэтому задаче
+передаются id, а не модели.
+
+Ключ идемпотентности склеивает одинаковые ожидающие задачи: пока
+задача с ключом ждет воркера, повторные enqueue с тем же ключом ничего
+не добавляют. Взятая воркером задача ключ теряет, и следующая запись
+поставит новую - она увидит уже новые данные.
+
+Воркер (manage.py run_tasks) берет задачу, сдвигая ее run_at на LEASE
+секунд вперед: если воркер упадет, задача снова станет доступной по
+истечении аренды. Поэтому задачи должны быть идемпотентными. Упавшая
+задача повторяется через backoff * 2 ** (попытка - 1) секунд, но не
+позже MAX_BACKOFF; после max_attempts попыток она остается в таблице со
+статусом failed и видна в админке.
+
+При TASKS['EAGER'] (в тестах и при TASKS_EAGER=1) enqueue выполняет
+функцию сразу, как раньше делали сигналы.
+"""
+import json
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+
+logger = logging.getLogger(__name__)
+
+# Сколько ближайших задач перебирает воркер, если их разбирают другие
+CLAIM_BATCH = 10
+
+LEASE_EXPIRED_ERROR = '\nАренда истекла, попыток больше нет'
+
+
+def _option(name):
+    return settings.TASKS[name]
+
+
+class TaskFunction:
+    """ Функция, которую можно поставить в очередь """
+
+    def __init__(self, func, max_attempts=None, backoff=None):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__name__}'
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.__doc__ = func.__doc__
+        self.__name__ = func.__name__
+        self.__module__ = func.__module__
+
+    def __call__(self, *args):
+        return self.func(*args)
+
+    def __repr__(self):
+        return f'<task {self.name}>'
+
+    def enqueue(self, *args, key=None, delay=0):
+        """ Ставит вызов в очередь. Возвращает задачу или None, если
+        ожидающая задача с тем же ключом уже есть либо задача выполнена
+        сразу (EAGER) """
+        if _option('EAGER'):
+            self.func(*args)
+            return None
+        task = Task(
+            name=self.name,
+            args=json.dumps(args),
+            key=key,
+            run_at=timezone.now() + timedelta(seconds=delay),
+            max_attempts=self.max_attempts or _option('MAX_ATTEMPTS'))
+        if key is None:
+            task.save()
+            return task
+        Task.objects.bulk_create([task], ignore_conflicts=True)
+        return Task.objects.filter(key=key).first()
+
+    def retry_delay(self, attempts):
+        backoff = self.backoff if self.backoff is not None \
+            else _option('BACKOFF')
+        return min(backoff * 2 ** (attempts - 1), _option('MAX_BACKOFF'))
+
+
+def task(func=None, max_attempts=None, backoff=None):
+    """ Декоратор задачи; без параметров - со значениями из TASKS """
+    if func is None:
+        return lambda func: TaskFunction(func, max_attempts, backoff)
+    return TaskFunction(func)
+
+
+def claim():
+    """ Берет ближайшую задачу, срок которой подошел, или возвращает None.
+    Несколько воркеров не возьмут одну задачу: условное обновление по
+    числу попыток проходит только у одного из них. Задача, у которой
+    попыток не осталось, не берется, а помечается упавшей """
+    now = timezone.now()
+    due = Task.objects.filter(
+        status=Task.PENDING, run_at__lte=now
+    ).order_by('run_at', 'pk').values_list('pk', 'attempts', 'max_attempts')
+    for pk, attempts, max_attempts in due[:CLAIM_BATCH]:
+        pending = Task.objects.filter(
+            pk=pk, status=Task.PENDING, attempts=attempts)
+        if attempts >= max_attempts:
+            # Воркер упал на последней попытке, и аренда истекла
+            if pending.update(
+                    status=Task.FAILED,
+                    key=None,
+                    last_error=Concat(
+                        'last_error', Value(LEASE_EXPIRED_ERROR))):
+                logger.error('Задача %s не выполнена: %s', pk,
+                             LEASE_EXPIRED_ERROR.strip())
+            continue
+        claimed = pending.update(
+            attempts=F('attempts') + 1,
+            run_at=now + timedelta(seconds=_option('LEASE')),
+            key=None)
+        if claimed:
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def _fail(task, function, error):
+    task.last_error = error
+    if function is None or task.attempts >= task.max_attempts:
+        task.status = Task.FAILED
+        logger.error('Задача %s не выполнена: %s', task, error)
+    else:
+        task.run_at = timezone.now() + timedelta(
+            seconds=function.retry_delay(task.attempts))
+        logger.warning(
+            'Задача %s упала, попытка %s из %s', task, task.attempts,
+            task.max_attempts)
+    task.save(update_fields=['status', 'run_at', 'last_error'])
+
+
+def run(task):
+    """ Выполняет взятую задачу в транзакции: при ошибке ее записи
+    откатываются, и задача ставится на повтор """
+    try:
+        function = import_string(task.name)
+    except ImportError:
+        function = None
+    # Вызываются только функции, объявленные задачами
+    if not isinstance(function, TaskFunction):
+        _fail(task, None, f'Нет задачи {task.name}')
+        return False
+    try:
+        with transaction.atomic():
+            function(*task.get_args())
+    except Exception:
+        _fail(task, function, traceback.format_exc())
+        return False
+    Task.objects.filter(pk=task.pk).delete()
+    return True
+
+
+def work(stop=lambda: False, once=False):
+    """ Цикл воркера: выполняет задачи, пока stop() ложно. Если задач
+    нет, ждет POLL_INTERVAL секунд, а с once - завершается. Возвращает
+    число выполненных и упавших задач """
+    done = failed = 0
+    while not stop():
+        task = claim()
+        if task is None:
+            if once:
+                break
+            close_old_connections()
+            time.sleep(_option('POLL_INTERVAL'))
+            continue
+        if run(task):
+            done += 1
+        else:
+            failed += 1
+        # Соединение возвращается в пул, как в конце запроса
+        close_old_connections()
+    return done, failed
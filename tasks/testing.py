@@ -0,0 +1,66 @@
+"""
+Фоновые задачи в тестах выполняются сразу при постановке (EAGER), как
+если бы воркер успевал за каждой записью. Тесты самой очереди включают
+обычный режим через override_settings. MEDIA_ROOT и общий уровень кэша
+на весь прогон подменяются временными каталогами: загрузки и миниатюры,
+которые eager-задачи генерируют сразу, не попадают в media/ проекта,
+а cache.clear() в тестах не стирает кэш запущенного сервера.
+
+manage.py test подключает это через TEST_RUNNER, pytest - плагином
+tasks.pytest_plugin из tests/conftest.py.
+"""
+import shutil
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def eager_tasks():
+    return override_settings(TASKS={**settings.TASKS, 'EAGER': True})
+
+
+@contextmanager
+def temp_media_root():
+    """Временный MEDIA_ROOT, удаляемый вместе с содержимым на выходе."""
+    media_root = tempfile.mkdtemp()
+    try:
+        # override_settings сбрасывает закэшированный путь default_storage
+        with override_settings(MEDIA_ROOT=media_root):
+            yield media_root
+    finally:
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+@contextmanager
+def temp_shared_cache():
+    """ Общий уровень кэша (CACHES['shared']) в своем каталоге на прогон """
+    location = tempfile.mkdtemp()
+    try:
+        with override_settings(CACHES={
+            **settings.CACHES,
+            'shared': {
+                **settings.CACHES['shared'],
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            },
+        }):
+            yield location
+    finally:
+        shutil.rmtree(location, ignore_errors=True)
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._test_settings = ExitStack()
+        self._test_settings.enter_context(temp_media_root())
+        self._test_settings.enter_context(temp_shared_cache())
+        self._test_settings.enter_context(eager_tasks())
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_settings.close()
+        super().teardown_test_environment(**kwargs)
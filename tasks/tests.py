@@ -0,0 +1,175 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Post, SearchEntry, TimelineEntry
+from tasks import queue
+from tasks.models import Task
+
+
+User = get_user_model()
+
+calls = []
+
+
+@queue.task(max_attempts=3, backoff=10)
+def flaky(value):
+    """ Задача для тестов: падает на отрицательных значениях """
+    if value < 0:
+        raise ValueError(f'плохое значение {value}')
+    calls.append(value)
+
+
+def run_due():
+    done = 0
+    while True:
+        task = queue.claim()
+        if task is None:
+            return done
+        queue.run(task)
+        done += 1
+
+
+@override_settings(TASKS={**settings.TASKS, 'EAGER': False})
+class QueueTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Author')
+        cls.reader = User.objects.create(username='Reader')
+
+    def setUp(self):
+        calls.clear()
+
+    def test_writes_enqueue_side_effects(self):
+        """ Запись только ставит задачи, их выполняет воркер """
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Котики и собаки', author=self.author)
+
+        self.assertFalse(SearchEntry.objects.filter(post=post).exists())
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(
+            set(Task.objects.values_list('name', flat=True)),
+            {'posts.timeline.backfill', 'posts.timeline.fan_out_post',
+             'posts.search.index_post',
+             'posts.notifications.notify_followers'})
+
+        self.assertEqual(run_due(), 4)
+        self.assertFalse(Task.objects.exists())
+        self.assertTrue(SearchEntry.objects.filter(post=post).exists())
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post)
+            .exists())
+
+    def test_key_merges_pending_tasks(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        for text in ('Первый', 'Второй'):
+            Comment.objects.create(text=text, post=post, author=self.reader)
+        self.assertEqual(
+            Task.objects.filter(key=f'search:post:{post.pk}').count(), 1)
+
+        # Взятая воркером задача не мешает поставить новую
+        task = queue.claim()
+        while task.name != 'posts.search.index_post':
+            task = queue.claim()
+        Comment.objects.create(text='Третий', post=post, author=self.reader)
+        self.assertTrue(
+            Task.objects.filter(key=f'search:post:{post.pk}').exists())
+
+    def test_rolled_back_write_leaves_no_task(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                flaky.enqueue(1)
+                raise RuntimeError
+        self.assertFalse(Task.objects.exists())
+
+    def test_failed_task_is_retried_with_backoff(self):
+        task = flaky.enqueue(-1)
+        started = timezone.now()
+
+        for attempt in (1, 2):
+            with self.assertLogs('tasks.queue', 'WARNING'):
+                self.assertFalse(queue.run(queue.claim()))
+            task.refresh_from_db()
+            self.assertEqual(task.status, Task.PENDING)
+            self.assertEqual(task.attempts, attempt)
+            self.assertIn('плохое значение', task.last_error)
+            delay = (task.run_at - started).total_seconds()
+            self.assertGreaterEqual(delay, 10 * 2 ** (attempt - 1))
+            self.assertIsNone(queue.claim())
+            Task.objects.filter(pk=task.pk).update(run_at=started)
+
+        with self.assertLogs('tasks.queue', 'ERROR'):
+            self.assertFalse(queue.run(queue.claim()))
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertIsNone(queue.claim())
+
+    def test_lease_expires(self):
+        """ Задачу упавшего воркера берет другой после аренды """
+        task = flaky.enqueue(1)
+        self.assertEqual(queue.claim().pk, task.pk)
+        self.assertIsNone(queue.claim())
+
+        Task.objects.filter(pk=task.pk).update(
+            run_at=timezone.now() - timedelta(seconds=1))
+        task = queue.claim()
+        self.assertEqual(task.attempts, 2)
+        self.assertTrue(queue.run(task))
+        self.assertEqual(calls, [1])
+
+    def test_expired_last_attempt_is_failed(self):
+        """ Аренда последней попытки истекла - задача не берется снова """
+        task = flaky.enqueue(1)
+        Task.objects.filter(pk=task.pk).update(attempts=3)
+
+        with self.assertLogs('tasks.queue', 'ERROR'):
+            self.assertIsNone(queue.claim())
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertIn('Аренда истекла', task.last_error)
+        self.assertEqual(calls, [])
+
+    def test_rolled_back_edit_leaves_no_task(self):
+        """ Правка поста, упавшая после записи, не оставляет задач """
+        post = Post.objects.create(text='Старый текст', author=self.author)
+        Task.objects.all().delete()
+        self.client.force_login(self.author)
+
+        url = reverse('posts:post_edit', kwargs={
+            'username': self.author.username, 'post_id': post.pk})
+        with mock.patch('posts.thumbnails.schedule',
+                        side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            self.client.post(url, {'text': 'Новый текст'})
+
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Старый текст')
+        self.assertFalse(Task.objects.exists())
+
+    def test_only_declared_tasks_run(self):
+        task = Task.objects.create(name='os.getcwd', max_attempts=5)
+        with self.assertLogs('tasks.queue', 'ERROR'):
+            self.assertFalse(queue.run(queue.claim()))
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+
+    def test_worker_command(self):
+        flaky.enqueue(1)
+        flaky.enqueue(-1)
+        flaky.enqueue(2, delay=60)
+
+        out = StringIO()
+        with mock.patch('tasks.queue.close_old_connections'), \
+                self.assertLogs('tasks.queue', 'WARNING'):
+            call_command('run_tasks', once=True, stdout=out)
+        self.assertIn('Выполнено задач: 1, упало: 1', out.getvalue())
+        self.assertEqual(calls, [1])
+        self.assertEqual(Task.objects.count(), 2)
@@ -1,4 +1,16 @@
+import pytest
+
+from tasks.testing import temp_media_root, temp_shared_cache
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
+    'yatube.pytest_querycheck',
+    'tasks.pytest_plugin',
 ]
+
+
+@pytest.fixture(autouse=True, scope='session')
+def _temp_storage(django_test_environment):
+    with temp_media_root(), temp_shared_cache():
+        yield
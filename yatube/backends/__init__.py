@@ -0,0 +1,3 @@
+"""
+Бэкенды баз данных Django с пулом соединений yatube.dbpool.
+"""
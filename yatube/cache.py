@@ -0,0 +1,351 @@
+"""
+Двухуровневый кэш: ограниченный LRU в памяти процесса (L1) перед общим
+для всех воркеров хранилищем (L2) - любым другим алиасом из CACHES.
+
+Каждая перезапись или удаление ключа добавляет его в журнал изменений
+в общем хранилище: атомарный счетчик записей журнала и по ключу на
+запись. Воркеры читают новые записи журнала не чаще раза в SYNC_INTERVAL
+секунд и убирают из своего L1 только измененные ключи. Весь L1
+сбрасывается, лишь если воркер отстал от журнала больше чем на LOG_SIZE
+записей или журнал пропал из общего хранилища.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'yatube.cache.TwoTierCache',
+            'OPTIONS': {
+                'SHARED': 'shared',       # алиас L2, None - только L1
+                'LOCAL': True,            # False - только L2
+                'LOCAL_MAX_ENTRIES': 1000,
+                'LOCAL_TIMEOUT': 5,
+                'SYNC_INTERVAL': 1,
+                'LOG_SIZE': 1000,
+            },
+        },
+        'shared': {...},
+    }
+
+Общее хранилище должно атомарно выполнять incr (Redis, Memcached),
+иначе воркеры пропустят часть изменений.
+"""
+import pickle
+import time
+from collections import Counter, OrderedDict
+from threading import Lock
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+
+LOG_KEY = '__two_tier_log__'
+LOG_ENTRY_KEY = '__two_tier_log__:{}'
+# Запись журнала нужна, пока ее не прочли отставшие воркеры
+LOG_ENTRY_TIMEOUT = 60 * 60
+
+# Как и у LocMemCache, данные общие для всех потоков процесса
+_stores = {}
+_states = {}
+_locks = {}
+_stats = {}
+
+_missing = object()
+
+
+class _LocalState:
+    def __init__(self):
+        self.position = None
+        self.checked_at = 0
+        # Свои записи журнала: их ключи в L1 уже свежие
+        self.own = set()
+
+
+class TwoTierCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED')
+        self._use_local = options.get('LOCAL', True) or not self._shared_alias
+        self._local_max_entries = int(options.get('LOCAL_MAX_ENTRIES', 1000))
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self._sync_interval = options.get('SYNC_INTERVAL', 1)
+        self._log_size = int(options.get('LOG_SIZE', 1000))
+
+        self._store = _stores.setdefault(name, OrderedDict())
+        self._state = _states.setdefault(name, _LocalState())
+        self._lock = _locks.setdefault(name, Lock())
+        self._stats = _stats.setdefault(name, Counter())
+
+    @property
+    def shared(self):
+        if not self._shared_alias:
+            return None
+        return caches[self._shared_alias]
+
+    def stats(self):
+        """ Счетчики попаданий и промахов по уровням """
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _timeout(self, timeout):
+        # Общему уровню передаем время жизни этого кэша, а не его собственное
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    # Локальный уровень
+
+    def _local_expiry(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if self.shared is None or self._local_timeout is None:
+            return timeout
+        local = time.time() + self._local_timeout
+        return local if timeout is None else min(timeout, local)
+
+    def _has_expired(self, key):
+        expiry = self._store[key][1]
+        return expiry is not None and expiry <= time.time()
+
+    def _local_get(self, key):
+        with self._lock:
+            if key not in self._store:
+                return _missing
+            if self._has_expired(key):
+                del self._store[key]
+                return _missing
+            pickled = self._store[key][0]
+            self._store.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def _put(self, key, value, timeout):
+        self._store[key] = (
+            pickle.dumps(value, self.pickle_protocol),
+            self._local_expiry(timeout))
+        self._store.move_to_end(key)
+        while len(self._store) > self._local_max_entries:
+            self._store.popitem(last=False)
+            self._stats['local_evictions'] += 1
+
+    def _local_set(self, key, value, timeout):
+        with self._lock:
+            self._put(key, value, timeout)
+
+    def _local_add(self, key, value, timeout):
+        with self._lock:
+            if key in self._store and not self._has_expired(key):
+                return False
+            self._put(key, value, timeout)
+            return True
+
+    def _local_delete(self, key):
+        with self._lock:
+            self._store.pop(key, None)
+
+    # Синхронизация воркеров через журнал изменений
+
+    def _start_log(self, shared):
+        # Новый журнал (после clear или вытеснения) начинается далеко
+        # от старого, и воркеры со старой позицией сбросят L1 целиком
+        shared.add(LOG_KEY, int(time.time() * 1000), None)
+
+    def _log_position(self, shared):
+        position = shared.get(LOG_KEY)
+        if position is None:
+            self._start_log(shared)
+            position = shared.get(LOG_KEY)
+        return position
+
+    def _changed_keys(self, shared, start, end):
+        """ Ключи, измененные записями журнала (start, end];
+        None - если воркер отстал и часть записей уже не прочитать """
+        if start is None or end < start or end - start > self._log_size:
+            return None
+        entries = [
+            LOG_ENTRY_KEY.format(n) for n in range(start + 1, end + 1)
+            if n not in self._state.own
+        ]
+        found = shared.get_many(entries)
+        if len(found) != len(entries):
+            return None
+        return found.values()
+
+    def _sync(self):
+        shared = self.shared
+        if shared is None:
+            return
+        now = time.time()
+        if now - self._state.checked_at < self._sync_interval:
+            return
+        position = self._log_position(shared)
+        if position == self._state.position:
+            self._state.checked_at = now
+            return
+        changed = self._changed_keys(shared, self._state.position, position)
+        with self._lock:
+            self._state.checked_at = now
+            self._state.position = position
+            self._state.own = {n for n in self._state.own if n > position}
+            if changed is None:
+                if self._store:
+                    self._stats['local_flushes'] += 1
+                self._store.clear()
+                return
+            for key in changed:
+                if self._store.pop(key, None) is not None:
+                    self._stats['invalidations'] += 1
+
+    def _log_changes(self, local_keys):
+        """ Записывает в журнал ключи, которые другие воркеры должны
+        убрать из своих L1: один incr и одна запись set_many на все """
+        shared = self.shared
+        if shared is None or not local_keys:
+            return
+        count = len(local_keys)
+        try:
+            end = shared.incr(LOG_KEY, count)
+        except ValueError:
+            self._start_log(shared)
+            end = shared.incr(LOG_KEY, count)
+        positions = range(end - count + 1, end + 1)
+        shared.set_many({
+            LOG_ENTRY_KEY.format(position): local_key
+            for position, local_key in zip(positions, local_keys)
+        }, LOG_ENTRY_TIMEOUT)
+        with self._lock:
+            if len(self._state.own) >= self._log_size:
+                # Воркер только пишет и не читает журнал
+                self._state.own = {
+                    n for n in self._state.own if n > end - self._log_size}
+            self._state.own.update(positions)
+            if self._state.position is None:
+                # До первой записи воркер еще ничего не читал из L2
+                self._state.position = positions[0] - 1
+
+    # API кэша
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_key(key, version=version)
+        self.validate_key(local_key)
+        shared = self.shared
+
+        if self._use_local:
+            self._sync()
+            value = self._local_get(local_key)
+            if value is not _missing:
+                self._count('local_hits')
+                metrics.count_cache(hit=True)
+                return value
+            self._count('local_misses')
+            if shared is None:
+                metrics.count_cache(hit=False)
+                return default
+
+        value = shared.get(key, _missing, version=version)
+        if value is _missing:
+            self._count('shared_misses')
+            metrics.count_cache(hit=False)
+            return default
+        self._count('shared_hits')
+        metrics.count_cache(hit=True)
+        if self._use_local:
+            self._local_set(local_key, value, DEFAULT_TIMEOUT)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_key(key, version=version)
+        self.validate_key(local_key)
+        shared = self.shared
+        if shared is not None:
+            shared.set(key, value, self._timeout(timeout), version=version)
+            self._log_changes([local_key])
+        if self._use_local:
+            self._local_set(local_key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        local_keys = {key: self.make_key(key, version=version) for key in data}
+        for local_key in local_keys.values():
+            self.validate_key(local_key)
+        failed = []
+        shared = self.shared
+        if shared is not None:
+            failed = shared.set_many(
+                data, self._timeout(timeout), version=version) or []
+            self._log_changes(list(local_keys.values()))
+        if self._use_local:
+            with self._lock:
+                for key, value in data.items():
+                    if key not in failed:
+                        self._put(local_keys[key], value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_key(key, version=version)
+        self.validate_key(local_key)
+        shared = self.shared
+        if shared is None:
+            return self._local_add(local_key, value, timeout)
+
+        added = shared.add(
+            key, value, self._timeout(timeout), version=version)
+        # Ключа не было в L2, значит и в L1 других воркеров его нет
+        if added and self._use_local:
+            self._local_set(local_key, value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_key(key, version=version)
+        shared = self.shared
+        if shared is None:
+            value = self._local_get(local_key)
+            if value is _missing:
+                return False
+            self._local_set(local_key, value, timeout)
+            return True
+        self._local_delete(local_key)
+        return shared.touch(key, self._timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        local_key = self.make_key(key, version=version)
+        self.validate_key(local_key)
+        self._local_delete(local_key)
+        shared = self.shared
+        if shared is not None:
+            shared.delete(key, version=version)
+            self._log_changes([local_key])
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self.make_key(key, version=version)
+        self.validate_key(local_key)
+        shared = self.shared
+        if shared is None:
+            with self._lock:
+                if local_key not in self._store or self._has_expired(
+                        local_key):
+                    raise ValueError("Key '%s' not found" % key)
+                pickled, expiry = self._store[local_key]
+                new_value = pickle.loads(pickled) + delta
+                self._store[local_key] = (
+                    pickle.dumps(new_value, self.pickle_protocol), expiry)
+                self._store.move_to_end(local_key)
+            return new_value
+
+        new_value = shared.incr(key, delta, version=version)
+        self._log_changes([local_key])
+        if self._use_local:
+            self._local_set(local_key, new_value, DEFAULT_TIMEOUT)
+        return new_value
+
+    def has_key(self, key, version=None):
+        return self.get(key, _missing, version=version) is not _missing
+
+    def clear(self):
+        with self._lock:
+            self._store.clear()
+        shared = self.shared
+        if shared is not None:
+            # Вместе с данными пропадает журнал: воркеры сбросят L1
+            shared.clear()
@@ -0,0 +1,219 @@
+"""
+Пул соединений с базой данных, общий для потоков процесса.
+
+Без пула каждый поток gunicorn держит свое соединение, а при
+CONN_MAX_AGE = 0 открывает новое на каждый запрос. Бэкенды
+yatube.backends.sqlite3 и yatube.backends.postgresql берут соединения из
+пула этого модуля: в конце запроса Django "закрывает" соединение, и оно
+возвращается в пул. Соединений не больше MAX_SIZE на процесс; если все
+заняты, поток ждет свободное до TIMEOUT секунд и получает
+OperationalError.
+
+    DATABASES = {'default': {
+        'ENGINE': 'yatube.backends.postgresql',
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MAX_SIZE': 10,      # соединений на процесс
+            'TIMEOUT': 5,        # ожидание свободного соединения, с
+            'MAX_AGE': 600,      # соединение старше закрывается, с
+            'CHECK_AFTER': 30,   # простой, после которого оно проверяется, с
+        },
+    }}
+
+Состояние пулов отдается на /metrics (yatube.metrics): занятые и открытые
+соединения, ожидания и отказы по таймауту.
+"""
+import os
+import time
+from functools import partial
+from threading import Condition, Lock
+
+from django.db import OperationalError
+
+from yatube import metrics
+
+
+DEFAULTS = {
+    'MAX_SIZE': 10,
+    'TIMEOUT': 5,
+    'MAX_AGE': 600,
+    'CHECK_AFTER': 30,
+}
+
+
+class PoolTimeout(OperationalError):
+    """ Свободное соединение не появилось за TIMEOUT секунд """
+
+
+class Slot:
+    """ Соединение драйвера и его возраст """
+
+    def __init__(self, pool, connection):
+        self.pool = pool
+        self.connection = connection
+        self.created = self.released = time.monotonic()
+
+
+def _check(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute('SELECT 1')
+    finally:
+        cursor.close()
+    # Проверка не должна оставлять открытую транзакцию
+    connection.rollback()
+
+
+def _close(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class Pool:
+    def __init__(self, alias, **options):
+        options = {**DEFAULTS, **options}
+        self.alias = alias
+        self.pid = os.getpid()
+        self.max_size = options['MAX_SIZE']
+        self.timeout = options['TIMEOUT']
+        self.max_age = options['MAX_AGE']
+        self.check_after = options['CHECK_AFTER']
+        self._condition = Condition()
+        # Свободные соединения, последнее возвращенное - в конце
+        self._idle = []
+        self.size = 0
+        self.in_use = 0
+
+    def _labels(self):
+        return (('alias', self.alias),)
+
+    def _report(self):
+        metrics.registry.set(
+            'yatube_db_pool_in_use', self._labels(), self.in_use)
+        metrics.registry.set('yatube_db_pool_open', self._labels(), self.size)
+
+    def _expired(self, slot, now):
+        return now - slot.created >= self.max_age
+
+    def acquire(self, connect):
+        """ Свободное соединение или новое от connect(), если пул не полон """
+        deadline = None
+        with self._condition:
+            while True:
+                if self._idle:
+                    slot = self._idle.pop()
+                    break
+                if self.size < self.max_size:
+                    slot = None
+                    self.size += 1
+                    break
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.timeout
+                    metrics.registry.inc(
+                        'yatube_db_pool_waits_total', self._labels())
+                if now >= deadline:
+                    metrics.registry.inc(
+                        'yatube_db_pool_timeouts_total', self._labels())
+                    raise PoolTimeout(
+                        f'Нет свободного соединения с базой {self.alias} '
+                        f'за {self.timeout} с')
+                self._condition.wait(deadline - now)
+            self.in_use += 1
+            self._report()
+
+        # Проверки и соединение с базой - без блокировки пула
+        try:
+            if slot is not None:
+                slot = self._revive(slot)
+            if slot is None:
+                slot = Slot(self, connect())
+        except BaseException:
+            self._forget()
+            raise
+        return slot
+
+    def _revive(self, slot):
+        """ Соединение годно к работе или закрывается (тогда None) """
+        now = time.monotonic()
+        if not self._expired(slot, now):
+            if now - slot.released < self.check_after:
+                return slot
+            try:
+                _check(slot.connection)
+                return slot
+            except Exception:
+                pass
+        _close(slot.connection)
+        return None
+
+    def _forget(self):
+        with self._condition:
+            self.size -= 1
+            self.in_use -= 1
+            self._report()
+            self._condition.notify()
+
+    def release(self, slot, discard=False):
+        """ Возвращает соединение в пул. discard - закрыть его насовсем """
+        if self.pid != os.getpid():
+            # Соединение родителя после fork: закрытие оборвало бы и его
+            return
+        if not discard and not self._expired(slot, time.monotonic()):
+            try:
+                # Незавершенная транзакция не переходит к следующему потоку
+                slot.connection.rollback()
+            except Exception:
+                discard = True
+        else:
+            discard = True
+        if discard:
+            _close(slot.connection)
+            self._forget()
+            return
+        slot.released = time.monotonic()
+        with self._condition:
+            self._idle.append(slot)
+            self.in_use -= 1
+            self._report()
+            self._condition.notify()
+
+
+_pools = {}
+_pools_lock = Lock()
+
+
+def get_pool(alias, params, options):
+    """ Пул соединений базы alias с параметрами драйвера params """
+    key = (alias, repr(sorted(params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        # После fork пулы родителя не используются
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[key] = Pool(alias, **options)
+        return pool
+
+
+class PooledDatabaseWrapperMixin:
+    """ Соединения бэкенда из пула, если у базы есть настройка POOL """
+
+    _pool_slot = None
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict.get('POOL')
+        if options is None:
+            return super().get_new_connection(conn_params)
+        pool = get_pool(self.alias, conn_params, options)
+        self._pool_slot = pool.acquire(
+            partial(super().get_new_connection, conn_params))
+        return self._pool_slot.connection
+
+    def _close(self):
+        slot = self._pool_slot
+        if slot is None or slot.connection is not self.connection:
+            return super()._close()
+        self._pool_slot = None
+        # Закрытое внутри atomic соединение остается у Django до отката
+        slot.pool.release(slot, discard=self.in_atomic_block)
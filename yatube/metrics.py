@@ -0,0 +1,289 @@
+"""
+Легкие метрики запросов для продакшена.
+
+MetricsMiddleware считает каждый запрос и его длительность по имени
+представления. Выборка запросов (METRICS['SAMPLE_RATE']) дополнительно
+записывает число и время SQL-запросов, время отрисовки шаблонов и
+попадания в кэш: эти данные уходят в заголовок Server-Timing ответа и
+в общие счетчики процесса. Счетчики отдаются на /metrics в текстовом
+формате Prometheus.
+
+    MIDDLEWARE = ['yatube.metrics.MetricsMiddleware', ...]
+    TEMPLATES = [{'BACKEND': 'yatube.metrics.TimedDjangoTemplates', ...}]
+    METRICS = {
+        'SAMPLE_RATE': 0.1,      # доля запросов с подробными замерами
+        'SERVER_TIMING': True,   # заголовок Server-Timing у выборки
+        'BUCKETS': (...),        # границы гистограммы длительности, с
+    }
+
+Попадания считает кэш yatube.cache.TwoTierCache, время шаблонов - бэкенд
+TimedDjangoTemplates. SQL внутри шаблонов входит и во время шаблонов.
+"""
+import random
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from threading import Lock, local
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.template.backends.django import DjangoTemplates, Template
+
+
+DEFAULTS = {
+    'SAMPLE_RATE': 0.1,
+    'SERVER_TIMING': True,
+    'BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Подробные замеры текущего запроса, если он попал в выборку
+_current = local()
+
+
+def get_option(name):
+    return getattr(settings, 'METRICS', {}).get(name, DEFAULTS[name])
+
+
+class Recorder:
+    """ Замеры одного запроса из выборки """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: время каждого SQL-запроса соединения
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+
+    def server_timing(self, total):
+        return ', '.join((
+            f'db;dur={self.db_seconds * 1000:.1f};'
+            f'desc="{self.queries} queries"',
+            f'tpl;dur={self.template_seconds * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hits, '
+            f'{self.cache_misses} misses"',
+            f'total;dur={total * 1000:.1f}',
+        ))
+
+
+def current_recorder():
+    return getattr(_current, 'recorder', None)
+
+
+def count_cache(hit):
+    """ Вызывается кэшем на каждое чтение """
+    recorder = current_recorder()
+    if recorder is None:
+        return
+    if hit:
+        recorder.cache_hits += 1
+    else:
+        recorder.cache_misses += 1
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        recorder = current_recorder()
+        if recorder is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            recorder.template_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """ Шаблоны Django, замеряющие время отрисовки у выборки запросов.
+    Вложенные include входят во время страницы, а не считаются отдельно """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class Registry:
+    """ Счетчики процесса, общие для всех потоков """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = defaultdict(float)
+            self._gauges = {}
+            self._histograms = {}
+
+    def inc(self, name, labels, value=1):
+        with self._lock:
+            self._counters[name, labels] += value
+
+    def set(self, name, labels, value):
+        with self._lock:
+            self._gauges[name, labels] = value
+
+    def observe(self, name, labels, value, buckets):
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                # Границы запоминаются: смена настроек не ломает счетчики
+                histogram = self._histograms[name, labels] = {
+                    'bounds': tuple(buckets),
+                    'buckets': [0] * len(buckets),
+                    'sum': 0.0,
+                    'count': 0,
+                }
+            for index, bound in enumerate(histogram['bounds']):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {**self._counters, **self._gauges}, {
+                key: {**value, 'buckets': value['buckets'][:]}
+                for key, value in self._histograms.items()
+            }
+
+
+registry = Registry()
+
+# Имя -> (тип, описание)
+METRICS = {
+    'yatube_requests_total': ('counter', 'Запросы по представлениям'),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Длительность запросов'),
+    'yatube_sampled_requests_total': (
+        'counter', 'Запросы с подробными замерами'),
+    'yatube_db_queries_total': ('counter', 'SQL-запросы выборки'),
+    'yatube_db_seconds_total': ('counter', 'Время SQL-запросов выборки'),
+    'yatube_template_seconds_total': (
+        'counter', 'Время отрисовки шаблонов выборки'),
+    'yatube_cache_hits_total': ('counter', 'Попадания в кэш у выборки'),
+    'yatube_cache_misses_total': ('counter', 'Промахи кэша у выборки'),
+    'yatube_db_pool_in_use': ('gauge', 'Занятые соединения пула'),
+    'yatube_db_pool_open': ('gauge', 'Открытые соединения пула'),
+    'yatube_db_pool_waits_total': (
+        'counter', 'Ожидания свободного соединения пула'),
+    'yatube_db_pool_timeouts_total': (
+        'counter', 'Отказы пула по таймауту ожидания'),
+}
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name
+
+
+def record(request, response, total, recorder):
+    view = (('view', _view_name(request)),)
+    registry.inc('yatube_requests_total', view + (
+        ('method', request.method), ('status', str(response.status_code))))
+    registry.observe(
+        'yatube_request_duration_seconds', view, total,
+        get_option('BUCKETS'))
+    if recorder is None:
+        return
+    registry.inc('yatube_sampled_requests_total', view)
+    registry.inc('yatube_db_queries_total', view, recorder.queries)
+    registry.inc('yatube_db_seconds_total', view, recorder.db_seconds)
+    registry.inc(
+        'yatube_template_seconds_total', view, recorder.template_seconds)
+    registry.inc('yatube_cache_hits_total', view, recorder.cache_hits)
+    registry.inc('yatube_cache_misses_total', view, recorder.cache_misses)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= get_option('SAMPLE_RATE'):
+            started = time.perf_counter()
+            response = self.get_response(request)
+            record(request, response, time.perf_counter() - started, None)
+            return response
+
+        recorder = _current.recorder = Recorder()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            _current.recorder = None
+        total = time.perf_counter() - started
+
+        record(request, response, total, recorder)
+        if get_option('SERVER_TIMING'):
+            response['Server-Timing'] = recorder.server_timing(total)
+        return response
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, value.replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics():
+    """ Счетчики процесса в текстовом формате Prometheus """
+    counters, histograms = registry.snapshot()
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind != 'histogram':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+            continue
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(
+                    histogram['bounds'], histogram['buckets']):
+                lines.append(f'{name}_bucket'
+                             f'{_labels(labels + (("le", str(bound)),))} '
+                             f'{count}')
+            lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} '
+                         f'{histogram["count"]}')
+            lines.append(
+                f'{name}_sum{_labels(labels)} {_number(histogram["sum"])}')
+            lines.append(
+                f'{name}_count{_labels(labels)} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """ Доступно сборщику метрик с INTERNAL_IPS и администраторам """
+    internal = request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS
+    if not internal and not request.user.is_staff:
+        raise Http404
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
@@ -0,0 +1,96 @@
+"""
+Плагин pytest: ищет N+1 и медленные запросы в каждом HTTP-запросе теста.
+
+Подключается в tests/conftest.py и по умолчанию выключен:
+
+    pytest --querycheck=warn    # предупреждения в сводке
+    pytest --querycheck=fail    # тест с проблемными запросами падает
+
+Запросы самого теста (создание данных в цикле и т.п.) не проверяются,
+только выполненные между request_started и request_finished.
+"""
+import warnings
+
+import pytest
+from django.core.signals import request_finished, request_started
+
+from yatube import querycheck
+
+
+class QueryCheckWarning(UserWarning):
+    pass
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('querycheck', 'поиск N+1 и медленных запросов')
+    group.addoption(
+        '--querycheck',
+        choices=('off', 'warn', 'fail'),
+        default=None,
+        help='Проверять запросы страниц: off, warn или fail')
+    group.addoption(
+        '--querycheck-threshold',
+        type=int,
+        default=None,
+        help='Сколько одинаковых запросов считать N+1')
+    group.addoption(
+        '--querycheck-slow-ms',
+        type=float,
+        default=None,
+        help='Порог медленного запроса, мс')
+    parser.addini(
+        'querycheck', 'Режим проверки запросов по умолчанию', default='off')
+
+
+class RequestWindows:
+    """ Включает Inspector только на время HTTP-запросов теста """
+
+    def __init__(self, inspector):
+        self.inspector = inspector
+        self.inspector.active = False
+        self.path = None
+        self.reports = []
+
+    def started(self, sender, environ=None, **kwargs):
+        self.path = (environ or {}).get('PATH_INFO', '?')
+        self.inspector.reset()
+        self.inspector.active = True
+
+    def finished(self, sender, **kwargs):
+        if not self.inspector.active:
+            return
+        self.inspector.active = False
+        problems = self.inspector.problems()
+        if problems:
+            self.reports.append(
+                querycheck.format_problems(problems, self.path))
+
+
+@pytest.fixture(autouse=True)
+def _querycheck(request):
+    config = request.config
+    mode = config.getoption('querycheck') or config.getini('querycheck')
+    if mode == 'off':
+        yield
+        return
+
+    options = {
+        'n_plus_one': config.getoption('querycheck_threshold'),
+        'slow_ms': config.getoption('querycheck_slow_ms'),
+    }
+    with querycheck.inspect_queries(**options) as inspector:
+        windows = RequestWindows(inspector)
+        request_started.connect(windows.started, weak=False)
+        request_finished.connect(windows.finished, weak=False)
+        try:
+            yield
+        finally:
+            request_started.disconnect(windows.started)
+            request_finished.disconnect(windows.finished)
+
+    if not windows.reports:
+        return
+    report = '\n'.join(windows.reports)
+    if mode == 'fail':
+        pytest.fail(report, pytrace=False)
+    warnings.warn(QueryCheckWarning(report))
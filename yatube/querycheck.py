@@ -0,0 +1,189 @@
+"""
+Поиск N+1 и медленных SQL-запросов.
+
+Запросы одного окна (обычно одного HTTP-запроса) группируются по форме:
+SQL без значений параметров, с развернутыми IN-списками. Форма, которая
+повторилась не меньше N_PLUS_ONE_THRESHOLD раз, - признак N+1, запрос
+дольше SLOW_QUERY_MS - медленный. Для обоих запоминается место в коде
+проекта и шаблон, откуда запрос пришел.
+
+    QUERYCHECK = {
+        'ENABLED': DEBUG,            # включает QueryCheckMiddleware
+        'N_PLUS_ONE_THRESHOLD': 5,
+        'SLOW_QUERY_MS': 100,
+        'RAISE': False,              # True - ошибка вместо записи в лог
+    }
+
+В тестах то же самое делает плагин pytest yatube.pytest_querycheck,
+а в тестах Django - контекстный менеджер inspect_queries().
+"""
+import logging
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Node
+
+
+DEFAULTS = {
+    'ENABLED': False,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'SLOW_QUERY_MS': 100,
+    'RAISE': False,
+}
+
+logger = logging.getLogger(__name__)
+
+Problem = namedtuple('Problem', 'kind sql count duration origin')
+
+_IN_LIST = re.compile(r'\bIN \((?:%s, )*%s\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w"])\d+(?:\.\d+)?\b')
+_SPACES = re.compile(r'\s+')
+
+
+class QueryProblemsError(Exception):
+    """ Найдены N+1 или медленные запросы, а QUERYCHECK['RAISE'] включен """
+
+
+def get_option(name):
+    return getattr(settings, 'QUERYCHECK', {}).get(name, DEFAULTS[name])
+
+
+def normalize(sql):
+    """ Форма запроса: без значений, IN-списки любой длины одинаковы """
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+# Служебные модули проекта не бывают источником запроса
+_SERVICE_FILES = {
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ('cache.py', 'metrics.py', 'querycheck.py')
+}
+
+
+def _project_file(filename):
+    filename = os.path.abspath(filename)
+    return (
+        filename.startswith(settings.BASE_DIR + os.sep)
+        and 'site-packages' not in filename
+        and filename not in _SERVICE_FILES
+    )
+
+
+def origin():
+    """ Ближайшие к запросу строка кода проекта и строка шаблона """
+    code = template = None
+    frame = sys._getframe(1)
+    while frame is not None and (code is None or template is None):
+        node = frame.f_locals.get('self')
+        # type(), а не isinstance: isinstance у ленивых объектов вроде
+        # request.user вычисляет их и выполняет новые запросы
+        if template is None and issubclass(type(node), Node) \
+                and getattr(node, 'origin', None) is not None:
+            token = getattr(node, 'token', None)
+            line = token.lineno if token is not None else '?'
+            name = node.origin.template_name or node.origin.name
+            template = f'{name}:{line}'
+        if code is None and _project_file(frame.f_code.co_filename):
+            path = os.path.relpath(frame.f_code.co_filename, settings.BASE_DIR)
+            code = f'{path}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return ', '.join(place for place in (code, template) if place)
+
+
+class Inspector:
+    """ execute_wrapper, собирающий запросы окна по формам """
+
+    def __init__(self, n_plus_one=None, slow_ms=None):
+        self.n_plus_one = n_plus_one or get_option('N_PLUS_ONE_THRESHOLD')
+        self.slow_ms = slow_ms if slow_ms is not None \
+            else get_option('SLOW_QUERY_MS')
+        self.active = True
+        self.reset()
+
+    def reset(self):
+        # Форма -> [число, суммарное время, место первого запроса]
+        self.shapes = {}
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not self.active:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            shape = normalize(sql)
+            seen = self.shapes.get(shape)
+            if seen is None:
+                self.shapes[shape] = [1, duration, origin()]
+            else:
+                seen[0] += 1
+                seen[1] += duration
+            if duration * 1000 > self.slow_ms:
+                self.slow.append(Problem(
+                    'slow', sql, 1, duration, origin()))
+
+    def problems(self):
+        repeated = [
+            Problem('n+1', shape, count, duration, place)
+            for shape, (count, duration, place) in self.shapes.items()
+            if count >= self.n_plus_one
+        ]
+        return sorted(repeated, key=lambda problem: -problem.count) \
+            + self.slow
+
+
+def format_problems(problems, title=''):
+    lines = [title] if title else []
+    for problem in problems:
+        if problem.kind == 'n+1':
+            summary = f'N+1: {problem.count} одинаковых запросов'
+        else:
+            summary = 'Медленный запрос'
+        lines.append(
+            f'{summary}, {problem.duration * 1000:.1f} мс'
+            f' ({problem.origin or "место неизвестно"}):\n    {problem.sql}')
+    return '\n'.join(lines)
+
+
+@contextmanager
+def inspect_queries(**options):
+    """ Собирает запросы всех соединений текущего потока внутри блока """
+    inspector = Inspector(**options)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(inspector))
+        yield inspector
+
+
+class QueryCheckMiddleware:
+    """ Проверяет запросы каждого HTTP-запроса, если QUERYCHECK['ENABLED'] """
+
+    def __init__(self, get_response):
+        if not get_option('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with inspect_queries() as inspector:
+            response = self.get_response(request)
+        problems = inspector.problems()
+        if problems:
+            report = format_problems(
+                problems, f'{request.method} {request.get_full_path()}')
+            if get_option('RAISE'):
+                raise QueryProblemsError(report)
+            logger.warning(report)
+        return response
@@ -0,0 +1,119 @@
+"""
+Чтение с реплик базы данных.
+
+Представления, отмеченные @use_replica, читают со случайной реплики из
+settings.DATABASE_REPLICAS, все остальное идет в основную базу 'default'.
+Чтобы пользователь сразу видел свои записи, после записи данных он на
+REPLICA_PIN_SECONDS закрепляется за основной базой: до конца запроса -
+через флаг потока, в следующих запросах - через cookie. Служебные записи
+(сессии, создание строки счетчиков при первом чтении) не закрепляют.
+
+    DATABASE_ROUTERS = ['yatube.replicas.ReplicaRouter']
+    MIDDLEWARE = [..., 'yatube.replicas.ReplicaMiddleware', ...]
+    DATABASE_REPLICAS = ['replica']
+    REPLICA_PIN_SECONDS = 5
+
+Без реплик в настройках роутер ничего не меняет.
+"""
+import random
+import time
+from functools import wraps
+from threading import local
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+PIN_COOKIE = 'primary_until'
+
+# Модели, запись которых не означает изменения показываемых данных
+UNPINNED_MODELS = {'sessions.Session', 'posts.UserStats'}
+
+_state = local()
+
+
+def _replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+def reset():
+    _state.allowed = False
+    _state.pinned = False
+    _state.wrote = False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = _replicas()
+        if not replicas or not getattr(_state, 'allowed', False):
+            return DEFAULT_DB_ALIAS
+        if getattr(_state, 'pinned', False) or getattr(_state, 'wrote', False):
+            return DEFAULT_DB_ALIAS
+        # Внутри транзакции читаем то, что в ней же записали
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Роутер спрашивают и о get_or_create, который может ничего
+        # не записать: сессии и счетчики так делают почти в каждом запросе
+        if model._meta.label not in UNPINNED_MODELS:
+            _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии основной базы, связи между ними допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схему реплик обновляет репликация, а не migrate
+        return db not in _replicas()
+
+
+def use_replica(view):
+    """ Представление только читает и может читать с реплики """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        _state.allowed = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.allowed = False
+
+    return wrapper
+
+
+def recently_written(timestamp):
+    """ Данные, измененные в timestamp, могли еще не дойти до реплик """
+    return bool(_replicas()) and time.time() - timestamp < pin_seconds()
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset()
+        try:
+            pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        _state.pinned = pinned_until > time.time()
+
+        try:
+            response = self.get_response(request)
+            if _state.wrote and _replicas():
+                response.set_cookie(
+                    PIN_COOKIE,
+                    str(time.time() + pin_seconds()),
+                    max_age=pin_seconds(),
+                    httponly=True,
+                    samesite='Lax')
+            return response
+        finally:
+            reset()
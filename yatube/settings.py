@@ -1,4 +1,6 @@
 import os
+
+import dj_database_url
 import django_heroku
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -30,11 +32,15 @@ INSTALLED_APPS = [
     'posts',
     'users',
     'about',
+    'api',
+    'tasks',
     'sorl.thumbnail',
-    'debug_toolbar'
 ]
 
 MIDDLEWARE = [
+    'yatube.metrics.MetricsMiddleware',
+    'yatube.querycheck.QueryCheckMiddleware',
+    'yatube.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -42,9 +48,14 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware'
 ]
 
+# Панель отладки нужна только при разработке: в продакшене вместо нее
+# работают метрики yatube.metrics
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
@@ -54,7 +65,8 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'yatube.metrics.TimedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -81,6 +93,53 @@ DATABASES = {
     }
 }
 
+if 'DATABASE_URL' in os.environ:
+    # Как в django_heroku, но дальше к базе добавляются настройки пула
+    DATABASES['default'] = dj_database_url.config(ssl_require=True)
+
+# Реплики только для чтения через запятую, например
+# DATABASE_REPLICA_URLS=sqlite:////path/to/replica.sqlite3 для проверки
+# на копии локальной базы. Ленты, профили и посты читаются с них
+# (yatube.replicas), после записи пользователь REPLICA_PIN_SECONDS
+# читает из основной базы
+DATABASE_REPLICAS = []
+for index, url in enumerate(filter(
+        None, os.environ.get('DATABASE_REPLICA_URLS', '').split(','))):
+    alias = f'replica{index}'
+    DATABASES[alias] = dj_database_url.parse(url.strip())
+    # В тестах реплика - та же тестовая база
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['yatube.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = 5
+
+# Пул соединений на процесс, общий для потоков (yatube.dbpool): в конце
+# запроса соединение возвращается в пул, а не закрывается. MAX_SIZE - не
+# больше соединений на процесс, TIMEOUT - ожидание свободного, MAX_AGE -
+# время жизни соединения, CHECK_AFTER - простой, после которого
+# соединение проверяется перед выдачей, с. DATABASE_POOL_SIZE=0
+# отключает пул: тогда поток держит свое соединение DATABASE_CONN_MAX_AGE
+DATABASE_POOL = {
+    'MAX_SIZE': int(os.environ.get('DATABASE_POOL_SIZE', 10)),
+    'TIMEOUT': 5,
+    'MAX_AGE': 600,
+    'CHECK_AFTER': 30,
+}
+POOLED_ENGINES = {
+    'django.db.backends.sqlite3': 'yatube.backends.sqlite3',
+    'django.db.backends.postgresql': 'yatube.backends.postgresql',
+    'django.db.backends.postgresql_psycopg2': 'yatube.backends.postgresql',
+}
+for database in DATABASES.values():
+    if DATABASE_POOL['MAX_SIZE'] and database['ENGINE'] in POOLED_ENGINES:
+        database['ENGINE'] = POOLED_ENGINES[database['ENGINE']]
+        database['POOL'] = DATABASE_POOL
+        database['CONN_MAX_AGE'] = 0
+    else:
+        database['CONN_MAX_AGE'] = int(
+            os.environ.get('DATABASE_CONN_MAX_AGE', 600))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -138,12 +197,118 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 # Количество постов для страницы в паджинаторе
 POSTS_PER_PAGE = 10
+# Количество комментариев, подгружаемых на странице поста за раз
+COMMENTS_PER_PAGE = 20
+# Сколько первых страниц доступно по номеру, дальше - переход по курсору
+PAGINATOR_PAGE_LIMIT = 5
+# Наибольший размер страницы JSON API (?limit=)
+API_MAX_LIMIT = 100
+
+# Посты авторов с большим числом подписчиков не раскладываются по лентам
+TIMELINE_FANOUT_LIMIT = 1000
+
+# Миниатюры картинок постов: имя -> (геометрия, опции sorl-thumbnail).
+# Создаются фоновой задачей после сохранения поста
+THUMBNAIL_SIZES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Процессов у команды warm_thumbnails
+THUMBNAIL_WORKERS = 2
+# warm_thumbnails --cleanup не трогает файлы моложе этого числа секунд:
+# картинка может принадлежать посту, транзакция которого еще идет
+THUMBNAIL_CLEANUP_GRACE = 60 * 60
+# Варианты каждой миниатюры для srcset: ширины и форматы по убыванию
+# предпочтения, последний формат - запасной для старых браузеров
+THUMBNAIL_VARIANTS = {
+    'widths': (480, 960, 1440),
+    'formats': ('WEBP', 'JPEG'),
+    'sizes': '(max-width: 1000px) 100vw, 960px',
+}
+
+# Время жизни кэша лент; записи сбрасывают его через поколения ключей
+FEED_CACHE_TIMEOUT = 60 * 5
+# Время жизни страниц для анонимов; изменения сбрасывают их раньше
+# по суррогатным ключам (posts.pagecache)
+PAGE_CACHE_TIMEOUT = 60 * 10
+
+# Общий для воркеров уровень кэша: Redis (пакет django-redis) по
+# REDIS_URL или Memcached (python-memcached) по MEMCACHED_SERVERS через
+# запятую. Файловый кэш - только для разработки: его incr не атомарен.
+# Он лежит в каталоге проекта, а тесты берут себе временный
+# (tasks.testing)
+if os.environ.get('REDIS_URL'):
+    SHARED_CACHE = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+elif os.environ.get('MEMCACHED_SERVERS'):
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': os.environ['MEMCACHED_SERVERS'].split(','),
+    }
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    }
 
+# Двухуровневый кэш: LRU в памяти воркера перед общим хранилищем.
+# SHARED - алиас общего уровня (None - только память процесса),
+# LOCAL - включен ли уровень в памяти процесса
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'yatube.cache.TwoTierCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL': True,
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 5,
+            'SYNC_INTERVAL': 1,
+            'LOG_SIZE': 1000,
+        },
+    },
+    'shared': {
+        **SHARED_CACHE,
+        'TIMEOUT': 60 * 60,
+    },
+}
+
+# Метрики запросов: доля запросов с замерами SQL, шаблонов и кэша,
+# заголовок Server-Timing у них и границы гистограммы длительности, с.
+# Счетчики отдаются на /metrics/ для INTERNAL_IPS и администраторов
+METRICS = {
+    'SAMPLE_RATE': 0.1,
+    'SERVER_TIMING': True,
+    'BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
 }
 
+# Поиск N+1 и медленных запросов в каждом запросе (yatube.querycheck):
+# включен при разработке, RAISE превращает находки в ошибку.
+# В тестах то же самое включает pytest --querycheck=warn|fail
+QUERYCHECK = {
+    'ENABLED': DEBUG,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'SLOW_QUERY_MS': 100,
+    'RAISE': False,
+}
+
+# Очередь фоновых задач в базе (tasks.queue), воркер - manage.py run_tasks.
+# Задача повторяется до MAX_ATTEMPTS раз с паузой BACKOFF * 2 ** (n - 1),
+# но не больше MAX_BACKOFF, с. LEASE - на сколько воркер занимает задачу:
+# задачу упавшего воркера возьмет другой. POLL_INTERVAL - пауза, когда
+# задач нет. При EAGER задачи выполняются сразу при постановке: так при
+# TASKS_EAGER=1, если воркер не запущен, и в тестах (tasks.testing)
+TASKS = {
+    'EAGER': os.environ.get('TASKS_EAGER') == '1',
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF': 10,
+    'MAX_BACKOFF': 60 * 60,
+    'LEASE': 60 * 5,
+    'POLL_INTERVAL': 1,
+}
+
+# Тесты выполняют фоновые задачи сразу, без воркера
+TEST_RUNNER = 'tasks.testing.TestRunner'
+
 # HEROKU DB DEPLOY
-django_heroku.settings(locals())
+django_heroku.settings(locals(), databases=False)
@@ -0,0 +1,423 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse
+from django.template import engines
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings)
+from django.urls import reverse
+
+from posts.models import Post, UserStats
+from yatube import dbpool, metrics, querycheck, replicas
+from yatube.backends.sqlite3.base import DatabaseWrapper
+from yatube.cache import TwoTierCache
+
+
+User = get_user_model()
+
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'test-shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-shared',
+    },
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TwoTierCacheTest(SimpleTestCase):
+    def make_cache(self, name, **options):
+        options.setdefault('SHARED', 'test-shared')
+        options.setdefault('SYNC_INTERVAL', 0)
+        cache = TwoTierCache(name, {'OPTIONS': options})
+        self.addCleanup(cache.clear)
+        return cache
+
+    def test_local_tier_is_bounded_lru(self):
+        """ Из L1 вытесняются давно не читанные ключи, L2 их хранит """
+        cache = self.make_cache('lru', LOCAL_MAX_ENTRIES=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), 2)
+        stats = cache.stats()
+        self.assertEqual(stats['local_hits'], 2)
+        self.assertEqual(stats['shared_hits'], 1)
+        self.assertEqual(stats['local_evictions'], 2)
+
+    def test_writes_invalidate_other_workers(self):
+        """ Запись одного воркера убирает ключ из L1 другого воркера """
+        first = self.make_cache('worker-1')
+        second = self.make_cache('worker-2')
+
+        first.set('key', 'old')
+        self.assertEqual(second.get('key'), 'old')
+        self.assertEqual(second.get('key'), 'old')
+
+        first.set('key', 'new')
+        self.assertEqual(second.get('key'), 'new')
+        first.delete('key')
+        self.assertIsNone(second.get('key'))
+
+    def test_writes_keep_other_local_keys(self):
+        """ Запись ключа не сбрасывает остальные ключи в L1 """
+        first = self.make_cache('keep-1')
+        second = self.make_cache('keep-2', LOG_SIZE=2)
+        first.set('kept', 1)
+        second.get('kept')
+
+        first.set('other', 2)
+        first.incr('other')
+        self.assertEqual(second.get('kept'), 1)
+        self.assertEqual(second.stats()['local_hits'], 1)
+
+        # Отставший от журнала воркер сбрасывает L1 целиком
+        for value in range(3):
+            first.set('other', value)
+        self.assertEqual(second.get('kept'), 1)
+        self.assertEqual(second.stats()['local_flushes'], 1)
+        self.assertEqual(second.stats()['shared_hits'], 2)
+
+    def test_set_many_invalidates_other_workers(self):
+        first = self.make_cache('many-1')
+        second = self.make_cache('many-2')
+        first.set_many({'a': 1, 'b': 1, 'kept': 1})
+        self.assertEqual(second.get_many(['a', 'b', 'kept']),
+                         {'a': 1, 'b': 1, 'kept': 1})
+
+        first.set_many({'a': 2, 'b': 2})
+        self.assertEqual(second.get_many(['a', 'b', 'kept']),
+                         {'a': 2, 'b': 2, 'kept': 1})
+        self.assertEqual(second.stats()['invalidations'], 2)
+
+    def test_incr_is_shared(self):
+        first = self.make_cache('incr-1')
+        second = self.make_cache('incr-2')
+
+        first.set('counter', 1)
+        second.incr('counter')
+        self.assertEqual(first.get('counter'), 2)
+
+    def test_local_only_mode(self):
+        """ Без общего уровня кэш работает как локальный LRU """
+        cache = self.make_cache('local', SHARED=None)
+        self.assertTrue(cache.add('key', 1))
+        self.assertFalse(cache.add('key', 2))
+        self.assertEqual(cache.incr('key'), 2)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+    def test_shared_only_mode(self):
+        cache = self.make_cache('shared-only', LOCAL=False)
+        cache.set('key', 1)
+        self.assertEqual(cache.get('key'), 1)
+        self.assertNotIn('local_hits', cache.stats())
+        self.assertEqual(cache.stats()['shared_hits'], 1)
+
+
+SAMPLE_ALL = {'SAMPLE_RATE': 1, 'SERVER_TIMING': True, 'BUCKETS': (0.1, 1)}
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        author = User.objects.create(username='Author')
+        Post.objects.create(text='Пост', author=author)
+
+    @override_settings(METRICS=SAMPLE_ALL)
+    def test_sampled_request_gets_server_timing(self):
+        """ Запрос из выборки отдает замеры SQL, шаблонов и кэша """
+        response = self.client.get(reverse('posts:index'))
+
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertRegex(timing, r'tpl;dur=[\d.]+')
+        self.assertRegex(timing, r'cache;desc="\d+ hits, [1-9]\d* misses"')
+
+        text = metrics.render_metrics()
+        self.assertIn(
+            'yatube_requests_total{view="posts:index",method="GET",'
+            'status="200"} 1', text)
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 1',
+            text)
+        self.assertIn(
+            'yatube_sampled_requests_total{view="posts:index"} 1', text)
+        self.assertRegex(
+            text, r'yatube_db_queries_total\{view="posts:index"\} [1-9]')
+
+    @override_settings(METRICS={**SAMPLE_ALL, 'SAMPLE_RATE': 0})
+    def test_unsampled_request_is_only_counted(self):
+        response = self.client.get(reverse('posts:index'))
+
+        self.assertFalse(response.has_header('Server-Timing'))
+        text = metrics.render_metrics()
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 1', text)
+        self.assertNotIn('yatube_sampled_requests_total{', text)
+
+    @override_settings(INTERNAL_IPS=[])
+    def test_endpoint_is_hidden_from_public(self):
+        """ Метрики видны только с INTERNAL_IPS и администраторам """
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        admin = User.objects.create(username='Admin', is_staff=True)
+        self.client.force_login(admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(
+            '# TYPE yatube_requests_total counter', response.content.decode())
+
+
+class QueryCheckTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='Author')
+        for i in range(5):
+            Post.objects.create(text=f'{i} пост', author=author)
+
+    def test_normalize_drops_values(self):
+        self.assertEqual(
+            querycheck.normalize(
+                'SELECT "t1"."id" FROM "t1" WHERE "t1"."id" IN (%s, %s)\n'
+                "  AND name = 'x' LIMIT 21"),
+            querycheck.normalize(
+                'SELECT "t1"."id" FROM "t1" WHERE "t1"."id" IN (%s)'
+                " AND name = 'y' LIMIT 3"))
+
+    def test_repeated_queries_are_reported_with_origin(self):
+        """ Запрос на каждый пост в шаблоне - N+1 с местом в шаблоне """
+        template = engines['django'].from_string(
+            '{% for post in posts %}{{ post.author.username }}{% endfor %}')
+        with querycheck.inspect_queries() as inspector:
+            template.render({'posts': Post.objects.all()})
+
+        problem, = inspector.problems()
+        self.assertEqual(problem.kind, 'n+1')
+        self.assertEqual(problem.count, 5)
+        self.assertIn('test_repeated_queries_are_reported', problem.origin)
+        self.assertIn('<unknown source>:1', problem.origin)
+
+        with querycheck.inspect_queries() as inspector:
+            template.render({
+                'posts': Post.objects.select_related('author')})
+        self.assertEqual(inspector.problems(), [])
+
+    def test_slow_queries_are_reported(self):
+        with querycheck.inspect_queries(slow_ms=0) as inspector:
+            Post.objects.count()
+        problem, = inspector.problems()
+        self.assertEqual(problem.kind, 'slow')
+
+    @override_settings(QUERYCHECK={'ENABLED': True, 'RAISE': True})
+    def test_middleware_raises_when_configured(self):
+        def view(request):
+            for post in Post.objects.all():
+                post.author.username
+            return HttpResponse()
+
+        middleware = querycheck.QueryCheckMiddleware(view)
+        with self.assertRaisesRegex(querycheck.QueryProblemsError, r'N\+1'):
+            middleware(RequestFactory().get('/'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_PIN_SECONDS=5)
+class ReplicaTest(SimpleTestCase):
+    """ Решения роутера без запросов к реплике """
+
+    def setUp(self):
+        self.router = replicas.ReplicaRouter()
+        self.factory = RequestFactory()
+        # Транзакции, оставленные другими тестами, не должны влиять на выбор
+        patcher = mock.patch.object(
+            connections[DEFAULT_DB_ALIAS], 'in_atomic_block', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def serve(self, write=None, cookies=None):
+        """ Запрос через ReplicaMiddleware к читающему представлению,
+        которое пишет в модель write. Возвращает ответ и базу,
+        выбранную для чтения """
+        chosen = []
+
+        @replicas.use_replica
+        def view(request):
+            if write is not None:
+                self.router.db_for_write(write)
+            chosen.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        request = self.factory.get('/')
+        request.COOKIES.update(cookies or {})
+        response = replicas.ReplicaMiddleware(view)(request)
+        return response, chosen[0]
+
+    def test_only_marked_views_read_from_replica(self):
+        self.assertEqual(self.router.db_for_read(Post), DEFAULT_DB_ALIAS)
+        response, db = self.serve()
+        self.assertEqual(db, 'replica')
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_nothing_changes(self):
+        _, db = self.serve()
+        self.assertEqual(db, DEFAULT_DB_ALIAS)
+
+    def test_write_pins_to_primary(self):
+        """ После записи чтение из основной базы до конца запроса и
+        в следующих запросах по cookie """
+        response, db = self.serve(write=Post)
+        self.assertEqual(db, DEFAULT_DB_ALIAS)
+        cookie = response.cookies[replicas.PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+
+        _, db = self.serve(cookies={replicas.PIN_COOKIE: cookie.value})
+        self.assertEqual(db, DEFAULT_DB_ALIAS)
+
+        expired = str(time.time() - 1)
+        _, db = self.serve(cookies={replicas.PIN_COOKIE: expired})
+        self.assertEqual(db, 'replica')
+
+        _, db = self.serve(cookies={replicas.PIN_COOKIE: 'мусор'})
+        self.assertEqual(db, 'replica')
+
+    def test_bookkeeping_writes_do_not_pin(self):
+        """ Сессии и строки счетчиков пишутся почти в каждом запросе """
+        for model in (Session, UserStats):
+            response, db = self.serve(write=model)
+            self.assertEqual(db, 'replica')
+            self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    def test_transactions_read_from_primary(self):
+        with mock.patch.object(
+                connections[DEFAULT_DB_ALIAS], 'in_atomic_block', True):
+            _, db = self.serve()
+        self.assertEqual(db, DEFAULT_DB_ALIAS)
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'posts'))
+
+    def test_recently_written(self):
+        self.assertTrue(replicas.recently_written(time.time() - 1))
+        self.assertFalse(replicas.recently_written(time.time() - 10))
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.assertFalse(replicas.recently_written(time.time()))
+
+
+class PoolTest(SimpleTestCase):
+    # test_backend_returns_connections_to_pool открывает соединения
+    # DatabaseWrapper: без этого pytest-django запрещает доступ к базе
+    databases = {DEFAULT_DB_ALIAS}
+
+    def make_pool(self, **options):
+        options.setdefault('MAX_SIZE', 2)
+        options.setdefault('TIMEOUT', 0.05)
+        pool = dbpool.Pool('test', **options)
+        self.addCleanup(lambda: [
+            slot.connection.close() for slot in pool._idle])
+        return pool
+
+    def connect(self):
+        return sqlite3.connect(':memory:', check_same_thread=False)
+
+    def counter(self, name):
+        counters, _ = metrics.registry.snapshot()
+        return counters.get((name, (('alias', 'test'),)), 0)
+
+    def test_connections_are_reused_and_bounded(self):
+        pool = self.make_pool()
+        first = pool.acquire(self.connect)
+        second = pool.acquire(self.connect)
+        pool.release(first)
+        self.assertIs(pool.acquire(self.connect), first)
+
+        timeouts = self.counter('yatube_db_pool_timeouts_total')
+        with self.assertRaises(dbpool.PoolTimeout):
+            pool.acquire(self.connect)
+        self.assertEqual(
+            self.counter('yatube_db_pool_timeouts_total'), timeouts + 1)
+        self.assertEqual((pool.size, pool.in_use), (2, 2))
+        self.assertIn(
+            'yatube_db_pool_in_use{alias="test"} 2', metrics.render_metrics())
+        pool.release(first)
+        pool.release(second)
+        self.assertEqual((pool.size, pool.in_use), (2, 0))
+
+    def test_waiting_thread_gets_released_connection(self):
+        pool = self.make_pool(MAX_SIZE=1, TIMEOUT=5)
+        slot = pool.acquire(self.connect)
+        waits = self.counter('yatube_db_pool_waits_total')
+        received = []
+        waiter = threading.Thread(
+            target=lambda: received.append(pool.acquire(self.connect)))
+        waiter.start()
+        while self.counter('yatube_db_pool_waits_total') == waits:
+            time.sleep(0.001)
+        pool.release(slot)
+        waiter.join()
+        self.assertEqual(received, [slot])
+        pool.release(slot)
+
+    def test_broken_idle_connection_is_replaced(self):
+        pool = self.make_pool(CHECK_AFTER=0)
+        slot = pool.acquire(self.connect)
+        pool.release(slot)
+        slot.connection.close()
+
+        fresh = pool.acquire(self.connect)
+        self.assertIsNot(fresh, slot)
+        fresh.connection.execute('SELECT 1')
+        self.assertEqual(pool.size, 1)
+        pool.release(fresh)
+
+    def test_old_connections_are_closed(self):
+        pool = self.make_pool(MAX_AGE=0)
+        slot = pool.acquire(self.connect)
+        pool.release(slot)
+        self.assertEqual((pool.size, pool._idle), (0, []))
+        with self.assertRaises(sqlite3.ProgrammingError):
+            slot.connection.execute('SELECT 1')
+
+    def test_backend_returns_connections_to_pool(self):
+        """ Закрытое Django соединение достается следующему потоку """
+        descriptor, name = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(descriptor)
+        self.addCleanup(os.remove, name)
+        settings_dict = {
+            **connections[DEFAULT_DB_ALIAS].settings_dict,
+            'NAME': name,
+            'POOL': {'MAX_SIZE': 1, 'TIMEOUT': 0.05},
+        }
+
+        first = DatabaseWrapper(settings_dict, 'pool-test')
+        first.ensure_connection()
+        connection = first.connection
+        first.close()
+        second = DatabaseWrapper(settings_dict, 'pool-test')
+        second.ensure_connection()
+        self.assertIs(second.connection, connection)
+
+        third = DatabaseWrapper(settings_dict, 'pool-test')
+        with self.assertRaises(dbpool.PoolTimeout):
+            third.ensure_connection()
+        second.close()
+        for key in [key for key in dbpool._pools if key[0] == 'pool-test']:
+            for slot in dbpool._pools.pop(key)._idle:
+                slot.connection.close()
@@ -4,6 +4,8 @@ from django.urls import include, path
 from django.conf.urls.static import static
 from django.conf.urls import handler404, handler500
 
+from yatube.metrics import metrics_view
+
 
 handler404 = "posts.views.page_not_found"  # noqa
 handler500 = "posts.views.server_error"  # noqa
@@ -12,6 +14,8 @@ urlpatterns = [
     path("auth/", include("users.urls")),
     path("auth/", include("django.contrib.auth.urls")),
     path("admin/", admin.site.urls),
+    path("metrics/", metrics_view, name="metrics"),
+    path("api/v1/", include("api.urls", namespace="api")),
     path("", include("posts.urls", namespace="posts")),
     path("about/", include("about.urls", namespace="about")),
 ]